@@ -0,0 +1,44 @@
+import tensorcircuit as tc
+import numpy as np
+from tools import *
+
+# Simulates circuit on a classical input one top-level gate at a time (each dense block is
+# one module) and records, after every module, how far the norm has drifted from 1 and the
+# largest amplitude off the most likely basis state. Arithmetic modules map basis states
+# to basis states, so both should stay at rounding level; run under precision("complex64")
+# to check that single precision is enough before simulating wider circuits with it.
+def monitor(circuit, inputs = ()):
+	n = circuit._nqubits
+	start = Circuit(n)
+	for register, value in inputs:
+		start.append(int_to_qubits(register, value))
+	psi = start.state()
+	records = []
+	for d in circuit.to_qir():
+		psi = Circuit.from_qir([d], {"nqubits": n, "inputs": psi}).state()
+		a = np.abs(tc.backend.numpy(psi))
+		target = int(np.argmax(a))
+		norm = float(np.linalg.norm(a))
+		a[target] = 0
+		records.append({
+			"module": d.get("name") or d["gatef"].n,
+			"qubits": list(d["index"]),
+			"norm drift": abs(norm - 1),
+			"off-target": float(np.max(a)),
+			"state": target,
+		})
+	return records
+
+def report(records):
+	for r in records:
+		print(f"{r['module']:>24} {str(r['qubits']):<40} drift {r['norm drift']:.2e}  off-target {r['off-target']:.2e}")
+	print(f"{'worst':>24} {'':<40} drift {max(r['norm drift'] for r in records):.2e}  off-target {max(r['off-target'] for r in records):.2e}")
+
+if __name__ == "__main__":
+	from point_addition import ecc_registers, cond_ECC_add_0
+	alloc, p, x, z = ecc_registers()
+	for dtype in ("complex64", "complex128"):
+		with precision(dtype):
+			circuit = cond_ECC_add_0(p, x, 2, 4, z, alloc = alloc)
+			print(dtype, f"state {2 ** circuit._nqubits * np.dtype(dtype).itemsize} bytes")
+			report(monitor(circuit, [([p], 1), (x[0:4], 1), (x[4:8], 2)]))
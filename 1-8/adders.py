@@ -0,0 +1,151 @@
+import tensorcircuit as tc
+from tools import *
+from addition import add, cond_add
+from constant_addition import add_const, cond_add_const, cond_cadd_const
+from uncompute import invert
+
+# Adder engines for the modular modules. Every operation takes the usual arguments plus
+# a trailing list of clean scratch qubits, engine.scratch(n) of them for an n-qubit target,
+# and has .inverse and .gates like a block:
+#	add(x, y, s)			y += x
+#	add_const(x, value, s)		x += value
+#	cond_add(p, x, y, s)		y += x if p
+#	cond_add_const(p, x, value, s)
+#	cond_cadd_const(p1, p2, x, value, s)
+# draper is the QFT adder (no scratch). ripple is the Cuccaro ripple-carry adder, X / CNOT /
+# Toffoli only with n + 1 scratch qubits; build it inside gate_level(), where it can be
+# checked at any width with classical.run_bits.
+class Adder:
+	def __init__(self, name, scratch, add, add_const, cond_add, cond_add_const, cond_cadd_const):
+		self.name = name
+		self.scratch = scratch
+		self.add = add
+		self.add_const = add_const
+		self.cond_add = cond_add
+		self.cond_add_const = cond_add_const
+		self.cond_cadd_const = cond_cadd_const
+
+	def __repr__(self):
+		return self.name
+
+def _without_scratch(op):
+	def call(*stuff):
+		return op(*stuff[:-1])
+	call.inverse = lambda *stuff: op.inverse(*stuff[:-1])
+	call.gates = lambda *stuff: op.gates(*stuff[:-1])
+	return call
+
+def reversible(func):
+	def inverse(*stuff):
+		circuit = func(*stuff)
+		return invert(circuit.to_qir(), circuit._nqubits)
+	func.inverse = inverse
+	func.gates = func
+	return func
+
+# Cuccaro, Draper, Kutin, Moulton: y += x mod 2^n with one clean carry qubit
+@reversible
+def ripple_add(x, y, carry):
+	n = len(y)
+	a = [carry] + x
+	c = Circuit(max(x + y + [carry]) + 1)
+	for i in range(n - 1):
+		c.cnot(x[i], y[i])
+		c.cnot(x[i], a[i])
+		c.toffoli(a[i], y[i], x[i])
+	c.cnot(x[n - 1], y[n - 1])
+	c.cnot(a[n - 1], y[n - 1])
+	for i in reversed(range(n - 1)):
+		c.toffoli(a[i], y[i], x[i])
+		c.cnot(x[i], a[i])
+		c.cnot(a[i], y[i])
+	return c
+
+# target ^= [a < b] (and all controls), a and b n-qubit, carry one clean qubit: the MAJ
+# half of the ripple adder computes the carry out of ~a + b, which is 1 exactly when
+# b - a - 1 >= 0, into b[n - 1]; it is copied to target and the ladder undone, so no sum
+# is ever written
+@reversible
+def less_than(a, b, carry, target, controls = ()):
+	n = len(a)
+	t = [carry] + b
+	controls = list(controls)
+	c = Circuit(max(a + b + controls + [carry, target]) + 1)
+	for q in a:
+		c.x(q)
+	for i in range(n):
+		c.cnot(b[i], a[i])
+		c.cnot(b[i], t[i])
+		c.toffoli(t[i], a[i], b[i])
+	if not controls:
+		c.cnot(b[n - 1], target)
+	elif len(controls) == 1:
+		c.toffoli(controls[0], b[n - 1], target)
+	else:
+		c.multicontrol(*controls, b[n - 1], target, ctrl = [1] * (len(controls) + 1), unitary = tc.gates._x_matrix)
+	for i in reversed(range(n)):
+		c.toffoli(t[i], a[i], b[i])
+		c.cnot(b[i], t[i])
+		c.cnot(b[i], a[i])
+	for q in a:
+		c.x(q)
+	return c
+
+# operand loaded into scratch[1:] by load(circuit, register), added, then unloaded
+def _loaded(x, scratch, load, extra = ()):
+	n = len(x)
+	t = scratch[1:n + 1]
+	c = Circuit(max(list(x) + scratch[:n + 1] + list(extra)) + 1)
+	load(c, t)
+	c.append(ripple_add(t, x, scratch[0]))
+	load(c, t)
+	return c
+
+@reversible
+def _ripple_add(x, y, scratch):
+	if len(x) == len(y):
+		c = Circuit(max(x + y + scratch[:1]) + 1)
+		c.append(ripple_add(x, y, scratch[0]))
+		return c
+	def load(c, t):
+		for i in range(len(x)):
+			c.cnot(x[i], t[i])
+	return _loaded(y, scratch, load, x)
+
+@reversible
+def _ripple_add_const(x, value, scratch):
+	def load(c, t):
+		for i in range(len(x)):
+			if value >> i & 1:
+				c.x(t[i])
+	return _loaded(x, scratch, load)
+
+@reversible
+def _ripple_cond_add(p, x, y, scratch):
+	def load(c, t):
+		for i in range(len(x)):
+			c.toffoli(p, x[i], t[i])
+	return _loaded(y, scratch, load, [p] + x)
+
+@reversible
+def _ripple_cond_add_const(p, x, value, scratch):
+	def load(c, t):
+		for i in range(len(x)):
+			if value >> i & 1:
+				c.cnot(p, t[i])
+	return _loaded(x, scratch, load, [p])
+
+@reversible
+def _ripple_cond_cadd_const(p1, p2, x, value, scratch):
+	def load(c, t):
+		for i in range(len(x)):
+			if value >> i & 1:
+				c.toffoli(p1, p2, t[i])
+	return _loaded(x, scratch, load, [p1, p2])
+
+draper = Adder("draper", lambda n: 0,
+	_without_scratch(add), _without_scratch(add_const), _without_scratch(cond_add),
+	_without_scratch(cond_add_const), _without_scratch(cond_cadd_const))
+
+ripple = Adder("ripple", lambda n: n + 1,
+	_ripple_add, _ripple_add_const, _ripple_cond_add, _ripple_cond_add_const, _ripple_cond_cadd_const)
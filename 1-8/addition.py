@@ -1,15 +1,16 @@
 import numpy as np
 import tensorcircuit as tc
-from qft import QFT, IQFT
+from qft import QFT, IQFT, _theta
 from tools import *
+from controlled import controlled
 
 @block
 def add(x, y):
-	c = tc.Circuit(max(x + y) + 1)
+	c = Circuit(max(x + y) + 1)
 	c.append(QFT(y))
 	n = len(y)
 
-	for i in range(n):
+	for i in range(min(len(x), n)):
 		for j in range(n):
 			if i + j <= n:
 				target_idx = n - 1 - j
@@ -20,15 +21,20 @@ def add(x, y):
 
 @block
 def cond_add(p, x, y):
-	c = tc.Circuit(max([p] + x + y) + 1)
-	c.append(QFT(y))
-	n = len(y)
+	return controlled(add.gates(x, y), p)
 
-	for i in range(n):
-		for j in range(n):
-			if i + j <= n:
-				target_idx = n - 1 - j
-				c.append(ccphase(theta = np.pi * (2 ** (i + j + 1)) / (2 ** n)), indices = [p] + [x[i]] + [y[target_idx]])
-
-	c.append(IQFT(y))
-	return c
\ No newline at end of file
+# a += sign * y if ctrl onto circuit c, for a in the QFT basis (qft.QFT): one doubly
+# controlled phase per (y_j, a_q) as 3 cphases, with the control halves merged per a_q
+# and the CNOT pair shared along a
+def cond_phase_add(c, ctrl, y, a, sign = 1):
+	for q in range(len(a)):
+		theta = sign * sum(_theta(2 ** j, q) for j in range(len(y))) / 2
+		if theta % (2 * np.pi):
+			c.cphase(ctrl, a[q], theta = theta)
+	for j in range(len(y)):
+		for q in range(j, len(a)):
+			c.cphase(y[j], a[q], theta = sign * _theta(2 ** j, q) / 2)
+		c.cnot(ctrl, y[j])
+		for q in range(j, len(a)):
+			c.cphase(y[j], a[q], theta = -sign * _theta(2 ** j, q) / 2)
+		c.cnot(ctrl, y[j])
\ No newline at end of file
@@ -0,0 +1,80 @@
+import tensorcircuit as tc
+import numpy as np
+import hashlib
+import json
+import os
+import tools
+from tools import digest, save_array, stable_repr
+
+# Persistent cache under one directory:
+#	<digest>.npy		block unitaries, loaded memory-mapped by tools.block
+#	circuit-<digest>.json	gate lists of cached(builder, ...) results; dense gates point
+#				to unitary-<sha256 of the matrix>.npy, shared between circuits
+# Keys hash the builder, its arguments (tools.stable_repr), the dtype and
+# tools.version(), which covers the tensorcircuit / numpy versions and the source of every
+# module here, so editing anything a builder calls misses. Builders called with arguments
+# that have no stable repr are run without the cache.
+
+def enable(path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")):
+	os.makedirs(path, exist_ok = True)
+	tools._disk = path
+	return path
+
+def disable():
+	tools._disk = None
+
+def _unitary_file(unitary):
+	a = np.ascontiguousarray(tc.backend.numpy(getattr(unitary, "tensor", unitary)))
+	h = hashlib.sha256(f"{a.dtype.str} {a.shape}".encode())
+	h.update(a.tobytes())
+	name = "unitary-" + h.hexdigest()[:32] + ".npy"
+	path = os.path.join(tools._disk, name)
+	if not os.path.exists(path):
+		save_array(path, a)
+	return name
+
+def save_circuit(circuit, path):
+	gates = []
+	for d in circuit.to_qir():
+		parameters = {}
+		for k, v in d.get("parameters", {}).items():
+			if k == "unitary":
+				parameters[k] = {"npy": _unitary_file(v)}
+			elif k == "ctrl":
+				parameters[k] = [int(b) for b in v]
+			else:
+				parameters[k] = float(np.real(v))
+		if d["gatef"].n == "any" and d.get("name"):
+			parameters["name"] = d["name"]
+		gates.append({"gate": d["gatef"].n, "index": [int(q) for q in d["index"]], "parameters": parameters})
+	temporary = f"{path}.{os.getpid()}.tmp"
+	with open(temporary, "w") as f:
+		json.dump({"nqubits": circuit._nqubits, "gates": gates}, f)
+	os.replace(temporary, path)
+
+def load_circuit(path):
+	with open(path) as f:
+		saved = json.load(f)
+	c = tools.Circuit(saved["nqubits"])
+	for g in saved["gates"]:
+		parameters = dict(g["parameters"])
+		if "unitary" in parameters:
+			parameters["unitary"] = np.load(os.path.join(os.path.dirname(path), parameters["unitary"]["npy"]), mmap_mode = "r")
+		getattr(c, g["gate"])(*g["index"], **parameters)
+	return c
+
+# builder(*stuff, **parameters), read from the cache when it is enabled and holds the result;
+# point_addition builds its multipliers and verification / contraction their oracles here
+def cached(builder, *stuff, **parameters):
+	if tools._disk is None:
+		return builder(*stuff, **parameters)
+	try:
+		key = (stable_repr(builder), stable_repr(stuff), stable_repr(parameters), tc.dtypestr, tools._dense)
+	except ValueError:
+		return builder(*stuff, **parameters)
+	path = os.path.join(tools._disk, "circuit-" + digest(key) + ".json")
+	if os.path.exists(path):
+		return load_circuit(path)
+	circuit = builder(*stuff, **parameters)
+	save_circuit(circuit, path)
+	return circuit
@@ -0,0 +1,57 @@
+import random
+import numpy as np
+from tools import *
+
+# Bit-level simulation of reversible X / CNOT / Toffoli / SWAP / CSWAP / multi-controlled X
+# circuits. The state is one python int with bit q holding qubit q, so a gate costs a few
+# integer operations whatever the width. Build the circuit inside gate_level().
+
+def _is_x(unitary):
+	m = np.asarray(getattr(unitary, "tensor", unitary)).reshape(2, 2)
+	return np.allclose(m, [[0, 1], [1, 0]])
+
+def _bit(state, q):
+	return state >> q & 1
+
+def run_bits(circuit, state):
+	for d in circuit.to_qir():
+		name = d["gatef"].n
+		index = d["index"]
+		if name == "x":
+			state ^= 1 << index[0]
+		elif name == "cnot":
+			state ^= _bit(state, index[0]) << index[1]
+		elif name == "toffoli":
+			state ^= (_bit(state, index[0]) & _bit(state, index[1])) << index[2]
+		elif name == "swap" or name == "fredkin":
+			*ctrl, a, b = index
+			if all(_bit(state, q) for q in ctrl) and _bit(state, a) != _bit(state, b):
+				state ^= 1 << a | 1 << b
+		elif name == "multicontrol" and len(d["parameters"]["ctrl"]) == len(index) - 1 and _is_x(d["parameters"]["unitary"]):
+			if all(_bit(state, q) == v for q, v in zip(index, d["parameters"]["ctrl"])):
+				state ^= 1 << index[-1]
+		elif name != "i":
+			raise ValueError(f"{name} is not a classical reversible gate")
+	return state
+
+def encode(registers):
+	state = 0
+	for register, value in registers:
+		for i, q in enumerate(register):
+			state |= (value >> i & 1) << q
+	return state
+
+def decode(state, register):
+	return sum(_bit(state, q) << i for i, q in enumerate(register))
+
+# runs circuit on random register values and compares with expected(*values) -> values;
+# returns the number of mismatching samples
+def check_classical(circuit, registers, bounds, expected, samples = 1000, seed = 0):
+	rng = random.Random(seed)
+	failures = 0
+	for _ in range(samples):
+		values = [rng.randrange(bound) for bound in bounds]
+		state = run_bits(circuit, encode(zip(registers, values)))
+		if [decode(state, register) for register in registers] != list(expected(*values)):
+			failures += 1
+	return failures
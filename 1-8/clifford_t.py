@@ -0,0 +1,347 @@
+import tensorcircuit as tc
+import numpy as np
+import math
+import tools
+import profiling
+from counts import _is_ccphase, _name
+
+# Clifford+T lowering of a built gate list, read off circuit.to_qir() without simulating it:
+#	phase, rz		one z-rotation, exact (t / s / z) at multiples of pi / 4
+#	cphase			3 rotations by theta / 2 around a cnot pair
+#	ccphase			the 3 cphase + 2 cnot pattern as a 7-rotation parity network (theta / 4)
+#	toffoli, cswap		7 T, the toffoli as h . ccz . h
+#	multicontrol		x or diagonal target; 0-controls conjugated by x, more than two
+#				controls and-ed into clean ancillas above the circuit's qubits
+#	any			diagonal blocks as their phase polynomial, controlled-h with 2 T;
+#				other dense blocks stay opaque, build inside gate_level() to avoid them
+# Rotations left over (op "rz") are costed by a synthesis model at precision epsilon,
+# optionally split from a total error budget. T-depth is the greedy per-qubit T layer count
+# with multi-qubit Cliffords synchronising their qubits.
+#	t_cost(circuit, GRIDSYNTH, budget = 1e-3)
+#	module_t_costs(cond_ECC_add_0, p, x, 2, 4, z, alloc = alloc).report()
+
+# T gates per rotation to precision epsilon: slope * log2(1 / epsilon) + offset
+class Synthesis:
+	def __init__(self, epsilon = 1e-10, slope = 3.0, offset = 0.0):
+		self.epsilon = epsilon
+		self.slope = slope
+		self.offset = offset
+
+	def t_count(self, epsilon = None):
+		return math.ceil(self.slope * math.log2(1 / (epsilon or self.epsilon)) + self.offset)
+
+	def __repr__(self):
+		return f"Synthesis(epsilon {self.epsilon:g}, {self.slope:g} log2(1 / epsilon) + {self.offset:g})"
+
+# Ross-Selinger z-rotations, and the expected count of repeat-until-success circuits
+GRIDSYNTH = Synthesis()
+REPEAT_UNTIL_SUCCESS = Synthesis(slope = 1.15, offset = 9.2)
+
+CLIFFORD = {"i", "h", "x", "y", "z", "s", "sd", "cnot", "cz", "swap"}
+
+# diag(1, e^(i k pi / 4)) for k = 0..7
+_EXACT = [[], ["t"], ["s"], ["s", "t"], ["z"], ["z", "t"], ["sd"], ["td"]]
+
+def _wrap(theta):
+	return (theta + np.pi) % (2 * np.pi) - np.pi
+
+class Lowering:
+	def __init__(self, nqubits):
+		self.nqubits = nqubits
+		self.ops = []
+		self.opaque = {}
+		self.ancillas = 0
+		self.free = []
+
+	def emit(self, name, *qubits, parameter = None):
+		self.ops.append((name, qubits, parameter))
+
+	# diag(1, e^(i theta)), up to a global phase
+	def rotation(self, q, theta):
+		k = theta / (np.pi / 4)
+		if abs(k - round(k)) < 1e-9:
+			for name in _EXACT[round(k) % 8]:
+				self.emit(name, q)
+		else:
+			self.emit("rz", q, parameter = _wrap(theta))
+
+	def cphase(self, control, target, theta):
+		self.rotation(control, theta / 2)
+		self.rotation(target, theta / 2)
+		self.emit("cnot", control, target)
+		self.rotation(target, -theta / 2)
+		self.emit("cnot", control, target)
+
+	# a b c = (a + b + c - a^b - a^c - b^c + a^b^c) / 4
+	def ccphase(self, a, b, c, theta):
+		for q in (a, b, c):
+			self.rotation(q, theta / 4)
+		self.emit("cnot", a, b)
+		self.rotation(b, -theta / 4)
+		self.emit("cnot", a, c)
+		self.rotation(c, -theta / 4)
+		self.emit("cnot", b, c)
+		self.rotation(c, -theta / 4)
+		self.emit("cnot", a, c)
+		self.rotation(c, theta / 4)
+		self.emit("cnot", b, c)
+		self.emit("cnot", a, b)
+
+	def toffoli(self, a, b, target):
+		self.emit("h", target)
+		self.ccphase(a, b, target, np.pi)
+		self.emit("h", target)
+
+	def cswap(self, control, a, b):
+		self.emit("cnot", b, a)
+		self.toffoli(control, a, b)
+		self.emit("cnot", b, a)
+
+	def allocate(self):
+		if not self.free:
+			self.free.append(self.nqubits + self.ancillas)
+			self.ancillas += 1
+		return self.free.pop()
+
+	# and of the controls on a clean ancilla (the control itself when there is one); undo()
+	# with the returned ladder
+	def conjunction(self, controls):
+		if len(controls) == 1:
+			return controls[0], []
+		ladder = []
+		last = controls[0]
+		for q in controls[1:]:
+			a = self.allocate()
+			self.toffoli(last, q, a)
+			ladder.append((last, q, a))
+			last = a
+		return last, ladder
+
+	def undo(self, ladder):
+		for a, b, target in reversed(ladder):
+			self.toffoli(a, b, target)
+			self.free.append(target)
+
+	def multicontrol(self, d):
+		index = list(d["index"])
+		ctrl = list(d["parameters"]["ctrl"])
+		controls, target = index[:len(ctrl)], index[len(ctrl):]
+		u = np.asarray(tc.backend.numpy(d["parameters"]["unitary"])).reshape(2 ** len(target), -1)
+		flips = [q for q, v in zip(controls, ctrl) if not v]
+		if len(target) != 1 or not (np.allclose(u, [[0, 1], [1, 0]]) or np.allclose(u, np.diag(np.diag(u)))):
+			return self.dense(d)
+		for q in flips:
+			self.emit("x", q)
+		t = target[0]
+		if np.allclose(u, [[0, 1], [1, 0]]):
+			if len(controls) == 0:
+				self.emit("x", t)
+			elif len(controls) == 1:
+				self.emit("cnot", controls[0], t)
+			else:
+				last, ladder = self.conjunction(controls[:-1])
+				self.toffoli(controls[-1], last, t)
+				self.undo(ladder)
+		else:
+			alpha, beta = np.angle(u[0, 0]), np.angle(u[1, 1])
+			if len(controls) == 0:
+				self.rotation(t, beta - alpha)
+			elif len(controls) == 2 and np.isclose(alpha, 0):
+				self.ccphase(controls[0], controls[1], t, beta)
+			else:
+				last, ladder = self.conjunction(controls)
+				self.rotation(last, alpha)
+				self.cphase(last, t, beta - alpha)
+				self.undo(ladder)
+		for q in flips:
+			self.emit("x", q)
+
+	# dense blocks: a diagonal one is exp(i sum_S c_S parity_S) with c_S = -2 walsh(phases)_S,
+	# each parity gathered onto its last qubit by cnots
+	def dense(self, d):
+		index = list(d["index"])
+		k = len(index)
+		m = np.reshape(tc.backend.numpy(d["gate"].tensor), (2 ** k, 2 ** k))
+		if np.allclose(m, np.diag(np.diag(m))):
+			walsh = np.angle(np.diag(m)).astype(float)
+			h = 1
+			while h < len(walsh):
+				walsh = walsh.reshape(-1, 2, h)
+				walsh = np.stack([walsh[:, 0] + walsh[:, 1], walsh[:, 0] - walsh[:, 1]], axis = 1).reshape(-1)
+				h *= 2
+			for s in range(1, 2 ** k):
+				theta = _wrap(-2 * walsh[s] / 2 ** k)
+				if np.isclose(theta, 0, atol = 1e-9):
+					continue
+				qubits = [index[j] for j in range(k) if s >> (k - 1 - j) & 1]
+				for q in qubits[:-1]:
+					self.emit("cnot", q, qubits[-1])
+				self.rotation(qubits[-1], theta)
+				for q in reversed(qubits[:-1]):
+					self.emit("cnot", q, qubits[-1])
+		elif k == 2 and np.allclose(m, np.kron(np.diag([1, 0]), np.eye(2)) + np.kron(np.diag([0, 1]), [[1, 1], [1, -1]]) / np.sqrt(2)):
+			control, target = index
+			for name in ("s", "h", "t"):
+				self.emit(name, target)
+			self.emit("cnot", control, target)
+			for name in ("td", "h", "sd"):
+				self.emit(name, target)
+		else:
+			self.opaque[d["name"]] = self.opaque.get(d["name"], 0) + 1
+			self.emit("any", *index, parameter = m)
+
+	def gate(self, d):
+		name, index = _name(d), list(d["index"])
+		theta = float(np.real(d.get("parameters", {}).get("theta", 0)))
+		if name in CLIFFORD:
+			if name != "i":
+				self.emit(name, *index)
+		elif name in ("t", "td"):
+			self.emit(name, *index)
+		elif name == "phase":
+			self.rotation(index[0], theta)
+		elif name == "rz":
+			self.rotation(index[0], theta)
+		elif name == "cphase":
+			self.cphase(index[0], index[1], theta)
+		elif name == "toffoli":
+			self.toffoli(*index)
+		elif name == "cswap":
+			self.cswap(*index)
+		elif name == "multicontrol":
+			self.multicontrol(d)
+		else:
+			self.dense(d)
+
+	# the Clifford+T circuit, "rz" kept as the exact rotation it approximates
+	def circuit(self):
+		c = tools.Circuit(self.nqubits + self.ancillas)
+		for name, qubits, parameter in self.ops:
+			if name == "rz":
+				c.rz(*qubits, theta = parameter)
+			elif name == "any":
+				c.any(*qubits, unitary = parameter)
+			else:
+				getattr(c, name)(*qubits)
+		return c
+
+def lower(circuit):
+	gates = circuit.to_qir()
+	lowering = Lowering(circuit._nqubits)
+	i = 0
+	while i < len(gates):
+		if _is_ccphase(gates[i:i + 5]):
+			index = [q for d in gates[i:i + 2] for q in d["index"]]
+			lowering.ccphase(index[0], index[2], index[1], 2 * float(np.real(gates[i]["parameters"]["theta"])))
+			i += 5
+		else:
+			lowering.gate(gates[i])
+			i += 1
+	return lowering
+
+class TCost:
+	def __init__(self, t_count = 0, t_depth = 0, rotations = 0, dropped = 0, cliffords = 0, ancillas = 0, opaque = None, epsilon = 0.0):
+		self.t_count = t_count
+		self.t_depth = t_depth
+		self.rotations = rotations
+		self.dropped = dropped
+		self.cliffords = cliffords
+		self.ancillas = ancillas
+		self.opaque = opaque or {}
+		self.epsilon = epsilon
+
+	# one circuit after the other
+	def __add__(self, other):
+		opaque = dict(self.opaque)
+		for k, v in other.opaque.items():
+			opaque[k] = opaque.get(k, 0) + v
+		return TCost(self.t_count + other.t_count, self.t_depth + other.t_depth, self.rotations + other.rotations, self.dropped + other.dropped, self.cliffords + other.cliffords, max(self.ancillas, other.ancillas), opaque, max(self.epsilon, other.epsilon))
+
+	def __repr__(self):
+		opaque = f", opaque {self.opaque}" if self.opaque else ""
+		return f"TCost(T {self.t_count}, T-depth {self.t_depth}, rotations {self.rotations} at {self.epsilon:.1e} (+{self.dropped} dropped), cliffords {self.cliffords}, ancillas {self.ancillas}{opaque})"
+
+# budget: total synthesis error, split evenly over the rotations (synthesis.epsilon each
+# otherwise); rotations smaller than epsilon are dropped
+def t_cost(circuit, synthesis = GRIDSYNTH, budget = None):
+	lowering = lower(circuit) if isinstance(circuit, tc.Circuit) else circuit
+	rotations = sum(1 for name, *_ in lowering.ops if name == "rz")
+	epsilon = budget / rotations if budget and rotations else synthesis.epsilon
+	per_rotation = synthesis.t_count(epsilon)
+	result = TCost(ancillas = lowering.ancillas, opaque = dict(lowering.opaque), epsilon = epsilon)
+	layer = {}
+	for name, qubits, parameter in lowering.ops:
+		if name == "rz" and abs(parameter) < epsilon:
+			result.dropped += 1
+			continue
+		if name == "rz":
+			cost = per_rotation
+			result.rotations += 1
+		elif name in ("t", "td"):
+			cost = 1
+		else:
+			cost = 0
+			result.cliffords += name != "any"
+		result.t_count += cost
+		top = max(layer.get(q, 0) for q in qubits) + cost
+		for q in qubits:
+			layer[q] = top
+	result.t_depth = max(layer.values(), default = 0)
+	return result
+
+# Profiler that keeps, for every module in the call tree, the T cost of the circuits it
+# returned, summed over its calls (each including the modules it called)
+class TTally(profiling.Profiler):
+	def __init__(self, memory = False, synthesis = GRIDSYNTH):
+		super().__init__(False)
+		self.synthesis = synthesis
+
+	def built(self, circuit):
+		if isinstance(circuit, tc.Circuit):
+			node = self.stack[-1]
+			node.t_cost = getattr(node, "t_cost", TCost()) + t_cost(circuit, self.synthesis)
+
+	def report(self, node = None, depth = 0, limit = 0):
+		if node is None:
+			node = self.root
+			print(f"{'module':<48} {'calls':>7} {'T':>10} {'T-depth':>9} {'rotations':>9} {'ancillas':>8}")
+		c = getattr(node, "t_cost", None)
+		if c is not None:
+			print(f"{'  ' * depth + node.name:<48} {node.calls:>7} {c.t_count:>10} {c.t_depth:>9} {c.rotations:>9} {c.ancillas:>8}")
+			depth += 1
+		for child in sorted(node.children.values(), key = lambda n: -getattr(n, "t_cost", TCost()).t_count):
+			self.report(child, depth)
+
+# T cost of builder(*stuff, **parameters) per module of its call tree, built at gate level;
+# with a budget every module uses the epsilon the budget gives the whole circuit
+def module_t_costs(builder, *stuff, synthesis = GRIDSYNTH, budget = None, **parameters):
+	build = getattr(builder, "gates", builder)
+	if budget:
+		with tools.gate_level():
+			epsilon = t_cost(build(*stuff, **parameters), synthesis, budget).epsilon
+		synthesis = Synthesis(epsilon, synthesis.slope, synthesis.offset)
+	tally = profiling.enable(memory = False, profiler = lambda memory: TTally(memory, synthesis))
+	try:
+		with tools.gate_level():
+			circuit = build(*stuff, **parameters)
+	finally:
+		profiling.disable()
+	tally.root.name = builder.__name__
+	tally.root.t_cost = t_cost(circuit, synthesis)
+	return tally
+
+if __name__ == "__main__":
+	from modular_addition import mod_add
+	from point_addition import ecc_registers, cond_ECC_add_0
+	with tools.gate_level():
+		circuit = mod_add([0, 1, 2, 3], [4, 5, 6, 7], [8], modulus = 7)
+	lowering = lower(circuit)
+	u = tc.backend.numpy(circuit.matrix())
+	step = 2 ** lowering.ancillas
+	v = tc.backend.numpy(lowering.circuit().matrix())[::step, ::step]
+	overlap = abs(np.trace(u.conj().T @ v)) / 2 ** 9
+	print(f"mod_add: Clifford+T lowering matches up to global phase: {np.isclose(overlap, 1)}")
+	for synthesis in (GRIDSYNTH, REPEAT_UNTIL_SUCCESS):
+		print(synthesis, t_cost(circuit, synthesis))
+	alloc, p, x, z = ecc_registers()
+	module_t_costs(cond_ECC_add_0, p, x, 2, 4, z, alloc = alloc, budget = 1e-3).report()
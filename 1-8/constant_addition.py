@@ -1,12 +1,13 @@
 import tensorcircuit as tc
-from qft import QFT, IQFT
+from qft import QFT, IQFT, _theta
 from addition import add, cond_add
 from tools import *
+from controlled import controlled
 import numpy as np
 
 @block
 def add_const(x, value):
-	c = tc.Circuit(max(x) + 1)
+	c = Circuit(max(x) + 1)
 	n = len(x)
 	c.append(QFT(x))
 
@@ -21,30 +22,43 @@ def add_const(x, value):
 
 @block
 def cond_add_const(p, x, value):
-	c = tc.Circuit(max(p, max(x)) + 1)
-	n = len(x)
-	c.append(QFT(x))
+	return controlled(add_const.gates(x, value), p)
 
-	for i in [i for i in range(n) if (value >> i & 1)]:
-		for j in range(n):
-			if i + j <= n:
-				target_idx = n - 1 - j
-				c.cphase(p, x[target_idx], theta = np.pi * (2 ** (i + j + 1)) / (2 ** n))
+@block
+def cond_cadd_const(p1, p2, x, value):
+	return controlled(add_const.gates(x, value), [p1, p2])
+
+# a += value if all of ctrl (none, one or two qubits) onto circuit c, for a in the QFT basis
+def phase_add_const(c, value, a, ctrl = ()):
+	for q in range(len(a)):
+		theta = _theta(value, q)
+		if not theta:
+			continue
+		if len(ctrl) == 0:
+			c.phase(a[q], theta = theta)
+		elif len(ctrl) == 1:
+			c.cphase(ctrl[0], a[q], theta = theta)
+		else:
+			ccphase(c, ctrl[0], ctrl[1], a[q], theta)
 
-	c.append(IQFT(x))
-	return c
 
+# x += sum of value * [control] over terms ((control or None, value), ...) in one QFT frame:
+# the uncontrolled values are summed classically into one phase per qubit
 @block
-def cond_cadd_const(p1, p2, x, value):
+def add_const_terms(x, terms):
 	n = len(x)
-	c = tc.Circuit(max([p1, p2] + x) + 1)
+	controls = [q for q, value in terms if q is not None]
+	c = Circuit(max(x + controls) + 1)
 	c.append(QFT(x))
-
-	for i in [i for i in range(n) if (value >> i & 1)]:
+	constant = sum(value for q, value in terms if q is None)
+	for j in range(n):
+		theta = 2 * np.pi * (constant * 2 ** j % 2 ** n) / 2 ** n
+		if theta:
+			c.phase(x[n - 1 - j], theta = theta)
+	for q, value in terms:
 		for j in range(n):
-			if i + j <= n:
-				target_idx = n - 1 - j
-				c.append(ccphase(theta = np.pi * (2 ** (i + j + 1)) / (2 ** n)), indices = [p1] + [p2] + [x[target_idx]])
-
+			theta = 2 * np.pi * (value * 2 ** j % 2 ** n) / 2 ** n
+			if q is not None and theta:
+				c.cphase(q, x[n - 1 - j], theta = theta)
 	c.append(IQFT(x))
 	return c
@@ -0,0 +1,136 @@
+import tensorcircuit as tc
+import numpy as np
+import opt_einsum as oe
+import itertools
+import multiprocessing
+import time
+from tools import *
+
+# Amplitudes <outputs| C |inputs> by contracting the gate network directly, without a
+# statevector. Indices are sliced (fixed to 0 / 1 and summed over) until the largest
+# tensor of the contraction fits in memory bytes; the slices run on a process pool.
+# inputs / outputs: [(register, value), ...] little-endian like int_to_qubits, qubits not
+# listed are |0>; open_qubits stay uncontracted on the output side, in the order given.
+
+def gate_tensor(d):
+	k = len(d["index"])
+	if d["gatef"].n == "multicontrol":
+		ctrl = d["parameters"]["ctrl"]
+		u = np.asarray(getattr(d["parameters"]["unitary"], "tensor", d["parameters"]["unitary"]))
+		t = k - len(ctrl)
+		m = np.eye(2 ** k, dtype = np.complex128)
+		start = int("".join(map(str, ctrl)), 2) << t
+		m[start:start + 2 ** t, start:start + 2 ** t] = u.reshape(2 ** t, 2 ** t)
+	else:
+		m = np.asarray(tc.backend.numpy(d["gate"].tensor), dtype = np.complex128)
+	return m.reshape((2,) * 2 * k)
+
+def _bits(n, registers):
+	bits = [0] * n
+	for register, value in registers:
+		for i, q in enumerate(register):
+			bits[q] = value >> i & 1
+	return bits
+
+# einsum network: (terms, operands, output term); every wire segment is one index
+def network(circuit, inputs = (), outputs = (), open_qubits = ()):
+	n = circuit._nqubits
+	symbols = itertools.count()
+	wires = [next(symbols) for _ in range(n)]
+	terms, operands = [], []
+	for q, bit in enumerate(_bits(n, inputs)):
+		terms.append([wires[q]])
+		operands.append(np.eye(2, dtype = np.complex128)[bit])
+	for d in circuit.to_qir():
+		index = d["index"]
+		legs = [next(symbols) for _ in index]
+		terms.append(legs + [wires[q] for q in index])
+		operands.append(gate_tensor(d))
+		for q, leg in zip(index, legs):
+			wires[q] = leg
+	for q, bit in enumerate(_bits(n, outputs)):
+		if q not in open_qubits:
+			terms.append([wires[q]])
+			operands.append(np.eye(2, dtype = np.complex128)[bit])
+	return terms, operands, [wires[q] for q in open_qubits]
+
+def _equation(terms, output):
+	return ",".join("".join(map(oe.get_symbol, t)) for t in terms) + "->" + "".join(map(oe.get_symbol, output))
+
+def _sliced(terms, operands, fixed):
+	new_terms, new_operands = [], []
+	for t, a in zip(terms, operands):
+		for i in reversed(range(len(t))):
+			if t[i] in fixed:
+				a = np.take(a, fixed[t[i]], axis = i)
+		new_terms.append([i for i in t if i not in fixed])
+		new_operands.append(a)
+	return new_terms, new_operands
+
+def _largest(terms, output, sliced):
+	shapes = [(2,) * len([i for i in t if i not in sliced]) for t in terms]
+	kept = [[i for i in t if i not in sliced] for t in terms]
+	path, info = oe.contract_path(_equation(kept, output), *shapes, shapes = True, optimize = "greedy")
+	intermediates = [step[2].split("->")[1] for step in info.contraction_list]
+	return path, info.largest_intermediate, intermediates, max([len(t) for t in kept] + [0])
+
+# greedily slice the index that occurs most often in the oversized intermediates
+def plan(terms, output, memory = 2 ** 30, itemsize = 16):
+	sliced = []
+	limit = memory // itemsize
+	while True:
+		path, largest, intermediates, operand = _largest(terms, output, sliced)
+		if max(largest, 2 ** operand) <= limit:
+			return path, sliced
+		big = [s for s in intermediates if 2 ** len(s) > limit]
+		big += ["".join(map(oe.get_symbol, [i for i in t if i not in sliced])) for t in terms if 2 ** len([i for i in t if i not in sliced]) > limit]
+		counts = {}
+		for s in big:
+			for ch in s:
+				if ch not in map(oe.get_symbol, output):
+					counts[ch] = counts.get(ch, 0) + 1
+		if not counts:
+			raise ValueError(f"open qubits alone need more than {memory} bytes")
+		symbol = max(counts, key = counts.get)
+		sliced.append(next(i for t in terms for i in t if oe.get_symbol(i) == symbol))
+
+_job = None
+
+def _init(job):
+	global _job
+	_job = job
+
+def _slice(values):
+	terms, operands, output, path, sliced = _job
+	t, a = _sliced(terms, operands, dict(zip(sliced, values)))
+	return oe.contract(_equation(t, output), *a, optimize = path)
+
+def amplitude(circuit, inputs = (), outputs = (), open_qubits = (), memory = 2 ** 30, processes = 1):
+	terms, operands, output = network(circuit, inputs, outputs, open_qubits)
+	path, sliced = plan(terms, output, memory)
+	job = (terms, operands, output, path, sliced)
+	values = list(itertools.product((0, 1), repeat = len(sliced)))
+	if processes == 1 or len(values) == 1:
+		_init(job)
+		pieces = map(_slice, values)
+	else:
+		with multiprocessing.Pool(processes, initializer = _init, initargs = (job,)) as pool:
+			pieces = pool.map(_slice, values)
+	return sum(pieces)
+
+# cond_ECC_add_0 on one classical input, contracted against the expected output
+def oracle_amplitude(P, Q, control = 1, memory = 2 ** 26, processes = None, **options):
+	from point_addition import ecc_registers, cond_ECC_add_0, point_addition_corner
+	alloc, p, x, z = ecc_registers()
+	from cache import cached
+	circuit = cached(cond_ECC_add_0, p, x, Q[0], Q[1], z, alloc = alloc, **options)
+	R = point_addition_corner(P, Q, 0, 0, 7) if control else P
+	inputs = [([p], control), (x[0:4], P[0]), (x[4:8], P[1])]
+	outputs = [([p], control), (x[0:4], R[0]), (x[4:8], R[1])]
+	start = time.time()
+	a = amplitude(circuit, inputs, outputs, memory = memory, processes = processes or multiprocessing.cpu_count())
+	return a, time.time() - start
+
+if __name__ == "__main__":
+	a, elapsed = oracle_amplitude((1, 2), (2, 4))
+	print(f"<R|U|P, Q> = {a:.4f} ({elapsed:.2f}s)")
@@ -0,0 +1,91 @@
+import tensorcircuit as tc
+import numpy as np
+from tools import *
+from uncompute import _is_inverse, _name
+
+DIAGONAL = {"phase", "cphase", "z", "cz", "s", "sd", "t", "td", "rz"}
+
+def _matrix(d):
+	if _name(d) == "multicontrol":
+		return None
+	m = 2 ** len(d["index"])
+	return np.reshape(tc.backend.numpy(d["gate"].tensor), (m, m))
+
+# consecutive diagonal gates commute, so each run is compared as a multiset
+def _tokens(gates):
+	tokens = []
+	for d in gates:
+		if _name(d) in DIAGONAL and tokens and _name(tokens[-1][0]) in DIAGONAL:
+			tokens[-1].append(d)
+		else:
+			tokens.append([d])
+	return tokens
+
+def _token_inverse(a, b):
+	if len(a) != len(b):
+		return False
+	rest = list(b)
+	for d in a:
+		match = [e for e in rest if _is_inverse(d, e)]
+		if not match:
+			return False
+		rest.remove(match[0])
+	return True
+
+# C(U V U^dagger) = U C(V) U^dagger: the conjugating layers (QFT/IQFT) stay uncontrolled
+def _strip(tokens):
+	k = 0
+	while 2 * k + 2 <= len(tokens) and _token_inverse(tokens[k], tokens[-1 - k]):
+		k += 1
+	return tokens[:k], tokens[k:len(tokens) - k], tokens[len(tokens) - k:]
+
+def _emit(c, d):
+	getattr(c, _name(d))(*d["index"], **d.get("parameters", {}))
+
+def _control_gate(c, d, ctrl):
+	name, index = _name(d), list(d["index"])
+	parameters = d.get("parameters", {})
+	if name == "phase" and len(ctrl) == 1:
+		c.cphase(ctrl[0], index[0], theta = parameters["theta"])
+	elif name == "phase" and len(ctrl) == 2:
+		ccphase(c, ctrl[0], ctrl[1], index[0], parameters["theta"])
+	elif name == "cphase" and len(ctrl) == 1:
+		ccphase(c, ctrl[0], index[0], index[1], parameters["theta"])
+	elif name == "x" and len(ctrl) == 1:
+		c.cnot(ctrl[0], index[0])
+	elif name == "x" and len(ctrl) == 2:
+		c.toffoli(ctrl[0], ctrl[1], index[0])
+	elif name == "cnot" and len(ctrl) == 1:
+		c.toffoli(ctrl[0], index[0], index[1])
+	elif name == "swap" and len(ctrl) == 1:
+		c.cswap(ctrl[0], index[0], index[1])
+	elif name == "multicontrol":
+		c.multicontrol(*ctrl, *index, ctrl = [1] * len(ctrl) + list(parameters["ctrl"]), unitary = parameters["unitary"])
+	elif name == "cphase":
+		c.multicontrol(*ctrl, *index, ctrl = [1] * (len(ctrl) + 1), unitary = np.diag([1, np.exp(1j * parameters["theta"])]))
+	elif name in {"cnot", "toffoli"}:
+		c.multicontrol(*ctrl, *index, ctrl = [1] * (len(ctrl) + len(index) - 1), unitary = tc.gates._x_matrix)
+	else:
+		c.multicontrol(*ctrl, *index, ctrl = [1] * len(ctrl), unitary = _matrix(d))
+
+def _controlled(c, gates, ctrl):
+	prefix, middle, suffix = _strip(_tokens(gates))
+	for d in sum(prefix, []):
+		_emit(c, d)
+	middle = sum(middle, [])
+	if prefix and middle:
+		_controlled(c, middle, ctrl)
+	else:
+		for d in middle:
+			_control_gate(c, d, ctrl)
+	for d in sum(suffix, []):
+		_emit(c, d)
+
+# controlled(module, ctrl) adds one or more controls to every gate of module,
+# except the conjugation layers around the core (the QFT/IQFT of the Draper
+# adders), so only the diagonal phase layer of an adder gets controlled
+def controlled(module, ctrl):
+	ctrl = [ctrl] if isinstance(ctrl, int) else list(ctrl)
+	c = Circuit(max([module._nqubits - 1] + ctrl) + 1)
+	_controlled(c, module.to_qir(), ctrl)
+	return c
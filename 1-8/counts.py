@@ -0,0 +1,172 @@
+import tensorcircuit as tc
+import numpy as np
+import tools
+import profiling
+from qft import qft, iqft
+
+# Gate counts of a built circuit, read off its gate list without simulating it:
+#	gates		by type: h, x, cnot, cphase, phase, ccphase, toffoli, cswap, multicontrol,
+#			any (dense blocks), ...; the 3 cphase + 2 cnot of a doubly controlled phase
+#			(tools.ccphase, controlled) count once as ccphase
+#	two-qubit	gates on exactly two qubits, with every ccphase as its 5 two-qubit gates
+#	rotations	gates with a non-zero angle
+#	depth		ASAP layers, one per gate on its qubits (a dense block too)
+# Build inside gate_level() to count through the blocks instead of one "any" each.
+
+NAMES = {"fredkin": "cswap"}
+
+def _name(d):
+	name = d["gatef"].n
+	return NAMES.get(name, name)
+
+def _theta(d):
+	return float(np.real(d.get("parameters", {}).get("theta", 0)))
+
+def _is_ccphase(window):
+	if [_name(d) for d in window] != ["cphase", "cphase", "cnot", "cphase", "cnot"]:
+		return False
+	(c1, t), (c2, t2), swap, (c3, t3), swap2 = [list(d["index"]) for d in window]
+	theta = _theta(window[0])
+	return t == t2 == t3 and c3 == c2 and swap == swap2 == [c1, c2] and np.isclose(_theta(window[1]), theta) and np.isclose(_theta(window[3]), -theta)
+
+class Counts:
+	def __init__(self, gates = None, two_qubit = 0, rotations = 0, depth = 0, width = 0):
+		self.gates = gates or {}
+		self.two_qubit = two_qubit
+		self.rotations = rotations
+		self.depth = depth
+		self.width = width
+
+	@property
+	def total(self):
+		return sum(self.gates.values())
+
+	# one circuit after the other
+	def __add__(self, other):
+		gates = dict(self.gates)
+		for k, v in other.gates.items():
+			gates[k] = gates.get(k, 0) + v
+		return Counts(gates, self.two_qubit + other.two_qubit, self.rotations + other.rotations, self.depth + other.depth, max(self.width, other.width))
+
+	def summary(self):
+		return ", ".join(f"{k} {v}" for k, v in sorted(self.gates.items(), key = lambda kv: -kv[1]))
+
+	def __repr__(self):
+		return f"Counts(gates {self.total} [{self.summary()}], two-qubit {self.two_qubit}, rotations {self.rotations}, depth {self.depth}, width {self.width})"
+
+def counts(circuit):
+	gates = circuit.to_qir()
+	result = Counts(width = circuit._nqubits)
+	layer = {}
+	i = 0
+	while i < len(gates):
+		if _is_ccphase(gates[i:i + 5]):
+			step, name = 5, "ccphase"
+		else:
+			step, name = 1, _name(gates[i])
+		result.gates[name] = result.gates.get(name, 0) + 1
+		for d in gates[i:i + step]:
+			if len(d["index"]) == 2:
+				result.two_qubit += 1
+			if _theta(d) % (2 * np.pi):
+				result.rotations += 1
+			top = max(layer.get(q, 0) for q in d["index"]) + 1
+			for q in d["index"]:
+				layer[q] = top
+		i += step
+	result.depth = max(layer.values(), default = 0)
+	return result
+
+# QFT and IQFT passes in a gate list: runs that are exactly qft(m) or iqft(m) (m >= 2) on
+# some m qubits. A QFT opens with H on its top qubit and then one cphase onto it from each
+# other qubit, which fixes m; an IQFT opens with H on its bottom qubit and grows by a run of
+# cphases from every qubit so far onto the next one and H on that one.
+def _matches(gates, i, template, qubits):
+	if i + len(template) > len(gates):
+		return False
+	for d, t in zip(gates[i:i + len(template)], template):
+		if _name(d) != _name(t) or list(d["index"]) != [qubits[q] for q in t["index"]] or not np.isclose(_theta(d), _theta(t)):
+			return False
+	return True
+
+def _transform(gates, i):
+	if _name(gates[i]) != "h":
+		return 0
+	top = gates[i]["index"][0]
+	k = i + 1
+	while k < len(gates) and _name(gates[k]) == "cphase" and gates[k]["index"][1] == top:
+		k += 1
+	qubits = [gates[j]["index"][0] for j in range(i + 1, k)] + [top]
+	if len(qubits) > 1 and _matches(gates, i, qft(len(qubits)).to_qir(), qubits):
+		return len(qft(len(qubits)).to_qir())
+	qubits, k = [top], i + 1
+	while k + len(qubits) < len(gates):
+		run = gates[k:k + len(qubits) + 1]
+		target = run[0]["index"][-1]
+		if [_name(d) for d in run] != ["cphase"] * len(qubits) + ["h"] or [list(d["index"]) for d in run] != [[q, target] for q in qubits] + [[target]]:
+			break
+		qubits.append(target)
+		k += len(run)
+	if len(qubits) > 1 and _matches(gates, i, iqft(len(qubits)).to_qir(), qubits):
+		return k - i
+	return 0
+
+def transforms(circuit):
+	gates = circuit.to_qir()
+	result, i = 0, 0
+	while i < len(gates):
+		step = _transform(gates, i)
+		result += step > 0
+		i += step or 1
+	return result
+
+# Profiler that keeps, for every module in the call tree, the counts of the circuits it
+# returned, summed over its calls; each module's counts include those of the modules it called
+class Tally(profiling.Profiler):
+	def __init__(self, memory = False):
+		super().__init__(False)
+
+	def built(self, circuit):
+		if isinstance(circuit, tc.Circuit):
+			node = self.stack[-1]
+			node.counts = getattr(node, "counts", Counts()) + counts(circuit)
+
+	def report(self, node = None, depth = 0, limit = 0):
+		if node is None:
+			node = self.root
+			print(f"{'module':<48} {'calls':>7} {'gates':>8} {'2-qubit':>8} {'rotations':>9} {'depth':>7}  by type")
+		c = getattr(node, "counts", None)
+		if c is not None:
+			print(f"{'  ' * depth + node.name:<48} {node.calls:>7} {c.total:>8} {c.two_qubit:>8} {c.rotations:>9} {c.depth:>7}  {c.summary()}")
+			depth += 1
+		for child in sorted(node.children.values(), key = lambda n: -getattr(n, "counts", Counts()).total):
+			self.report(child, depth)
+
+# counts of builder(*stuff, **parameters) per module of its call tree, built at gate level
+# unless dense = True
+def module_counts(builder, *stuff, dense = False, **parameters):
+	tally = profiling.enable(memory = False, profiler = Tally)
+	try:
+		if dense:
+			circuit = builder(*stuff, **parameters)
+		else:
+			with tools.gate_level():
+				circuit = getattr(builder, "gates", builder)(*stuff, **parameters)
+	finally:
+		profiling.disable()
+	tally.root.name = builder.__name__
+	tally.root.counts = counts(circuit)
+	return tally
+
+# builds: {name: () -> circuit}, e.g. one per adder engine or multiplier
+def compare(builds):
+	print(f"{'':>12} {'width':>6} {'gates':>8} {'2-qubit':>8} {'rotations':>9} {'depth':>7}  by type")
+	for name, build in builds.items():
+		with tools.gate_level():
+			c = counts(build())
+		print(f"{name:>12} {c.width:>6} {c.total:>8} {c.two_qubit:>8} {c.rotations:>9} {c.depth:>7}  {c.summary()}")
+
+if __name__ == "__main__":
+	from point_addition import ecc_registers, cond_ECC_add_0
+	alloc, p, x, z = ecc_registers()
+	module_counts(cond_ECC_add_0, p, x, 2, 4, z, alloc = alloc).report()
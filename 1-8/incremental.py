@@ -0,0 +1,156 @@
+import tensorcircuit as tc
+import numpy as np
+import hashlib
+import os
+import time
+from collections import OrderedDict
+import tools
+from tools import section, note, save_array
+from noise import _index
+
+# Incremental re-simulation. The gate list is hashed gate by gate (name, qubits, parameters,
+# dense unitaries by content), and the running hash at each checkpoint (the module
+# boundaries tools records on append, every `every` gates otherwise) keys the statevector
+# reached there. Simulating a rebuilt circuit starts from the longest prefix whose state is
+# cached, so changing the tail of cond_ECC_add_0 only re-simulates the tail.
+# States live in RAM up to memory bytes, least recently used first out; with a directory
+# (or cache.enable()) evicted states are written there as prefix-<hash>.npy and read back
+# memory-mapped.
+#	psi = incremental_state(circuit, [([p], 1), (x[0:4], 1), (x[4:8], 2)])
+
+class PrefixCache:
+	def __init__(self, memory = 2 ** 30, directory = None):
+		self.memory = memory
+		self.directory = directory
+		self.states = OrderedDict()
+		self.used = 0
+		self.resumed = 0
+
+	def _path(self, key):
+		directory = self.directory or tools._disk
+		return os.path.join(directory, f"prefix-{key}.npy") if directory else None
+
+	def get(self, key):
+		if key in self.states:
+			self.states.move_to_end(key)
+			return self.states[key]
+		path = self._path(key)
+		if path and os.path.exists(path):
+			return np.load(path, mmap_mode = "r")
+		return None
+
+	def put(self, key, psi):
+		psi = np.asarray(psi)
+		psi.setflags(write = False)
+		if key in self.states:
+			self.used -= self.states.pop(key).nbytes
+		self.states[key] = psi
+		self.used += psi.nbytes
+		while self.used > self.memory and self.states:
+			old, array = self.states.popitem(last = False)
+			self.used -= array.nbytes
+			path = self._path(old)
+			if path and not os.path.exists(path):
+				save_array(path, array)
+
+	def clear(self):
+		self.states.clear()
+		self.used = 0
+
+_cache = PrefixCache()
+
+# gate count after every module boundary, and every `every` gates in between
+def checkpoints(circuit, every = 256):
+	total = len(circuit.to_qir())
+	marks = set(getattr(circuit, "_boundaries", ())) | set(range(every, total, every)) | {total}
+	return sorted(m for m in marks if 0 < m <= total)
+
+def _gate_key(d, unitaries):
+	parameters = []
+	for k, v in sorted(d.get("parameters", {}).items()):
+		if k == "unitary":
+			if id(v) not in unitaries:
+				a = np.ascontiguousarray(tc.backend.numpy(getattr(v, "tensor", v)))
+				unitaries[id(v)] = (v, hashlib.sha256(a.tobytes()).hexdigest())
+			v = unitaries[id(v)][1]
+		elif k == "ctrl":
+			v = [int(b) for b in v]
+		else:
+			v = float(np.real(v))
+		parameters.append((k, v))
+	return repr((d["gatef"].n, [int(q) for q in d["index"]], parameters)).encode()
+
+# prefix hash at each of the marks
+def prefix_keys(circuit, marks, start = ""):
+	gates = circuit.to_qir()
+	h = hashlib.sha256(repr((circuit._nqubits, tc.dtypestr, start)).encode())
+	unitaries = {}
+	keys = {}
+	position = 0
+	for m in marks:
+		for d in gates[position:m]:
+			h.update(_gate_key(d, unitaries))
+		keys[m] = h.copy().hexdigest()[:32]
+		position = m
+	return keys
+
+# statevector of circuit on the basis input (registers little-endian like int_to_qubits) or
+# on initial; cache.resumed is the gate it picked up from
+def incremental_state(circuit, inputs = (), initial = None, cache = None, every = 256, chunk = 32):
+	cache = cache if cache is not None else _cache
+	gates = circuit.to_qir()
+	n = circuit._nqubits
+	if initial is not None:
+		start = hashlib.sha256(np.ascontiguousarray(initial).tobytes()).hexdigest()
+	else:
+		start = repr([([int(q) for q in register], int(value)) for register, value in inputs])
+	marks = checkpoints(circuit, every)
+	keys = prefix_keys(circuit, marks, start)
+
+	position, psi = 0, None
+	for m in reversed(marks):
+		psi = cache.get(keys[m])
+		if psi is not None:
+			position = m
+			break
+	if psi is None:
+		if initial is not None:
+			psi = np.asarray(initial, dtype = tc.dtypestr).reshape(-1)
+		else:
+			psi = np.zeros(2 ** n, dtype = tc.dtypestr)
+			psi[_index(n, inputs)] = 1
+	cache.resumed = position
+
+	with section("incremental"):
+		note(resumed = position, simulated = len(gates) - position)
+		for m in marks:
+			if m <= position:
+				continue
+			segment = tools.Circuit.from_qir(gates[position:m], {"nqubits": n})
+			psi = tc.backend.numpy(tools.state(segment, chunk, inputs = np.asarray(psi)))
+			cache.put(keys[m], psi)
+			position = m
+	return np.array(psi)
+
+if __name__ == "__main__":
+	from point_addition import ecc_registers, cond_ECC_add_0
+	alloc, p, x, z = ecc_registers()
+	inputs = [([p], 1), (x[0:4], 1), (x[4:8], 2)]
+	with tools.gate_level():
+		circuit = cond_ECC_add_0(p, x, 2, 4, z, alloc = alloc)
+	print(f"{len(circuit.to_qir())} gates, {len(checkpoints(circuit))} checkpoints")
+	begin = time.time()
+	a = incremental_state(circuit, inputs)
+	print(f"first run: {time.time() - begin:.2f}s from gate {_cache.resumed}")
+	# rebuilt with another tail: everything up to the last shared checkpoint is reused
+	with tools.gate_level():
+		changed = cond_ECC_add_0(p, x, 2, 4, z, alloc = alloc)
+	changed.append(tools.int_to_qubits(z[0:4], 5))
+	begin = time.time()
+	b = incremental_state(changed, inputs)
+	print(f"tail changed: {time.time() - begin:.2f}s from gate {_cache.resumed} of {len(changed.to_qir())}")
+	reference = tools.Circuit(circuit._nqubits)
+	for register, value in inputs:
+		reference.append(tools.int_to_qubits(register, value))
+	reference.append(changed)
+	print(f"matches a full simulation: {np.allclose(b, tc.backend.numpy(tools.state(reference)), atol = 1e-5)}")
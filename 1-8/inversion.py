@@ -0,0 +1,109 @@
+import tensorcircuit as tc
+import time
+from tools import *
+from addition import add, cond_add
+from modular_addition import cadd_mod_const
+from multiplication import cond_mod_doubling
+from uncompute import compute, uncompute
+
+# Modular inversion for any odd modulus p (Kaliski's binary extended Euclid).
+# Start with u = p, v = a, r = 0, s = 1 and run 2n rounds (n = p.bit_length()); a round
+# is idle once v = 0 and otherwise does, with u and v/r and s swapped first when needed,
+#	u even		: u /= 2, s *= 2
+#	v even		: v /= 2, r *= 2		(swapped)
+#	u > v, odd	: u = (u - v) / 2, r += s, s *= 2
+#	v > u, odd	: v = (v - u) / 2, s += r, r *= 2	(swapped)
+# After k active rounds r = -a^-1 * 2^k mod p with k in [n, 2n], r, s < 2p and u = 1, v = 0.
+# Each round keeps four bits: idle (v = 0), u > v, subtract and swap, so the rounds are
+# reversible and are uncomputed once the result has been copied out.
+
+def inverse_ancillas(p):
+	n = p.bit_length()
+	return 4 * (n + 1) + 8 * n + 1
+
+def kaliski_round(u, v, r, s, bits):
+	idle, greater, sub, swap = bits
+	w = len(u)
+	c = Circuit(max(u + v + r + s + bits) + 1)
+	pair = list(range(w)), list(range(w, 2 * w))
+	a, b = list(range(1, w + 1)), list(range(w + 1, 2 * w + 1))
+
+	c.multicontrol(*v, idle, ctrl = [0] * w, unitary = tc.gates._x_matrix)
+	c.append(add.inverse(*pair), indices = u + v)
+	c.cnot(v[w - 1], greater)
+	c.append(add(*pair), indices = u + v)
+
+	c.multicontrol(idle, u[0], v[0], sub, ctrl = [0, 1, 1], unitary = tc.gates._x_matrix)
+	c.multicontrol(idle, u[0], v[0], swap, ctrl = [0, 1, 0], unitary = tc.gates._x_matrix)
+	c.multicontrol(idle, u[0], v[0], greater, swap, ctrl = [0, 1, 1, 0], unitary = tc.gates._x_matrix)
+
+	for i, j in zip(u + r, v + s):
+		c.cswap(swap, i, j)
+	c.append(cond_add.inverse(0, b, a), indices = [sub] + u + v)
+	c.append(cond_add(0, a, b), indices = [sub] + s + r)
+
+	# u is even and s < p here: halve u and double s by rotating them
+	c.x(idle)
+	for i in range(w - 1):
+		c.cswap(idle, u[i], u[i + 1])
+	for i in reversed(range(w - 1)):
+		c.cswap(idle, s[i], s[i + 1])
+	c.x(idle)
+
+	for i, j in zip(u + r, v + s):
+		c.cswap(swap, i, j)
+	return c
+
+# o = scale * x^-1 mod p (0 for x = 0) into a clean o (the idle-round doublings double
+# whatever o held), x and o hold p.bit_length() + 1 qubits, z = inverse_ancillas(p) clean
+# qubits; pass scale = R ** 2 mod p for Montgomery form
+def kaliski_inverse(x, o, z, p = 7, scale = 1):
+	n = p.bit_length()
+	w = n + 1
+	u, v, r, s = (z[i * w:(i + 1) * w] for i in range(4))
+	bits = z[4 * w:4 * w + 8 * n]
+	flag = z[4 * w + 8 * n]
+	c = Circuit(max(x + o + z) + 1)
+
+	with compute(c) as forward:
+		for i in range(n):
+			if p >> i & 1:
+				c.x(u[i])
+			c.cnot(x[i], v[i])
+		c.x(s[0])
+		for i in range(2 * n):
+			c.append(kaliski_round(u, v, r, s, bits[4 * i:4 * i + 4]))
+
+	# o = -scale * r * 2^-2n, then one doubling per idle round leaves scale * 2^-k * (-r)
+	value = -scale * pow(2, -2 * n, p) % p
+	for i in range(w):
+		c.append(cadd_mod_const(0, list(range(1, w + 1)), value * 2 ** i % p, [w + 1], modulus = p), indices = [r[i]] + o + [flag])
+	for i in range(2 * n):
+		c.append(cond_mod_doubling(w, p), indices = o + [bits[4 * i]])
+
+	uncompute(c, forward)
+	return c
+
+# gate and qubit counts at gate level; rounds are 2n Draper adders of n + 1 qubits,
+# so gates grow as O(n^3) and qubits as 14n + 7
+def inverse_cost(p):
+	n = p.bit_length()
+	w = n + 1
+	x, o = list(range(w)), list(range(w, 2 * w))
+	z = list(range(2 * w, 2 * w + inverse_ancillas(p)))
+	start = time.time()
+	with gate_level():
+		gates = kaliski_inverse(x, o, z, p).to_qir()
+	return {
+		"p": p,
+		"n": n,
+		"qubits": 2 * w + len(z),
+		"gates": len(gates),
+		"multi-qubit": len([d for d in gates if len(d["index"]) >= 2]),
+		"build": time.time() - start,
+	}
+
+if __name__ == "__main__":
+	for p in (5, 7, 13):
+		cost = inverse_cost(p)
+		print(f"p = {p:>3} (n = {cost['n']}) : qubits {cost['qubits']}, gates {cost['gates']} ({cost['multi-qubit']} multi-qubit), build {cost['build']:.2f}s")
@@ -0,0 +1,102 @@
+import tensorcircuit as tc
+import numpy as np
+from tools import *
+
+# Distribution of one or more registers (little-endian like int_to_qubits) without the 2^n
+# probability vector:
+#	statevector		summed over the other qubits in a reshaped view, runs of them merged
+#				into one axis; real and imaginary parts are views, so the only new
+#				array is the result
+#	Circuit, MPSCircuit	the reduced density matrix of the register qubits by partial
+#				contraction of <psi|psi> (tensorcircuit's QuVector), its diagonal
+#	sparse.SparseState	summed over its terms
+# marginal(psi, x) has shape (2^len(x),), marginal(psi, x, y) (2^len(x), 2^len(y)).
+#	value, probability = most_likely(circuit, x[0:4])
+
+def _check(n, registers):
+	qubits = [q for register in registers for q in register]
+	if len(set(qubits)) != len(qubits) or not all(0 <= q < n for q in qubits):
+		raise ValueError(f"registers {registers} overlap or fall outside {n} qubits")
+	return qubits
+
+def _shape(registers):
+	return tuple(2 ** len(register) for register in registers)
+
+def _dense(psi, registers):
+	psi = np.asarray(tc.backend.numpy(psi)).reshape(-1)
+	n = psi.size.bit_length() - 1
+	kept = set(_check(n, registers))
+	shape, label, summed = [], {}, False
+	for q in range(n):
+		if q in kept:
+			label[q] = len(shape)
+			shape.append(2)
+			summed = False
+		elif summed:
+			shape[-1] *= 2
+		else:
+			shape.append(2)
+			summed = True
+	axes = list(range(len(shape)))
+	output = [label[q] for register in registers for q in reversed(register)]
+	result = np.einsum(psi.real.reshape(shape), axes, psi.real.reshape(shape), axes, output)
+	if np.iscomplexobj(psi):
+		result = result + np.einsum(psi.imag.reshape(shape), axes, psi.imag.reshape(shape), axes, output)
+	return result.reshape(_shape(registers))
+
+def _network(circuit, registers):
+	n = circuit._nqubits
+	kept = sorted(_check(n, registers))
+	rho = circuit.get_quvector().reduced_density([q for q in range(n) if q not in kept])
+	diagonal = np.real(np.diag(tc.backend.numpy(rho.eval_matrix()))).reshape((2,) * len(kept))
+	order = [kept.index(q) for register in registers for q in reversed(register)]
+	return np.transpose(diagonal, order).reshape(_shape(registers))
+
+def _sparse(psi, registers):
+	_check(psi.nqubits, registers)
+	result = np.zeros(_shape(registers))
+	for values, probability in psi.probabilities(registers).items():
+		result[values] += probability
+	return result
+
+def marginal(state, *registers):
+	registers = [list(register) for register in registers]
+	if hasattr(state, "get_quvector"):
+		return _network(state, registers)
+	if hasattr(state, "amplitudes"):
+		return _sparse(state, registers)
+	return _dense(state, registers)
+
+# (value, or a tuple of values for several registers, and its probability)
+def most_likely(state, *registers):
+	p = marginal(state, *registers)
+	index = np.unravel_index(int(np.argmax(p)), p.shape)
+	values = tuple(int(v) for v in index)
+	return (values[0] if len(values) == 1 else values), float(p[index])
+
+if __name__ == "__main__":
+	import time
+	from point_addition import ecc_registers, cond_ECC_add_0
+	alloc, p, x, z = ecc_registers()
+	with gate_level():
+		circuit = cond_ECC_add_0(p, x, 2, 4, z, alloc = alloc)
+	c = Circuit(circuit._nqubits)
+	for register, value in (([p], 1), (x[0:4], 1), (x[4:8], 2)):
+		c.append(int_to_qubits(register, value))
+	c.append(circuit)
+	psi = state(c)
+	start = time.time()
+	print(f"x3, y3 = {most_likely(psi, x[0:4], x[4:8])}, lambda register {most_likely(psi, z[0:4])} ({time.time() - start:.4f}s from the statevector)")
+	start = time.time()
+	full = np.abs(tc.backend.numpy(psi)) ** 2
+	index = int(np.argmax(full))
+	print(f"full probabilities and argmax: state {index:014b} ({time.time() - start:.4f}s)")
+
+	small = Circuit(circuit._nqubits)
+	for register, value in (([p], 1), (x[0:4], 1), (x[4:8], 2)):
+		small.append(int_to_qubits(register, value))
+	from modular_addition import add_mod_const
+	with gate_level():
+		small.append(add_mod_const([0, 1, 2, 3], 5, [4]), indices = x[0:4] + [z[4]])
+	start = time.time()
+	print(f"partial contraction, x1 + 5 mod 7: {most_likely(small, x[0:4])} ({time.time() - start:.2f}s)")
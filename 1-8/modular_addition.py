@@ -1,123 +1,248 @@
 import tensorcircuit as tc
 from qft import QFT, IQFT
-from addition import add, cond_add
+from addition import add, cond_add, cond_phase_add
 from tools import *
-from constant_addition import add_const, cond_add_const, cond_cadd_const
+from constant_addition import add_const, cond_add_const, cond_cadd_const, add_const_terms, phase_add_const
+from adders import draper, less_than
 import numpy as np
 
+# adder: adders.draper or adders.ripple; the first qubit of z / flag is the comparison flag,
+# the ripple adder takes its scratch qubits from the rest
+
 @block
-def mod_add(x, y, z):
-	p = 7
-	n = max(x , y, z)
-	c = tc.Circuit(max(x + y + z) + 1)
-	c.append(add(x, y))
-	c.append(add_const(y, 2 ** n - p))
+def mod_add(x, y, z, modulus = 7, adder = draper):
+	p = modulus
+	n = len(y)
+	s = z[1:]
+	c = Circuit(max(x + y + z) + 1)
+	c.append(adder.add(x, y, s))
+	c.append(adder.add_const(y, 2 ** n - p, s))
 
 	c.cnot(y[n-1], z[0])
-	c.append(cond_add_const(z[0], y, p))
+	c.append(adder.cond_add_const(z[0], y, p, s))
 
-	c.append(add(x, y).inverse())
+	c.append(adder.add.inverse(x, y, s))
 	c.x(y[n-1])
 	c.cnot(y[n-1], z[0])
 	c.x(y[n-1])
-	c.append(add(x, y))
+	c.append(adder.add(x, y, s))
 	return c
 
 @block
-def cond_mod_add(p, x, y, z):
-	n = max(x, y, z)
-	p = 7
-	c = tc.Circuit(max([p] + x + y + z) + 1)
-	c.append(cond_add(p, x, y))
-	c.append(cond_add_const(p, y, 2 ** n - p))
+def cond_mod_add(p, x, y, z, modulus = 7, adder = draper):
+	n = len(y)
+	s = z[1:]
+	c = Circuit(max([p] + x + y + z) + 1)
+	c.append(adder.cond_add(p, x, y, s))
+	c.append(adder.cond_add_const(p, y, 2 ** n - modulus, s))
 
 	c.toffoli(p, y[n-1], z[0])
-	c.append(cond_cadd_const(p, z[0], y, p))
+	c.append(adder.cond_cadd_const(p, z[0], y, modulus, s))
 
-	c.append(cond_add(p, x, y).inverse())
+	c.append(adder.cond_add.inverse(p, x, y, s))
 	c.x(y[n-1])
 	c.toffoli(p, y[n-1], z[0])
 	c.x(y[n-1])
-	c.append(cond_add(p, x, y))
+	c.append(adder.cond_add(p, x, y, s))
 	return c
 
+# mod_add / cond_mod_add in three adder passes: after y += x - p (the sign bit of y says
+# x + y < p) and the conditional add of p back, the flag equals [y >= x], so it is cleared
+# by a carry-only comparison instead of subtracting and re-adding x. z[0] is the flag,
+# z[1] the comparator's carry, the ripple adder takes its scratch from z[1:] too.
+@block
+def mod_add_compare(x, y, z, modulus = 7, adder = draper):
+	n = len(y)
+	s = z[1:]
+	c = Circuit(max(x + y + z) + 1)
+	c.append(adder.add(x, y, s))
+	c.append(adder.add_const(y, 2 ** n - modulus, s))
+
+	c.cnot(y[n-1], z[0])
+	c.append(adder.cond_add_const(z[0], y, modulus, s))
+
+	c.append(less_than(y, x, z[1], z[0]))
+	c.x(z[0])
+	return c
 
 @block
-def negation(x, z):
-	n = max(x , z)
-	p = 7
-	c = tc.Circuit(max(x + z) + 1)
-	for i in range(n-1):
-		c.x(x[i])
-
-	c.append(add_const(x, 1))
-	c.cnot(x[n-1], z[0])
-	c.append(cond_add_const(z[0], x, 2 ** n - p))
-	c.append(add_const(x, 2 ** n - p - 1))
-	c.x(x[n-1])
-	c.cnot(x[n-1], z[0])
-	c.x(x[n-1])
-	c.append(add_const(x, 2 ** n - p))
+def cond_mod_add_compare(p, x, y, z, modulus = 7, adder = draper):
+	n = len(y)
+	s = z[1:]
+	c = Circuit(max([p] + x + y + z) + 1)
+	c.append(adder.cond_add(p, x, y, s))
+	c.append(adder.cond_add_const(p, y, 2 ** n - modulus, s))
+
+	c.toffoli(p, y[n-1], z[0])
+	c.append(adder.cond_cadd_const(p, z[0], y, modulus, s))
+
+	c.append(less_than(y, x, z[1], z[0], [p]))
+	c.cnot(p, z[0])
 	return c
 
+# x -> -x mod p: z flags x != 0, then the bits of x are flipped and p + 1 added
 @block
-def cond_negation(p, x, z):
-	n = max(p, x, z)
-	p = 7
-	c = tc.Circuit(max([p] + x + z) + 1)
-	for i in range(n-1):
-		c.cnot(p, x[i])
-	
-	c.append(cond_add_const(p, x, 1))
-	c.toffoli(p, x[n-1], z[0])
-	c.append(cond_cadd_const(p, z[0], x, 2 ** n - p))
-	c.append(cond_add_const(p, x, 2 ** n - p - 1))
-	c.x(x[n-1])
-	c.toffoli(p, x[n-1], z[0])
-	c.x(x[n-1])
-	c.append(cond_add_const(p, x, 2 ** n - p))
+def negation(x, z, modulus = 7, adder = draper):
+	n = len(x)
+	s = z[1:]
+	c = Circuit(max(x + z) + 1)
+	c.x(z[0])
+	c.multicontrol(*x, z[0], ctrl = [0] * n, unitary = tc.gates._x_matrix)
+	for i in range(n):
+		c.cnot(z[0], x[i])
+	c.append(adder.cond_add_const(z[0], x, modulus + 1, s))
+	c.multicontrol(*x, z[0], ctrl = [0] * n, unitary = tc.gates._x_matrix)
+	c.x(z[0])
 	return c
 
 @block
-def add_mod_const(x, val, z):
-	n = max(p, x, z)
-	p = 7
-	c = tc.Circuit(max(x + z) + 1)
-	c.append(add_const(x, val))
-	c.append(add_const(x, 2 ** n - p))
+def cond_negation(p, x, z, modulus = 7, adder = draper):
+	n = len(x)
+	s = z[1:]
+	c = Circuit(max([p] + x + z) + 1)
+	c.cnot(p, z[0])
+	c.multicontrol(p, *x, z[0], ctrl = [1] + [0] * n, unitary = tc.gates._x_matrix)
+	for i in range(n):
+		c.cnot(z[0], x[i])
+	c.append(adder.cond_add_const(z[0], x, modulus + 1, s))
+	c.multicontrol(p, *x, z[0], ctrl = [1] + [0] * n, unitary = tc.gates._x_matrix)
+	c.cnot(p, z[0])
+	return c
+
+@block
+def add_mod_const(x, val, z, modulus = 7, adder = draper):
+	n = len(x)
+	p = modulus
+	s = z[1:]
+	c = Circuit(max(x + z) + 1)
+	c.append(adder.add_const(x, val, s))
+	c.append(adder.add_const(x, 2 ** n - p, s))
 
 	c.cnot(x[n-1], z[0])
-	c.append(cond_add_const(z[0], x, 2 ** n - p))
+	c.append(adder.cond_add_const(z[0], x, p, s))
 
-	c.append(add_const(x, val).inverse())
+	c.append(adder.add_const.inverse(x, val, s))
 	c.x(x[n-1])
 	c.cnot(x[n-1], z[0])
 	c.x(x[n-1])
-	c.append(add_const(x, val))
+	c.append(adder.add_const(x, val, s))
 	return c
 
 @block
-def cadd_mod_const(ctrl, target, value, flag):
-	circuit = tc.Circuit(max([ctrl] + target + flag) + 1)
-	circuit.append(cond_add_const(ctrl, target, value))
-	circuit.append(add_const(target, 9))
-
-	circuit.cnot(target[3], flag[0])
-	circuit.append(cond_add_const(flag[0], target, 7))
-    
-	circuit.append(cond_add_const(ctrl, target, value).inverse())
-	circuit.x(target[3])
-	circuit.cnot(target[3], flag[0])
-	circuit.x(target[3])
-	circuit.append(cond_add_const(ctrl, target, value))
+def cadd_mod_const(ctrl, target, value, flag, modulus = 7, adder = draper):
+	n = len(target)
+	s = flag[1:]
+	circuit = Circuit(max([ctrl] + target + flag) + 1)
+	circuit.append(adder.cond_add_const(ctrl, target, value, s))
+	circuit.append(adder.add_const(target, 2 ** n - modulus, s))
+
+	circuit.cnot(target[n - 1], flag[0])
+	circuit.append(adder.cond_add_const(flag[0], target, modulus, s))
+
+	circuit.append(adder.cond_add_const.inverse(ctrl, target, value, s))
+	circuit.x(target[n - 1])
+	circuit.cnot(target[n - 1], flag[0])
+	circuit.x(target[n - 1])
+	circuit.append(adder.cond_add_const(ctrl, target, value, s))
 	return circuit
 
+# one doubly controlled pass in place of three cadd_mod_const calls
 @block
-def ccadd_mod_const(ctrl1, ctrl2, target, value, flag):
-	circuit = tc.Circuit(max([ctrl1, ctrl2] + target + flag) + 1)
-	circuit.append(cadd_mod_const(0, [1, 2, 3, 4], value * 4 % 7, [5]), indices=[ctrl1] + target + [flag[0]])
-	circuit.cnot(ctrl2, ctrl1)
-	circuit.append(cadd_mod_const(0, [1, 2, 3, 4], value * 3 % 7, [5]), indices=[ctrl1] + target + [flag[0]])
-	circuit.cnot(ctrl2, ctrl1)
-	circuit.append(cadd_mod_const(0, [1, 2, 3, 4], value * 4 % 7, [5]), indices=[ctrl2] + target + [flag[0]])
+def ccadd_mod_const(ctrl1, ctrl2, target, value, flag, modulus = 7, adder = draper):
+	n = len(target)
+	s = flag[1:]
+	circuit = Circuit(max([ctrl1, ctrl2] + target + flag) + 1)
+	circuit.append(adder.cond_cadd_const(ctrl1, ctrl2, target, value, s))
+	circuit.append(adder.add_const(target, 2 ** n - modulus, s))
+
+	circuit.cnot(target[n - 1], flag[0])
+	circuit.append(adder.cond_add_const(flag[0], target, modulus, s))
+
+	circuit.append(adder.cond_cadd_const.inverse(ctrl1, ctrl2, target, value, s))
+	circuit.x(target[n - 1])
+	circuit.cnot(target[n - 1], flag[0])
+	circuit.x(target[n - 1])
+	circuit.append(adder.cond_cadd_const(ctrl1, ctrl2, target, value, s))
 	return circuit
+
+# add_mod_const / cadd_mod_const with the classical additions folded: + value and - p
+# are one adder, and the flagged + p with the - value before the flag fix share one QFT
+# frame (two adders with the ripple engine), so 3 adder passes instead of 5; same unitary
+@block
+def add_mod_const_folded(x, val, z, modulus = 7, adder = draper):
+	n = len(x)
+	s = z[1:]
+	c = Circuit(max(x + z) + 1)
+	c.append(adder.add_const(x, (val - modulus) % 2 ** n, s))
+	c.cnot(x[n - 1], z[0])
+	if adder is draper:
+		c.append(add_const_terms(x, ((z[0], modulus), (None, -val % 2 ** n))))
+	else:
+		c.append(adder.cond_add_const(z[0], x, modulus, s))
+		c.append(adder.add_const(x, -val % 2 ** n, s))
+	c.x(x[n - 1])
+	c.cnot(x[n - 1], z[0])
+	c.x(x[n - 1])
+	c.append(adder.add_const(x, val, s))
+	return c
+
+@block
+def cadd_mod_const_folded(ctrl, target, value, flag, modulus = 7, adder = draper):
+	n = len(target)
+	s = flag[1:]
+	circuit = Circuit(max([ctrl] + target + flag) + 1)
+	if adder is draper:
+		circuit.append(add_const_terms(target, ((ctrl, value), (None, -modulus % 2 ** n))))
+	else:
+		circuit.append(adder.cond_add_const(ctrl, target, value, s))
+		circuit.append(adder.add_const(target, 2 ** n - modulus, s))
+	circuit.cnot(target[n - 1], flag[0])
+	if adder is draper:
+		circuit.append(add_const_terms(target, ((flag[0], modulus), (ctrl, -value % 2 ** n))))
+	else:
+		circuit.append(adder.cond_add_const(flag[0], target, modulus, s))
+		circuit.append(adder.cond_add_const.inverse(ctrl, target, value, s))
+	circuit.x(target[n - 1])
+	circuit.cnot(target[n - 1], flag[0])
+	circuit.x(target[n - 1])
+	circuit.append(adder.cond_add_const(ctrl, target, value, s))
+	return circuit
+
+# Modular additions into an accumulator y held in the QFT basis (QFT(y)) between them, so
+# the additions themselves are phase layers. Only the additions are: the reduction
+# (Beauregard) reads the sign bit twice, once after - p and once after the addend is
+# subtracted again to clear the flag, and each read is an IQFT / QFT pair around one CNOT,
+# so a modular addition still costs four transforms (cond_mod_add costs ten). There is no
+# comparison in the phase basis here; montgomery.fourier_redc is the engine that keeps its
+# accumulator there, with one IQFT per product (counts.transforms, compare_multipliers).
+# y has modulus.bit_length() + 1 qubits like the other modular adders, and flag is one
+# clean qubit. add(sign) adds sign * the (controlled) addend.
+def _fourier_mod_add(c, add, y, flag, modulus):
+	n = len(y)
+	add(1)
+	phase_add_const(c, -modulus, y)
+	c.append(IQFT(y))
+	c.cnot(y[n - 1], flag)
+	c.append(QFT(y))
+	phase_add_const(c, modulus, y, [flag])
+	add(-1)
+	c.append(IQFT(y))
+	c.x(y[n - 1])
+	c.cnot(y[n - 1], flag)
+	c.x(y[n - 1])
+	c.append(QFT(y))
+	add(1)
+
+# cond_mod_add with y in the QFT basis on both sides
+@block
+def cond_mod_add_fourier(p, x, y, z, modulus = 7):
+	c = Circuit(max([p] + x + y + z) + 1)
+	_fourier_mod_add(c, lambda sign: cond_phase_add(c, p, x, y, sign), y, z[0], modulus)
+	return c
+
+# target += value mod p if all of ctrl (a list of up to two qubits), target in the QFT basis
+@block
+def add_mod_const_fourier(ctrl, target, value, flag, modulus = 7):
+	c = Circuit(max(ctrl + target + flag) + 1)
+	_fourier_mod_add(c, lambda sign: phase_add_const(c, sign * value, target, ctrl), target, flag[0], modulus)
+	return c
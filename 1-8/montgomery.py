@@ -0,0 +1,158 @@
+import tensorcircuit as tc
+import numpy as np
+import time
+from tools import *
+from qft import IQFT, _theta
+from addition import cond_add, cond_phase_add
+from constant_addition import add_const, cond_add_const, phase_add_const
+from modular_addition import mod_add
+from sum_of_squares import add_mod_square
+from uncompute import compute, uncompute
+
+# Montgomery representation v -> v * R mod p with R = 2 ** p.bit_length().
+# Values are converted once at the oracle boundary (classically, x2/y2 are
+# constants); additions, negations and multiplications stay in the form.
+def to_montgomery(value, p):
+	return value * 2 ** p.bit_length() % p
+
+def from_montgomery(value, p):
+	return value * pow(2, -p.bit_length(), p) % p
+
+# t (n + 2 qubits) | m (n quotient bits) | flag | clean flag for the final mod_add
+def mont_ancillas(p):
+	return 2 * p.bit_length() + 4
+
+# REDC: for every bit of x, t += x_i * y, then add m_i * p to make t even and
+# halve it by relabelling the register. Leaves t = x * y / R mod p (n + 2 bits,
+# returned in logical order) with the quotient bits in m and the comparison in flag.
+def redc(x, y, t, m, flag, p):
+	n = p.bit_length()
+	w = n + 2
+	c = Circuit(max(x + y + t + m + flag) + 1)
+	for i in range(n):
+		c.append(cond_add(0, list(range(1, n + 1)), list(range(n + 1, n + 1 + w))), indices = [x[i]] + y[0:n] + t)
+		c.cnot(t[0], m[i])
+		c.append(cond_add_const(0, list(range(1, w + 1)), p), indices = [m[i]] + t)
+		t = t[1:] + t[:1]
+
+	# t < 2p: subtract p, keep the sign in flag, add p back if it went negative
+	c.append(add_const(list(range(w)), 2 ** w - p), indices = t)
+	c.cnot(t[-1], flag[0])
+	c.append(cond_add_const(0, list(range(1, w + 1)), p), indices = [flag[0]] + t)
+	return c, t
+
+# same interface as mod_multiplication: o += x * y / R mod p, z = mont_ancillas(p) clean qubits
+def mont_multiplication(x, y, o, z, p = 7):
+	n = p.bit_length()
+	t, m, flag, clean = z[0:n + 2], z[n + 2:2 * n + 2], z[2 * n + 2:2 * n + 3], z[2 * n + 3]
+	c = Circuit(max(x + y + o + z) + 1)
+
+	with compute(c) as forward:
+		redc_circuit, result = redc(x, y, t, m, flag, p)
+		c.append(redc_circuit)
+
+	k = len(o)
+	c.append(mod_add(list(range(k)), list(range(k, 2 * k)), [2 * k], modulus = p), indices = result[0:k] + o + [clean])
+	uncompute(c, forward)
+	return c
+
+# o += x ** 2 / R mod p, the squaring of a Montgomery form: x ** 2 mod p (< p) into t with
+# add_mod_square, then the REDC halvings t -> (t + m_i * p) / 2, which keep t < p.
+# z = mont_ancillas(p) clean qubits like mont_multiplication
+def mont_square(x, o, z, p = 7):
+	n = p.bit_length()
+	w = n + 2
+	t, m, flag, clean = z[0:w], z[w:w + n], z[w + n], z[w + n + 1]
+	c = Circuit(max(x + o + z) + 1)
+
+	with compute(c) as forward:
+		c.append(add_mod_square(list(range(n)), list(range(n, 2 * n + 1)), [2 * n + 1], modulus = p), indices = x[0:n] + t[0:n + 1] + [flag])
+		for i in range(n):
+			c.cnot(t[0], m[i])
+			c.append(cond_add_const(0, list(range(1, w + 1)), p), indices = [m[i]] + t)
+			t = t[1:] + t[:1]
+
+	k = len(o)
+	c.append(mod_add(list(range(k)), list(range(k, 2 * k)), [2 * k], modulus = p), indices = t[0:k] + o + [clean])
+	uncompute(c, forward)
+	return c
+
+# Fourier-domain REDC: the accumulator a (2n + 2 qubits, starting in |0>) is put in the
+# phase basis once by Hadamards. There a[i + q] carries exp(2 pi i t / 2^(q + 1)), so
+# t += x_i * y is a layer of doubly controlled phases, a Hadamard on a[i] reads t mod 2
+# into the quotient bit m_i = a[i], and phases controlled by it add m_i * p and drop the
+# low qubit, i.e. t -> (t + m_i * p) / 2. The last n + 2 qubits then hold t < 2p;
+# p is subtracted in the phase basis before the single IQFT, so the comparison is the
+# sign bit, and the flag adds p back.
+def fourier_redc(x, y, a, flag, p):
+	n = p.bit_length()
+	c = Circuit(max(x + y + a + flag) + 1)
+	for q in a:
+		c.h(q)
+	for i in range(n):
+		cond_phase_add(c, x[i], y[0:n], a[i:])
+		c.h(a[i])
+		for q in range(1, len(a) - i):
+			if _theta(p, q):
+				c.cphase(a[i], a[i + q], theta = _theta(p, q))
+
+	t = a[n:]
+	phase_add_const(c, 2 ** len(t) - p, t)
+	c.append(IQFT(t))
+	c.cnot(t[-1], flag[0])
+	c.append(cond_add_const(0, list(range(1, len(t) + 1)), p), indices = [flag[0]] + t)
+	return c, t
+
+def fourier_ancillas(p):
+	return 2 * p.bit_length() + 4
+
+# mont_multiplication with the accumulator kept in the phase basis: one QFT (Hadamards on
+# |0>) and one IQFT per product instead of a QFT pair per addition
+def fourier_multiplication(x, y, o, z, p = 7):
+	n = p.bit_length()
+	a, flag, clean = z[0:2 * n + 2], z[2 * n + 2:2 * n + 3], z[2 * n + 3]
+	c = Circuit(max(x + y + o + z) + 1)
+
+	with compute(c) as forward:
+		redc_circuit, result = fourier_redc(x, y, a, flag, p)
+		c.append(redc_circuit)
+
+	k = len(o)
+	c.append(mod_add(list(range(k)), list(range(k, 2 * k)), [2 * k], modulus = p), indices = result[0:k] + o + [clean])
+	uncompute(c, forward)
+	return c
+
+# multipliers that leave their product in Montgomery form
+MONTGOMERY = (mont_multiplication, fourier_multiplication)
+
+def compare_multipliers(p = 7, samples = ((3, 5, 0), (6, 6, 2), (2, 3, 4))):
+	from multiplication import mod_multiplication
+	from modular_addition import cond_mod_add_fourier
+	from counts import counts, transforms
+	n = p.bit_length() + 1
+	x, y, o = list(range(n)), list(range(n, 2 * n)), list(range(2 * n, 3 * n))
+	engines = {
+		"schoolbook": lambda: mod_multiplication(x, y, o, [3 * n]),
+		"qft accum": lambda: mod_multiplication(x, y, o, [3 * n], mod_adder = cond_mod_add_fourier),
+		"montgomery": lambda: mont_multiplication(x, y, o, list(range(3 * n, 3 * n + mont_ancillas(p))), p = p),
+		"fourier": lambda: fourier_multiplication(x, y, o, list(range(3 * n, 3 * n + fourier_ancillas(p))), p = p),
+	}
+	for name, build in engines.items():
+		start = time.time()
+		dense = build()
+		built = time.time() - start
+		with gate_level():
+			circuit = build()
+		gates = counts(circuit)
+		start = time.time()
+		for a, b, v in samples:
+			c = Circuit(dense._nqubits)
+			for register, value in ((x, a), (y, b), (o, v)):
+				c.append(int_to_qubits(register, value))
+			c.append(dense)
+			state(c)
+		simulated = (time.time() - start) / len(samples)
+		print(f"{name:>10} : width {dense._nqubits}, gates {gates.total} ({gates.two_qubit} two-qubit, depth {gates.depth}), QFT / IQFT {transforms(circuit)}, build {built:.2f}s, simulation {simulated:.2f}s")
+
+if __name__ == "__main__":
+	compare_multipliers()
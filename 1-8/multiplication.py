@@ -2,47 +2,68 @@ import tensorcircuit as tc
 from modular_addition import * 
 from constant_addition import *
 from tools import *
+from sum_of_squares import add_mod_square
 
 @block
-def mod_doubling():
-	x = [0, 1, 2, 3]
-	c = tc.Circuit(len(x))
+def mod_doubling(n = 4, modulus = 7):
+	x = list(range(n))
+	c = Circuit(len(x))
 	for i in reversed(range(len(x) - 1)):
 		c.SWAP(x[i], x[i + 1])
-	c.append(add_const(x, 16 - 7))
-	c.append(cond_add_const(x[-1], x[0:-1], 7))
+	c.append(add_const(x, 2 ** n - modulus))
+	c.append(cond_add_const(x[-1], x[0:-1], modulus))
 	c.X(x[0])
 	c.CNOT(x[0], x[-1])
 	c.X(x[0])
 	return c
 
-def mod_multiplication(x, y, o, z):
-	c = tc.Circuit(max(x + y + o + z) + 1)
+# mod_doubling on qubits 0..n-1 controlled by qubit n
+@block
+def cond_mod_doubling(n = 4, modulus = 7):
+	p, x = n, list(range(n))
+	c = Circuit(n + 1)
+	for i in reversed(range(len(x) - 1)):
+		c.cswap(p, x[i], x[i + 1])
+	c.append(cond_add_const(p, x, 2 ** n - modulus))
+	c.append(cond_cadd_const(p, x[-1], x[0:-1], modulus))
+	c.X(x[0])
+	c.toffoli(p, x[0], x[-1])
+	c.X(x[0])
+	return c
+
+# mod_adder: cond_mod_add, cond_mod_add_compare, which also takes z[1] as its carry, or
+# cond_mod_add_fourier, with which o enters the QFT basis once for all the additions (the
+# doublings act on y) and leaves it at the end
+def mod_multiplication(x, y, o, z, mod_adder = cond_mod_add):
+	c = Circuit(max(x + y + o + z) + 1)
+	flags = z[0:2] if mod_adder is cond_mod_add_compare else z[0:1]
+	k = 8 + len(flags)
+	if mod_adder is cond_mod_add_fourier:
+		c.append(QFT(o))
 	for i in range(3):
-		c.append(cond_mod_add(9, [0, 1, 2, 3], [4, 5, 6, 7], [8]), indices = y + o + [z[0]] + [i])
+		c.append(mod_adder(k, [0, 1, 2, 3], [4, 5, 6, 7], list(range(8, k))), indices = y + o + flags + [i])
 		c.append(mod_doubling(), indices = y)
+	if mod_adder is cond_mod_add_fourier:
+		c.append(IQFT(o))
 	for i in range(3):
-		c.append(mod_doubling().inverse(), indices = y)
+		c.append(mod_doubling.inverse(), indices = y)
 	return c
 
 @block
 def mod_inverse():
-	c = tc.Circuit(4)
+	c = Circuit(4)
 	c.SWAP(1, 2)
 	return c
 
-def mod_square(x, y):
-	c = tc.Circuit(max(x + y) + 1)
-	n = 4  
-	for j in range(n):
-		for k in range(n):
-			exp = (2 ** (j + k)) % 7
-			if exp != 0:
-				c.append(add_const(y, exp), indices=[x[j], x[k]] + y)
+# y += x ** 2 mod p, z is one clean flag qubit
+def mod_square(x, y, z, modulus = 7):
+	c = Circuit(max(x + y + z) + 1)
+	n = len(y)
+	c.append(add_mod_square(list(range(len(x))), list(range(len(x), len(x) + n)), [len(x) + n], modulus = modulus), indices = x + y + [z[0]])
 	return c
 # 这里是对 x 的平方取模 7 的实现，若报错可尝试以下更简单粗暴的方法
 '''def mod_square(x, y):
-	c = tc.Circuit(max(x + y) + 1)
+	c = Circuit(max(x + y) + 1)
 	c.cnot(x[0], y[0])
 	c.cnot(x[1], y[1])
 	c.cnot(x[2], y[2])
@@ -0,0 +1,106 @@
+import tensorcircuit as tc
+import numpy as np
+from tools import *
+from contraction import gate_tensor
+
+# Noisy simulation by quantum trajectories. A channel is a Pauli mixture on one qubit,
+# {"x": px, "y": py, "z": pz}, applied after a gate to each qubit it acts on; a
+# NoiseModel maps gate names ("cphase", "h", "any" for dense blocks, ...) to channels,
+# "*" for every gate without its own. A batch of trajectories is one (batch, 2, ..., 2)
+# array: gates act on all of it at once and each sampled Pauli only on the rows that drew
+# it, so memory is batch statevectors instead of a squared density matrix.
+# Build circuits inside gate_level() so the noise lands on the actual gates.
+
+def depolarizing(p):
+	return {"x": p / 3, "y": p / 3, "z": p / 3}
+
+def dephasing(p):
+	return {"z": p}
+
+def bit_flip(p):
+	return {"x": p}
+
+class NoiseModel:
+	def __init__(self, channels = None):
+		self.channels = dict(channels or {})
+
+	def channel(self, name):
+		return self.channels.get(name, self.channels.get("*"))
+
+def _apply(psi, m, index):
+	k = len(index)
+	axes = [1 + q for q in index]
+	end = list(range(psi.ndim - k, psi.ndim))
+	psi = np.moveaxis(psi, axes, end)
+	shape = psi.shape
+	psi = (psi.reshape(-1, 2 ** k) @ m.reshape(2 ** k, 2 ** k).T).reshape(shape)
+	return np.moveaxis(psi, end, axes)
+
+# Y = iXZ, the global phase i of a trajectory does not matter
+def _pauli(psi, q, which, rows):
+	sub = psi[rows]
+	if which in "yz":
+		sub[(slice(None),) * (1 + q) + (1,)] *= -1
+	if which in "xy":
+		sub = np.flip(sub, axis = 1 + q)
+	psi[rows] = sub
+
+def _noise(psi, channel, index, rng):
+	for q in index:
+		draw = rng.random(len(psi))
+		low = 0.0
+		for which, p in channel.items():
+			rows = (draw >= low) & (draw < low + p)
+			if rows.any():
+				_pauli(psi, q, which, rows)
+			low += p
+
+def _index(n, registers):
+	index = 0
+	for register, value in registers:
+		for i, q in enumerate(register):
+			index |= (value >> i & 1) << (n - 1 - q)
+	return index
+
+# final states of batch trajectories of circuit on the basis input
+def trajectories(circuit, model, inputs = (), batch = 64, rng = None):
+	rng = rng if rng is not None else np.random.default_rng()
+	n = circuit._nqubits
+	psi = np.zeros((batch, 2 ** n), dtype = tc.dtypestr)
+	psi[:, _index(n, inputs)] = 1
+	psi = psi.reshape((batch,) + (2,) * n)
+	for d in circuit.to_qir():
+		m = gate_tensor(d).astype(psi.dtype)
+		psi = _apply(psi, m, d["index"])
+		channel = model.channel(d["gatef"].n)
+		if channel:
+			_noise(psi, channel, d["index"], rng)
+	return psi.reshape(batch, -1)
+
+# probability that the output registers read the given values, estimated over the
+# trajectories (batch at a time): (mean, standard error)
+def success_probability(circuit, model, inputs, outputs, count = 1024, batch = 64, seed = 0):
+	rng = np.random.default_rng(seed)
+	n = circuit._nqubits
+	index = np.arange(2 ** n)
+	match = np.ones(2 ** n, dtype = bool)
+	for register, value in outputs:
+		for i, q in enumerate(register):
+			match &= (index >> (n - 1 - q) & 1) == (value >> i & 1)
+	samples = []
+	for start in range(0, count, batch):
+		psi = trajectories(circuit, model, inputs, min(batch, count - start), rng)
+		samples.append(np.sum(np.abs(psi[:, match]) ** 2, axis = 1))
+	samples = np.concatenate(samples)
+	return float(samples.mean()), float(samples.std() / np.sqrt(len(samples)))
+
+if __name__ == "__main__":
+	from modular_addition import mod_add
+	x, y, z = [0, 1, 2, 3], [4, 5, 6, 7], [8]
+	with gate_level():
+		circuit = mod_add(x, y, z, modulus = 7)
+	for name, channel in (("depolarizing", depolarizing), ("dephasing", dephasing)):
+		for p in (0, 1e-3, 1e-2, 3e-2):
+			model = NoiseModel({"*": channel(p)})
+			mean, error = success_probability(circuit, model, [(x, 3), (y, 5)], [(x, 3), (y, 1), (z, 0)], 512)
+			print(f"mod_add 3 + 5 mod 7, {name} p = {p:g}: success {mean:.4f} +- {error:.4f}")
@@ -5,6 +5,11 @@ from tools import *
 from multiplication import *
 from modular_addition import *
 from sum_of_squares import *
+from register import RegisterAllocator
+from uncompute import compute, uncompute, cancel_inverses, invert
+from montgomery import mont_multiplication, mont_square, fourier_multiplication, mont_ancillas, fourier_ancillas, to_montgomery, MONTGOMERY
+from inversion import kaliski_inverse, inverse_ancillas
+from cache import cached
 
 def const_inverse(c, p):
     for i in range(p):
@@ -30,7 +35,7 @@ def point_addition(x_1, y_1, x_2, y_2, a, b, p):
             down = abs(down)
             sign = -1
 
-    down = mod_inverse(down, p)
+    down = const_inverse(down % p, p)
     lam = up * down * sign % p
     x_3 = (lam ** 2 - x_1 - x_2) % p
     y_3 = (lam * (x_1 - x_3) - y_1) % p
@@ -52,74 +57,158 @@ def point_addition_corner(P, Q, a, b, p):
     return point_addition_result
 
 
-def cond_ECC_add_0(p, x, x2, y2, z):
-	c = tc.Circuit(max([p] + x + z) + 1) # 14 bits
+# layout for cond_ECC_add_0: control p, x = (x1, y1), z = lambda; the flags and the
+# multiplier's and inverter's scratch are borrowed from alloc while the oracle is built
+def ecc_registers(n = 4):
+	alloc = RegisterAllocator()
+	p = alloc.register("p", 1)[0]
+	x = alloc.register("x", 2 * n)
+	z = alloc.register("lambda", n)
+	return alloc, p, x, z
+
+# clean qubits a multiplier takes as z (mod_multiplication with cond_mod_add_compare needs 2)
+def multiplier_ancillas(multiplier, p = 7):
+	if multiplier is mont_multiplication:
+		return mont_ancillas(p)
+	if multiplier is fourier_multiplication:
+		return fourier_ancillas(p)
+	return 1
+
+# z[0:4] += x[0:4]^-1 * x[4:8] when p = 1; the inverse is taken in place by the
+# SWAP (bits 1, 2) that inverts mod 7, or out of place into 4 borrowed qubits with
+# kaliski_inverse. Its scratch is handed back once the inverse is computed, so the
+# multiplier borrows the same qubits; they are clean again when the inverse is uncomputed.
+def lambda_product(alloc, p, x, z, multiplier, inverter, ancillas):
+	if inverter is None:
+		inverse = x[0:4]
+		invert = mod_inverse(), x[0:4]
+	else:
+		inverse = alloc.ancilla(4)
+		scale = to_montgomery(to_montgomery(1, 7), 7) if multiplier in MONTGOMERY else 1
+		with alloc.borrow(inverse_ancillas(7)) as scratch:
+			invert = inverter([0, 1, 2, 3], [4, 5, 6, 7], list(range(8, 8 + inverse_ancillas(7))), 7, scale), x[0:4] + inverse + scratch
+	with alloc.borrow(ancillas) as scratch:
+		product = cached(multiplier, [0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], list(range(12, 12 + ancillas))), inverse + x[4:8] + z[0:4] + scratch
+
+	c = alloc.circuit()
+	with compute(c) as forward:
+		c.append(invert[0], indices = invert[1])
+		c.x(p)
+		for i in range(4):
+			c.cswap(p, inverse[i], z[i])
+		c.x(p)
+
+	c.append(product[0], indices = product[1])
+
+	uncompute(c, forward)
+	if inverter is not None:
+		alloc.release(inverse)
+	return c
 
-	c.append(add_mod_const([0, 1, 2, 3], (7 - x2) % 7, [4]), indices = x[0:4] + [z[4]])
-	c.append(add_mod_const([0, 1, 2, 3], (7 - y2) % 7, [4]), indices = x[4:8] + [z[4]])
+# multiplier: mod_multiplication, mont_multiplication or fourier_multiplication; with the
+# last two x1, y1 (and the result) are in Montgomery form, only the classical x2, y2
+# are converted here and lambda ** 2 is a Montgomery squaring (mont_square).
+# inverter: None for the mod 7 SWAP or kaliski_inverse; Montgomery form needs
+# kaliski_inverse, which can scale the inverse into the form.
+# add_mod_const / cadd_mod_const: the builders of the classical additions
+# alloc: the RegisterAllocator of p, x and z (ecc_registers) the scratch is borrowed from;
+# ancillas: the multiplier's scratch, multiplier_ancillas(multiplier) by default
+# With p = 1 the inputs must have x1 != x2 (no doubling, no P = -Q), and lambda is cleared
+# as (y3 + y2) / (x2 - x3), so when P + Q = -Q (x3 = x2) the sum is right but lambda is
+# left behind.
+def cond_ECC_add_0(p, x, x2, y2, z, multiplier = mod_multiplication, inverter = None, add_mod_const = add_mod_const, cadd_mod_const = cadd_mod_const, alloc = None, ancillas = None):
+	if alloc is None:
+		alloc = RegisterAllocator()
+		alloc.register("oracle", max([p] + x + z) + 1)
+	ancillas = ancillas or multiplier_ancillas(multiplier)
+	if multiplier in MONTGOMERY:
+		if inverter is None:
+			raise ValueError("the SWAP inverse takes no Montgomery form, use inverter = kaliski_inverse")
+		x2, y2 = to_montgomery(x2, 7), to_montgomery(y2, 7)
+
+	# the steps are planned first, each borrowing what it needs, and the circuit is as wide
+	# as the allocator got
+	steps = []
+	def flagged(circuit, qubits):
+		with alloc.borrow() as flag:
+			steps.append((circuit, qubits + flag))
+	# o += a * b, or o -= a * b with subtract
+	def product(a, b, o, subtract = False):
+		with alloc.borrow(ancillas) as scratch:
+			circuit = cached(multiplier, [0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], list(range(12, 12 + ancillas)))
+			if subtract:
+				circuit = invert(circuit.to_qir(), circuit._nqubits)
+			steps.append((circuit, a + b + o + scratch))
+	def square(a, o):
+		if multiplier not in MONTGOMERY:
+			return flagged(add_mod_square([0, 1, 2, 3], [4, 5, 6, 7], [8]), a + o)
+		with alloc.borrow(mont_ancillas(7)) as scratch:
+			steps.append((mont_square([0, 1, 2, 3], [4, 5, 6, 7], list(range(8, 8 + mont_ancillas(7))), 7), a + o + scratch))
+	lam = lambda_product(alloc, p, x, z, multiplier, inverter, ancillas), None
+
+	flagged(add_mod_const([0, 1, 2, 3], (7 - x2) % 7, [4]), x[0:4])
+	flagged(add_mod_const([0, 1, 2, 3], (7 - y2) % 7, [4]), x[4:8])
 
 	# now : x1 - x2 , y1 - y2 , 0
 
-	c.append(mod_inverse(), indices = x[0:4])
-
-	c.x(p)
-	for i in range(4):
-		c.cswap(p, x[i], z[i])
-	c.x(p)
-
-	c.append(mod_multiplication([0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12]), indices = x + z)
-
-	c.x(p)
-	for i in range(4):
-		c.cswap(p, x[i], z[i])
-	c.x(p)
-
-	c.append(mod_inverse(), indices = x[0:4])
+	steps.append(lam)
 
 	# now : x1 - x2 , y1 - y2 , lambda
 
-	c.append(add_mod_const([0, 1, 2, 3], x2, [4]), indices = x[0:4] + [z[4]])
-	c.append(add_mod_const([0, 1, 2, 3], y2, [4]), indices = x[4:8] + [z[4]])
+	flagged(add_mod_const([0, 1, 2, 3], x2, [4]), x[0:4])
+	flagged(add_mod_const([0, 1, 2, 3], y2, [4]), x[4:8])
 
-	# output(c, length = 15)
 	# now : x1 , y1 , lambda
 
-	c.append(cond_negation(0, [1, 2, 3, 4], [5]), indices = [p] + x[4:8] + [z[4]])
-	c.append(mod_multiplication([0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12]), indices = x[0:4] + z[0:4] + x[4:8] + [z[4]])
-	c.append(cond_negation(0, [1, 2, 3, 4], [5]), indices = [p] + x[0:4] + [z[4]])
+	flagged(cond_negation(0, [1, 2, 3, 4], [5]), [p] + x[4:8])
+	product(x[0:4], z[0:4], x[4:8])
+	flagged(cond_negation(0, [1, 2, 3, 4], [5]), [p] + x[0:4])
 
 	# now : -x1 , lambda * x1 - y1 , lambda
 
-	c.append(cadd_mod_const(0, [1, 2, 3, 4], (7 - x2) % 7, [5]), indices = [p] + x[0:4] + [z[4]])
-	c.append(add_mod_square([0, 1, 2, 3], [4, 5, 6, 7], [8]), indices = z[0:4] + x[0:4] + [z[4]])
-	c.append(mod_multiplication([0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12]), indices = x[0:4] + z[0:4] + x[4:8] + [z[4]])
+	flagged(cadd_mod_const(0, [1, 2, 3, 4], (7 - x2) % 7, [5]), [p] + x[0:4])
+	square(z[0:4], x[0:4])
+	product(x[0:4], z[0:4], x[4:8], subtract = True)
 
-	# now : x3 , y3 ( = lambda * (x2 - x3) - y2 ) , lambda
+	# now : x3 , y3 ( = lambda * (x1 - x3) - y1 = lambda * (x2 - x3) - y2 ) , lambda
 
-	c.append(add_mod_const([0, 1, 2, 3], y2, [4]), indices = x[4:8] + [z[4]])
-	c.append(add_mod_const([0, 1, 2, 3], (7 - x2) % 7, [4]), indices = x[0:4] + [z[4]])
+	flagged(add_mod_const([0, 1, 2, 3], y2, [4]), x[4:8])
+	flagged(add_mod_const([0, 1, 2, 3], (7 - x2) % 7, [4]), x[0:4])
 
 	# now : x3 - x2 , lambda * (x2 - x3) , lambda
 
-	c.append(mod_inverse(), indices = x[0:4])
-
-	c.x(p)
-	for i in range(4):
-		c.cswap(p, x[i], z[i])
-	c.x(p)
-
-	c.append(mod_multiplication([0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12]), indices = x + z)
-
-	c.x(p)
-	for i in range(4):
-		c.cswap(p, x[i], z[i])
-	c.x(p)
-
-	c.append(mod_inverse(), indices = x[0:4])
+	steps.append(lam)
 
 	# # now : x3 - x2 , lambda * (x2 - x3) , 0
 
-	c.append(add_mod_const([0, 1, 2, 3], (7 - y2) % 7, [4]), indices = x[4:8] + [z[4]])
-	c.append(add_mod_const([0, 1, 2, 3], x2, [4]), indices = x[0:4] + [z[4]])
-
-	return c
+	flagged(add_mod_const([0, 1, 2, 3], (7 - y2) % 7, [4]), x[4:8])
+	flagged(add_mod_const([0, 1, 2, 3], x2, [4]), x[0:4])
+
+	c = alloc.circuit()
+	for circuit, indices in steps:
+		c.append(circuit, indices = indices)
+	return cancel_inverses(c)
+
+# cond_ECC_add_0 with everything known classically folded into the constant additions
+def cond_ECC_add_classical(p, x, x2, y2, z, **options):
+	return cond_ECC_add_0(p, x, x2, y2, z, add_mod_const = add_mod_const_folded, cadd_mod_const = cadd_mod_const_folded, **options)
+
+def _calls(node, name):
+	return (node.calls if node.name == name else 0) + sum(_calls(child, name) for child in node.children.values())
+
+# what cond_ECC_add_classical folds for Q = (x2, y2) and what it saves, counted at gate level
+def folding_report(x2 = 2, y2 = 4, **options):
+	from counts import module_counts
+	alloc, p, x, z = ecc_registers()
+	before = module_counts(cond_ECC_add_0, p, x, x2, y2, z, alloc = alloc, **options)
+	after = module_counts(cond_ECC_add_classical, p, x, x2, y2, z, alloc = alloc, **options)
+	print(f"Q = ({x2}, {y2}):")
+	print(f"  {_calls(after.root, 'add_mod_const_folded')} add_mod_const: + Q and - p in one adder, flagged + p and - Q in one QFT frame")
+	print(f"  {_calls(after.root, 'cadd_mod_const_folded')} cadd_mod_const: controlled + Q and - p in one QFT frame, flagged + p and controlled - Q in another")
+	print("  the products (lambda, lambda * x, lambda ** 2) all have two quantum factors and stay register by register")
+	a, b = before.root.counts, after.root.counts
+	print(f"  qubits {a.width} -> {b.width}, gates {a.total} -> {b.total}, two-qubit {a.two_qubit} -> {b.two_qubit}, rotations {a.rotations} -> {b.rotations}, depth {a.depth} -> {b.depth}")
+	return before, after
+
+if __name__ == "__main__":
+	folding_report()
@@ -0,0 +1,218 @@
+import tensorcircuit as tc
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+import tools
+
+# Opt-in instrumentation. enable() hooks tools.block (every call, the dense matrix it builds
+# and its size), tools.state and Circuit.state (simulation), and wraps the plain builder
+# functions of every project module loaded so far, from 1-8 as well as src/modules, so the
+# timings nest the way the builders call each other. Peak memory comes from tracemalloc,
+# which slows numpy-heavy code down; enable(memory = False) skips it.
+#	profiler = enable()
+#	cond_ECC_add_0(p, x, 2, 4, z, alloc = alloc)
+#	disable()
+#	profiler.report()
+#	profiler.trace("oracle.json")	# chrome://tracing or ui.perfetto.dev
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class Node:
+	def __init__(self, name):
+		self.name = name
+		self.calls = 0
+		self.time = 0.0
+		self.peak = 0
+		self.info = {}
+		self.children = {}
+
+	def child(self, name):
+		if name not in self.children:
+			self.children[name] = Node(name)
+		return self.children[name]
+
+	def own_time(self):
+		return self.time - sum(c.time for c in self.children.values())
+
+class Profiler:
+	def __init__(self, memory = True):
+		self.memory = memory
+		self.root = Node("total")
+		self.stack = [self.root]
+		# per running step: [memory at entry, highest memory seen, notes of this call]
+		self.frames = [[self._used(), self._used(), {}]]
+		self.events = []
+		self.start = time.perf_counter()
+
+	def _used(self):
+		return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+	@contextmanager
+	def section(self, name):
+		node = self.stack[-1].child(name)
+		node.calls += 1
+		if self.memory:
+			used, peak = tracemalloc.get_traced_memory()
+			self.frames[-1][1] = max(self.frames[-1][1], peak)
+			tracemalloc.reset_peak()
+		else:
+			used = 0
+		self.stack.append(node)
+		self.frames.append([used, used, {}])
+		start = time.perf_counter()
+		try:
+			yield node
+		finally:
+			elapsed = time.perf_counter() - start
+			used, high, info = self.frames.pop()
+			if self.memory:
+				high = max(high, tracemalloc.get_traced_memory()[1])
+				self.frames[-1][1] = max(self.frames[-1][1], high)
+			self.stack.pop()
+			node.time += elapsed
+			node.peak = max(node.peak, high - used)
+			for k, v in info.items():
+				node.info[k] = node.info.get(k, 0) + v
+			self.events.append({
+				"name": name, "ph": "X", "pid": os.getpid(), "tid": 0,
+				"ts": (start - self.start) * 1e6, "dur": elapsed * 1e6,
+				"args": dict(info, peak = high - used),
+			})
+
+	def note(self, **info):
+		for k, v in info.items():
+			self.frames[-1][2][k] = self.frames[-1][2].get(k, 0) + v
+
+	def built(self, circuit):
+		if isinstance(circuit, tc.Circuit):
+			self.note(gates = len(circuit.to_qir()))
+
+	def finish(self):
+		self.root.calls = 1
+		self.root.time = time.perf_counter() - self.start
+		if self.memory:
+			self.root.peak = max(self.frames[0][1], tracemalloc.get_traced_memory()[1]) - self.frames[0][0]
+
+	# one line per builder, children under their caller, slowest first; dense is the size
+	# of the block unitaries built there, state of the simulated statevectors
+	def report(self, node = None, depth = 0, limit = 1e-4):
+		if node is None:
+			node = self.root
+			print(f"{'module':<48} {'calls':>7} {'total s':>9} {'own s':>9} {'peak MB':>9} {'dense MB':>9}")
+		dense = (node.info.get("dense", 0) + node.info.get("state", 0)) / 2 ** 20
+		print(f"{'  ' * depth + node.name:<48} {node.calls:>7} {node.time:>9.3f} {node.own_time():>9.3f} {node.peak / 2 ** 20:>9.2f} {dense:>9.2f}")
+		for child in sorted(node.children.values(), key = lambda c: -c.time):
+			if child.time >= limit:
+				self.report(child, depth + 1, limit)
+
+	def trace(self, path):
+		with open(path, "w") as f:
+			json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+		return path
+
+# a profiled builder compares equal to the original, so checks like
+# `multiplier in MONTGOMERY` hold whichever of the two is passed
+class Profiled:
+	def __init__(self, func):
+		functools.update_wrapper(self, func)
+
+	def __call__(self, *stuff, **parameters):
+		with tools.section(self.__name__):
+			return tools.built(self.__wrapped__(*stuff, **parameters))
+
+	def __eq__(self, other):
+		return self.__wrapped__ is getattr(other, "__wrapped__", other)
+
+	def __hash__(self):
+		return hash(self.__wrapped__)
+
+# (object, attribute, original value) for disable()
+_patched = []
+
+def _patch(target, attribute, value):
+	_patched.append((target, attribute, getattr(target, attribute)))
+	setattr(target, attribute, value)
+
+def _modules():
+	modules = []
+	for m in list(sys.modules.values()):
+		path = getattr(m, "__file__", None)
+		if path and os.path.abspath(path).startswith(_ROOT + os.sep) and m.__name__ not in ("tools", "profiling", __name__):
+			modules.append(m)
+	return modules
+
+# blocks (and the adders' reversible functions) have .gates and are timed by tools.block
+def _builders(module):
+	for name, obj in vars(module).items():
+		if inspect.isfunction(obj) and obj.__module__ == module.__name__ and not name.startswith("_") and not hasattr(obj, "gates"):
+			yield obj
+
+def instrument():
+	modules = _modules()
+	wrapped = {f: Profiled(f) for m in modules for f in _builders(m)}
+	for m in modules:
+		for name, obj in list(vars(m).items()):
+			if inspect.isfunction(obj) and obj in wrapped:
+				_patch(m, name, wrapped[obj])
+	for f in wrapped:
+		if f.__defaults__ and any(inspect.isfunction(d) and d in wrapped for d in f.__defaults__):
+			_patch(f, "__defaults__", tuple(wrapped.get(d, d) if inspect.isfunction(d) else d for d in f.__defaults__))
+	circuit_state = tc.Circuit.state
+	def state(self, *stuff, **parameters):
+		with tools.section("state"):
+			return circuit_state(self, *stuff, **parameters)
+	_patch(tc.Circuit, "state", state)
+
+_tracing = False
+
+# profiler: Profiler or a subclass (counts.Tally)
+def enable(memory = True, profiler = Profiler):
+	global _tracing
+	if tools._profiler is not None:
+		disable()
+	if memory and not tracemalloc.is_tracing():
+		tracemalloc.start()
+		_tracing = True
+	instrument()
+	tools._profiler = profiler(memory)
+	return tools._profiler
+
+def disable():
+	global _tracing
+	profiler = tools._profiler
+	if profiler is not None:
+		profiler.finish()
+	tools._profiler = None
+	while _patched:
+		target, attribute, original = _patched.pop()
+		setattr(target, attribute, original)
+	if _tracing:
+		tracemalloc.stop()
+		_tracing = False
+	return profiler
+
+@contextmanager
+def profiled(memory = True):
+	profiler = enable(memory)
+	try:
+		yield profiler
+	finally:
+		disable()
+
+if __name__ == "__main__":
+	import point_addition
+	alloc, p, x, z = point_addition.ecc_registers()
+	with profiled() as profiler:
+		circuit = point_addition.cond_ECC_add_0(p, x, 2, 4, z, alloc = alloc)
+		start = tools.Circuit(circuit._nqubits)
+		for register, value in (([p], 1), (x[0:4], 1), (x[4:8], 2)):
+			start.append(tools.int_to_qubits(register, value))
+		start.append(circuit)
+		tools.state(start)
+	profiler.report()
+	print("trace written to", profiler.trace("profile.json"))
@@ -1,47 +1,47 @@
 import tensorcircuit as tc
 import numpy as np
 from tools import *
+from controlled import controlled
+
+# QFT / IQFT on qubits 0..n-1, built once per (n, degree) and appended remapped onto x;
+# degree drops the rotations by pi / 2 ** k for k > degree (approximate QFT)
+@instance
+def qft(n, degree = None):
+	c = Circuit(n)
+	for i in range(n - 1, -1, -1):
+		c.H(i)
+		for j in range(i):
+			if degree is None or i - j <= degree:
+				c.cphase(j, i, theta = np.pi / 2 ** (i - j))
+	return c
 
-def QFT(x):
-    c = tc.Circuit(max(x) + 1)
-    n = len(x)
-    
-    for i in range(n-1, -1, -1):
-        c.H(x[i])
-        for j in range(i):
-            c.cphase(x[j], x[i], theta = np.pi / 2 ** (i - j))
-    
-    return c
-
-def IQFT(x):
-	c = tc.Circuit(max(x) + 1)
-	n = len(x)
-	
-	for i in range(0, n):
-		for j in range(0, i):
-			c.cphase(x[j], x[i], theta = -np.pi / 2 ** (i - j))
-		c.H(x[i])
-
+@instance
+def iqft(n, degree = None):
+	c = Circuit(n)
+	for i in range(n):
+		for j in range(i):
+			if degree is None or i - j <= degree:
+				c.cphase(j, i, theta = -np.pi / 2 ** (i - j))
+		c.H(i)
 	return c
 
-def cQFT(p, x):
-	c = tc.Circuit(max(p, max(x)) + 1)
-	n = len(x)
+# In the QFT basis qubit q of x carries exp(2 pi i v / 2 ** (q + 1)) for the value v, so
+# adding value is a phase of _theta(value, q) on each qubit
+def _theta(value, q):
+	return 2 * np.pi * (value % 2 ** (q + 1)) / 2 ** (q + 1)
 
-	for i in range(n-1, -1, -1):
-		controlled_H(c, p, x[i])
-		for j in range(i):
-			ccphase(c, p, x[j], x[i], theta = np.pi / 2 ** (i - j))
-	
+def QFT(x, degree = None):
+	c = Circuit(max(x) + 1)
+	c.append(qft(len(x), degree), indices = x)
 	return c
 
-def cIQFT(p, x):
-	c = tc.Circuit(max(p, max(x)) + 1)
-	n = len(x)
+def IQFT(x, degree = None):
+	c = Circuit(max(x) + 1)
+	c.append(iqft(len(x), degree), indices = x)
+	return c
 
-	for i in range(0, n):
-		for j in range(0, i):
-			ccphase(c, p, x[j], x[i], theta = -np.pi / 2 ** (i - j))
-		controlled_H(c, p, x[i])
+def cQFT(p, x):
+	return controlled(QFT(x), p)
 
-	return c
\ No newline at end of file
+def cIQFT(p, x):
+	return controlled(IQFT(x), p)
\ No newline at end of file
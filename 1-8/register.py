@@ -0,0 +1,82 @@
+import tensorcircuit as tc
+from contextlib import contextmanager
+from tools import Circuit
+
+# Hands out qubit indices for named registers and ancillas.
+# Ancillas released clean are reused (lowest index first) by later requests,
+# so the circuit width is the peak number of live qubits.
+class RegisterAllocator:
+	def __init__(self):
+		self.registers = {}
+		self.free = []
+		self.width = 0
+		self.live = 0
+		self.peak = 0
+		# qubits handed out and not yet released
+		self.issued = set()
+
+	def _take(self, size):
+		self.free.sort()
+		qubits = self.free[:size]
+		self.free = self.free[size:]
+		while len(qubits) < size:
+			qubits.append(self.width)
+			self.width += 1
+		self.issued.update(qubits)
+		self.live += size
+		self.peak = max(self.peak, self.live)
+		return qubits
+
+	def register(self, name, size):
+		if name in self.registers:
+			raise ValueError(f"register {name} already allocated")
+		self.registers[name] = self._take(size)
+		return self.registers[name]
+
+	def ancilla(self, size = 1, name = None):
+		if name is not None and name in self.registers:
+			raise ValueError(f"register {name} already allocated")
+		qubits = self._take(size)
+		if name is not None:
+			self.registers[name] = qubits
+		return qubits
+
+	# the caller promises the qubits are back in |0>
+	def release(self, qubits):
+		if isinstance(qubits, str):
+			qubits = self.registers.pop(qubits)
+		qubits = list(qubits)
+		stray = [q for q in qubits if q not in self.issued]
+		if stray or len(set(qubits)) != len(qubits):
+			raise ValueError(f"qubits {stray or qubits} were never handed out or are already released")
+		self.issued.difference_update(qubits)
+		for name in [k for k, v in self.registers.items() if v == qubits]:
+			del self.registers[name]
+		self.free += qubits
+		self.live -= len(qubits)
+
+	@contextmanager
+	def borrow(self, size = 1):
+		qubits = self.ancilla(size)
+		try:
+			yield qubits
+		finally:
+			self.release(qubits)
+
+	# what the qubits handed out next depend on, so builders taking an allocator can be cached
+	def __repr__(self):
+		return f"RegisterAllocator(registers = {self.registers}, free = {sorted(self.free)}, width = {self.width})"
+
+	def __getitem__(self, name):
+		return self.registers[name]
+
+	def circuit(self):
+		return Circuit(self.width)
+
+	def report(self):
+		return {
+			"width": self.width,
+			"peak": self.peak,
+			"live": self.live,
+			"registers": {k: len(v) for k, v in self.registers.items()},
+		}
@@ -0,0 +1,104 @@
+import tensorcircuit as tc
+import numpy as np
+from tools import *
+from marginals import marginal
+
+# Many measurement shots from one final state in a few vectorized calls, instead of one
+# c.sample() per shot. With registers the table is their joint marginal (2^(register
+# widths) entries, marginals.marginal) and every shot comes back decoded, one column per
+# register; without, shots are basis indices of the whole state (qubit 0 most significant).
+#	cumsum	cumulative sum + searchsorted, O(log N) per shot, nothing to build
+#	alias	Vose alias table, O(N) to build and O(1) per shot, for drawing from the same
+#		distribution again and again (Sampler(p, "alias").draw(shots, rng))
+# rng is a seed or a numpy Generator, so runs repeat exactly.
+#	shots = sample(psi, 10 ** 6, x[0:4], x[4:8], rng = 7)
+
+class Sampler:
+	def __init__(self, probabilities, method = "cumsum"):
+		p = np.asarray(probabilities, dtype = np.float64).reshape(-1)
+		p = np.clip(p, 0, None)
+		self.p = p / p.sum()
+		self.method = method
+		if method == "cumsum":
+			self.cdf = np.cumsum(self.p)
+		elif method == "alias":
+			self.prob, self.alias = _alias(self.p)
+		else:
+			raise ValueError(f"unknown sampling method {method}")
+
+	def draw(self, shots, rng = None, chunk = 2 ** 22):
+		rng = np.random.default_rng(rng)
+		result = np.empty(shots, dtype = np.int64)
+		for start in range(0, shots, chunk):
+			size = min(chunk, shots - start)
+			if self.method == "cumsum":
+				i = np.searchsorted(self.cdf, rng.random(size) * self.cdf[-1], side = "right")
+				result[start:start + size] = np.minimum(i, len(self.p) - 1)
+			else:
+				i = rng.integers(len(self.p), size = size)
+				result[start:start + size] = np.where(rng.random(size) < self.prob[i], i, self.alias[i])
+		return result
+
+# Vose: every column holds probability prob[i] of i and the rest of alias[i]
+def _alias(p):
+	n = len(p)
+	scaled = p * n
+	prob = np.ones(n)
+	alias = np.arange(n)
+	small = list(np.flatnonzero(scaled < 1))
+	large = list(np.flatnonzero(scaled >= 1))
+	while small and large:
+		s, l = small.pop(), large.pop()
+		prob[s] = scaled[s]
+		alias[s] = l
+		scaled[l] -= 1 - scaled[s]
+		(small if scaled[l] < 1 else large).append(l)
+	return prob, alias
+
+# shots x len(registers) register values, or shots basis indices without registers
+def sample(state, shots, *registers, rng = None, method = "cumsum"):
+	if registers:
+		p = marginal(state, *registers)
+		flat = Sampler(p, method).draw(shots, rng)
+		return np.stack(np.unravel_index(flat, p.shape), axis = 1)
+	if hasattr(state, "state"):
+		state = state.state()
+	psi = np.asarray(tc.backend.numpy(state)).reshape(-1)
+	return Sampler(psi.real ** 2 + psi.imag ** 2, method).draw(shots, rng)
+
+# register values of basis indices drawn without registers
+def decode(indices, n, *registers):
+	indices = np.asarray(indices)
+	return np.stack([sum((indices >> (n - 1 - q) & 1) << i for i, q in enumerate(register)) for register in registers], axis = 1)
+
+# {value (tuple for several registers): count}, most frequent first
+def histogram(shots):
+	values, counts = np.unique(shots, axis = 0, return_counts = True)
+	keys = [tuple(int(v) for v in np.atleast_1d(value)) for value in values]
+	keys = [k[0] if len(k) == 1 else k for k in keys]
+	return dict(sorted(zip(keys, (int(c) for c in counts)), key = lambda kv: -kv[1]))
+
+if __name__ == "__main__":
+	import time
+	from modular_addition import add_mod_const
+	x, z = [0, 1, 2, 3], [4]
+	c = Circuit(5)
+	for q in x[0:3]:
+		c.h(q)
+	with gate_level():
+		c.append(add_mod_const(x, 3, z))
+	psi = c.state()
+	shots = 10 ** 6
+	for method in ("cumsum", "alias"):
+		start = time.time()
+		s = sample(psi, shots, x, z, rng = 7, method = method)
+		elapsed = time.time() - start
+		print(f"{method}: {shots} shots of (x + 3 mod 7, flag) in {elapsed:.3f}s, {shots / elapsed / 1e6:.1f} M shots/s")
+	print(f"histogram: {histogram(s)}")
+	print(f"same seed, same shots: {np.array_equal(sample(psi, 1000, x, rng = 1), sample(psi, 1000, x, rng = 1))}")
+	indices = sample(psi, 5, rng = 1)
+	print(f"basis indices {indices} decode to x = {decode(indices, 5, x)[:, 0]}")
+	start = time.time()
+	for _ in range(100):
+		c.sample()
+	print(f"c.sample(): {100 / (time.time() - start):.0f} shots/s")
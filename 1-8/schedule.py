@@ -0,0 +1,121 @@
+import tensorcircuit as tc
+import numpy as np
+from tools import *
+from controlled import DIAGONAL
+
+# Gate dependency DAG of a built circuit. Gates that are diagonal on a qubit commute there:
+# phase-type gates on all their qubits, and the controls of cnot / toffoli / cswap /
+# multicontrol, so e.g. the cphases of a Draper adder's phase layer that share a control
+# or a target do not depend on each other. On every wire a gate only waits for the last
+# run of gates it does not commute with.
+#	dag = DAG(circuit)
+#	dag.critical_path(), dag.depth	longest dependency chain, layers of the ASAP schedule
+#	dag.widths()			gates per ASAP layer
+#	dag.circuit("alap")		the gates reordered layer by layer
+#	layered_state(circuit)		statevector one layer (disjoint gates) per contraction
+
+def _diagonal_qubits(d):
+	name = d["gatef"].n
+	index = list(d["index"])
+	if name in DIAGONAL:
+		return set(index)
+	if name == "cnot" or name == "fredkin":
+		return {index[0]}
+	if name == "toffoli":
+		return set(index[:2])
+	if name == "multicontrol":
+		return set(index[:len(d["parameters"]["ctrl"])])
+	return set()
+
+class DAG:
+	def __init__(self, circuit):
+		self.nqubits = circuit._nqubits
+		self.gates = circuit.to_qir()
+		self.predecessors = [set() for _ in self.gates]
+		self.successors = [set() for _ in self.gates]
+		# per wire: (diagonal run?, gates of the current run, gates of the run before)
+		runs = {}
+		for i, d in enumerate(self.gates):
+			diagonal = _diagonal_qubits(d)
+			for q in d["index"]:
+				kind, current, before = runs.get(q, (None, [], []))
+				if q in diagonal and kind == "diagonal":
+					self._edges(before, i)
+					current.append(i)
+				else:
+					self._edges(current, i)
+					runs[q] = ("diagonal" if q in diagonal else "other", [i], current)
+		self.asap = self._schedule(range(len(self.gates)), self.predecessors)
+		self.depth = max(self.asap, default = -1) + 1
+		reverse = self._schedule(reversed(range(len(self.gates))), self.successors)
+		self.alap = [max(reverse, default = 0) - level for level in reverse]
+
+	def _edges(self, sources, i):
+		for j in sources:
+			self.predecessors[i].add(j)
+			self.successors[j].add(i)
+
+	# list scheduling: each gate in the first layer after everything in before[i] where
+	# its qubits are free; commuting gates on one qubit end up in different layers
+	def _schedule(self, order, before):
+		level = [0] * len(self.gates)
+		busy = {}
+		for i in order:
+			layer = max((level[j] + 1 for j in before[i]), default = 0)
+			index = self.gates[i]["index"]
+			while any(layer in busy.get(q, ()) for q in index):
+				layer += 1
+			for q in index:
+				busy.setdefault(q, set()).add(layer)
+			level[i] = layer
+		return level
+
+	# longest dependency chain, the depth with unlimited reordering of commuting gates
+	def critical_path(self):
+		length = [1] * len(self.gates)
+		for i in range(len(self.gates)):
+			length[i] = max((length[j] + 1 for j in self.predecessors[i]), default = 1)
+		return max(length, default = 0)
+
+	# gates per layer, each layer acting on disjoint qubits
+	def layers(self, mode = "asap"):
+		level = self.asap if mode == "asap" else self.alap
+		layers = [[] for _ in range(max(level, default = -1) + 1)]
+		for i, d in enumerate(self.gates):
+			layers[level[i]].append(d)
+		return layers
+
+	def widths(self, mode = "asap"):
+		return [len(layer) for layer in self.layers(mode)]
+
+	def circuit(self, mode = "asap"):
+		return Circuit.from_qir([d for layer in self.layers(mode) for d in layer], {"nqubits": self.nqubits})
+
+	def report(self):
+		widths = self.widths()
+		print(f"gates {len(self.gates)}, qubits {self.nqubits}, critical path {self.critical_path()}, depth asap {self.depth} / alap {len(self.widths('alap'))}")
+		print(f"asap layer width: mean {np.mean(widths or [0]):.2f}, max {max(widths, default = 0)}, single-gate layers {widths.count(1)}")
+
+# statevector contracting one scheduled layer at a time: the gates of a layer touch disjoint
+# qubits, so each contraction is a product of independent gate applications
+def layered_state(circuit, mode = "asap", inputs = None):
+	n = circuit._nqubits
+	result = inputs if inputs is not None else Circuit(n).state()
+	for layer in DAG(circuit).layers(mode):
+		result = Circuit.from_qir(layer, {"nqubits": n, "inputs": result}).state()
+	return result
+
+if __name__ == "__main__":
+	from modular_addition import mod_add
+	from counts import counts
+	with gate_level():
+		circuit = mod_add([0, 1, 2, 3], [4, 5, 6, 7], [8], modulus = 7)
+	dag = DAG(circuit)
+	print(f"program order depth {counts(circuit).depth}")
+	dag.report()
+	start = Circuit(9)
+	start.append(int_to_qubits([0, 1, 2, 3], 3))
+	start.append(int_to_qubits([4, 5, 6, 7], 5))
+	a = layered_state(circuit, inputs = start.state())
+	b = state(Circuit.from_qir(start.to_qir() + circuit.to_qir(), {"nqubits": 9}))
+	print(f"layered statevector matches program order: {np.allclose(tc.backend.numpy(a), tc.backend.numpy(b), atol = 1e-5)}")
@@ -0,0 +1,179 @@
+import tensorcircuit as tc
+import numpy as np
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+from tools import *
+from contraction import gate_tensor
+
+# Statevector in one multiprocessing.shared_memory buffer, split into 2^g shards along its g
+# leading (global) axes; every worker process maps the buffer and works on numpy views of
+# its shards in place, nothing is copied between processes. A gate on local axes runs on
+# each shard independently. A global qubit the gate is diagonal / control-like on (phases,
+# controls of cnot, toffoli, multicontrol, ...) only selects the sub-matrix a shard applies;
+# any other global qubit is first exchanged with a local one (the two axes transposed by
+# swapping half-blocks between paired shards), picking the local qubit used again last.
+# The swaps and gate runs are planned up front, so the workers get the plan once and each
+# step is one parallel map.
+#	psi = sharded_state(circuit, [(x[0:4], 1), (x[4:8], 2)], processes = 8)
+
+def _is_block(m, j):
+	k = m.ndim // 2
+	off = [slice(None)] * 2 * k
+	for a, b in ((0, 1), (1, 0)):
+		off[j], off[k + j] = a, b
+		if np.any(np.abs(m[tuple(off)]) > 1e-12):
+			return False
+	return True
+
+# steps: ("gates", [(tensor, gate positions on global axes, those axes, local axes), ...])
+# or ("swap", global axis, local axis); layout[axis] is the qubit held by that axis at the end
+def partition(circuit, g, lookahead = 256, dtype = None):
+	n = circuit._nqubits
+	if g and n - g < max((len(d["index"]) for d in circuit.to_qir()), default = 0):
+		raise ValueError(f"{g} global qubits leave too few local ones for the widest gate")
+	gates = circuit.to_qir()
+	layout = list(range(n))
+	where = list(range(n))
+	steps = []
+	run = []
+	for t, d in enumerate(gates):
+		m = gate_tensor(d).astype(dtype or tc.dtypestr)
+		qubits = list(d["index"])
+		blocked = [j for j, q in enumerate(qubits) if where[q] < g and not _is_block(m, j)]
+		if blocked and run:
+			steps.append(("gates", run))
+			run = []
+		for j in blocked:
+			def next_use(axis):
+				q = layout[axis]
+				return next((s for s in range(t, min(t + lookahead, len(gates))) if q in gates[s]["index"]), lookahead + t)
+			free = [axis for axis in range(g, n) if layout[axis] not in qubits]
+			local = max(free, key = next_use)
+			a = where[qubits[j]]
+			steps.append(("swap", a, local))
+			layout[a], layout[local] = layout[local], layout[a]
+			where[layout[a]], where[layout[local]] = a, local
+		axes = [where[q] for q in qubits]
+		positions = [j for j, a in enumerate(axes) if a < g]
+		run.append((m, positions, [axes[j] for j in positions], [a - g for j, a in enumerate(axes) if a >= g]))
+	if run:
+		steps.append(("gates", run))
+	return steps, layout
+
+_job = None
+
+def _init(job):
+	global _job
+	job = dict(job)
+	memory = shared_memory.SharedMemory(name = job["name"])
+	job["memory"] = memory
+	job["shards"] = np.ndarray((2 ** job["g"],) + (2,) * (job["n"] - job["g"]), dtype = job["dtype"], buffer = memory.buf)
+	_job = job
+
+def _apply(psi, m, positions, bits, axes):
+	k = m.ndim // 2
+	select = [slice(None)] * 2 * k
+	for j, bit in zip(positions, bits):
+		select[j] = select[k + j] = bit
+	m = m[tuple(select)]
+	r = len(axes)
+	if r == 0:
+		psi *= m
+		return
+	result = np.tensordot(m, psi, axes = (list(range(r, 2 * r)), axes))
+	psi[...] = np.moveaxis(result, list(range(r)), axes)
+
+# one step on one shard (gates) or one pair of shards (swap, s has the global bit 0)
+def _step(task):
+	i, s = task
+	kind, *step = _job["steps"][i]
+	g, shards = _job["g"], _job["shards"]
+	if kind == "gates":
+		psi = shards[s]
+		for m, positions, global_axes, axes in step[0]:
+			_apply(psi, m, positions, [s >> (g - 1 - a) & 1 for a in global_axes], axes)
+	else:
+		a, local = step
+		other = s | 1 << (g - 1 - a)
+		axis = 1 + local - g
+		x = np.take(shards[s:s + 1], 1, axis = axis)
+		y = np.take(shards[other:other + 1], 0, axis = axis)
+		index = [slice(None)] * shards.ndim
+		index[axis] = 1
+		low = [slice(None)] * shards.ndim
+		low[axis] = 0
+		shards[s:s + 1][tuple(index)] = y
+		shards[other:other + 1][tuple(low)] = x
+
+def _tasks(i, step, g):
+	if step[0] == "gates":
+		return [(i, s) for s in range(2 ** g)]
+	bit = 1 << (g - 1 - step[1])
+	return [(i, s) for s in range(2 ** g) if not s & bit]
+
+# statevector of circuit on the basis input (registers little-endian like int_to_qubits),
+# or on the statevector initial; 2^g shards with g = log2 of processes rounded up
+def sharded_state(circuit, inputs = (), initial = None, processes = None, global_qubits = None, lookahead = 256):
+	n = circuit._nqubits
+	processes = processes or multiprocessing.cpu_count()
+	g = global_qubits if global_qubits is not None else (processes - 1).bit_length()
+	dtype = np.dtype(tc.dtypestr)
+	steps, layout = partition(circuit, g, lookahead, dtype)
+
+	memory = shared_memory.SharedMemory(create = True, size = 2 ** n * dtype.itemsize)
+	try:
+		psi = np.ndarray(2 ** n, dtype = dtype, buffer = memory.buf)
+		if initial is not None:
+			psi[:] = np.asarray(initial, dtype = dtype).reshape(-1)
+		else:
+			psi[:] = 0
+			index = 0
+			for register, value in inputs:
+				for i, q in enumerate(register):
+					index |= (value >> i & 1) << (n - 1 - q)
+			psi[index] = 1
+		job = {"name": memory.name, "n": n, "g": g, "dtype": dtype, "steps": steps}
+		tasks = [_tasks(i, step, g) for i, step in enumerate(steps)]
+		with section("simulation"):
+			note(state = psi.nbytes)
+			if processes == 1:
+				_init(job)
+				for batch in tasks:
+					for task in batch:
+						_step(task)
+			else:
+				with multiprocessing.Pool(processes, initializer = _init, initargs = (job,)) as pool:
+					for batch in tasks:
+						pool.map(_step, batch)
+		# axis layout[q] -> qubit q
+		result = np.transpose(psi.reshape((2,) * n), np.argsort(layout)).reshape(-1).copy()
+		del psi
+	finally:
+		if processes == 1 and _job is not None:
+			_job["shards"] = None
+			_job["memory"].close()
+		memory.close()
+		memory.unlink()
+	return result
+
+def swaps(steps):
+	return sum(1 for step in steps if step[0] == "swap")
+
+if __name__ == "__main__":
+	from point_addition import ecc_registers, cond_ECC_add_0
+	alloc, p, x, z = ecc_registers()
+	with gate_level():
+		circuit = cond_ECC_add_0(p, x, 2, 4, z, alloc = alloc)
+	inputs = [([p], 1), (x[0:4], 1), (x[4:8], 2)]
+	start = Circuit(circuit._nqubits)
+	for register, value in inputs:
+		start.append(int_to_qubits(register, value))
+	begin = time.time()
+	reference = tc.backend.numpy(state(start.append(circuit)))
+	print(f"tools.state {time.time() - begin:.2f}s")
+	for processes, g in ((1, 0), (2, 1), (4, 2)):
+		steps, layout = partition(circuit, g)
+		begin = time.time()
+		psi = sharded_state(circuit, inputs, processes = processes, global_qubits = g)
+		print(f"{processes} processes, {2 ** g} shards, {swaps(steps)} swaps: {time.time() - begin:.2f}s, matches {np.allclose(psi, reference, atol = 1e-5)}")
@@ -0,0 +1,133 @@
+import tensorcircuit as tc
+import numpy as np
+from tools import *
+from classical import encode, decode
+
+# Statevector kept as {basis index: amplitude} over its nonzero terms, bit q of the index
+# holding qubit q (as in classical.run_bits), so the width is not limited. A gate maps each
+# term through the nonzero entries of its matrix column: permutations (x, cnot, toffoli,
+# cswap, multicontrol x) and diagonal gates (phase, cphase, rz, ...) keep one term per term,
+# only branching gates (h, the QFT of a Draper adder, dense blocks) grow the support, and
+# terms that cancel below tolerance are dropped. Memory and time go with the number of
+# terms instead of 2^n; build at gate_level() so the blocks stay small gates.
+#	psi = SparseState.superposition(9, [(1 / np.sqrt(2), [(x, 1)]), (1 / np.sqrt(2), [(x, 4)])])
+#	psi.run(circuit).probabilities([x])
+
+# gate matrices come in tc.dtypestr, so cancelled terms are left at about its precision
+def _tolerance():
+	return 1e-5 if tc.dtypestr == "complex64" else 1e-10
+
+class SparseState:
+	def __init__(self, nqubits, amplitudes = None, tolerance = None):
+		self.nqubits = nqubits
+		self.amplitudes = dict(amplitudes or {})
+		self.tolerance = tolerance or _tolerance()
+		self.peak = len(self.amplitudes)
+
+	@classmethod
+	def basis(cls, nqubits, registers = (), **options):
+		return cls(nqubits, {encode(registers): 1.0}, **options)
+
+	# terms: [(amplitude, [(register, value), ...]), ...]
+	@classmethod
+	def superposition(cls, nqubits, terms, **options):
+		amplitudes = {}
+		for amplitude, registers in terms:
+			index = encode(registers)
+			amplitudes[index] = amplitudes.get(index, 0) + amplitude
+		return cls(nqubits, amplitudes, **options)
+
+	def __len__(self):
+		return len(self.amplitudes)
+
+	def norm(self):
+		return float(np.sqrt(sum(abs(a) ** 2 for a in self.amplitudes.values())))
+
+	# u (2^k x 2^k, qubits[0] most significant like the gate tensors) on qubits, for the terms
+	# whose control qubits read want
+	def _apply(self, u, qubits, controls = 0, want = 0):
+		k = len(qubits)
+		mask = sum(1 << q for q in qubits)
+		spread = [sum((r >> (k - 1 - j) & 1) << q for j, q in enumerate(qubits)) for r in range(2 ** k)]
+		columns = {}
+		result = {}
+		for i, a in self.amplitudes.items():
+			if i & controls != want:
+				result[i] = result.get(i, 0) + a
+				continue
+			col = 0
+			for q in qubits:
+				col = col << 1 | (i >> q & 1)
+			if col not in columns:
+				rows = np.flatnonzero(np.abs(u[:, col]) > 1e-15)
+				columns[col] = [(spread[r], complex(u[r, col])) for r in rows]
+			rest = i & ~mask
+			for s, v in columns[col]:
+				j = rest | s
+				result[j] = result.get(j, 0) + v * a
+		self.amplitudes = {i: a for i, a in result.items() if abs(a) > self.tolerance}
+		self.peak = max(self.peak, len(self.amplitudes))
+
+	def apply(self, d):
+		index = list(d["index"])
+		if d["gatef"].n == "multicontrol":
+			ctrl = list(d["parameters"]["ctrl"])
+			unitary = d["parameters"]["unitary"]
+			targets = index[len(ctrl):]
+			u = np.asarray(tc.backend.numpy(getattr(unitary, "tensor", unitary))).reshape(2 ** len(targets), -1)
+			controls = sum(1 << q for q in index[:len(ctrl)])
+			self._apply(u, targets, controls, sum(v << q for q, v in zip(index, ctrl)))
+		elif d["gatef"].n != "i":
+			u = np.asarray(tc.backend.numpy(d["gate"].tensor)).reshape(2 ** len(index), -1)
+			self._apply(u, index)
+		return self
+
+	def run(self, circuit):
+		if circuit._nqubits > self.nqubits:
+			raise ValueError(f"circuit on {circuit._nqubits} qubits, state has {self.nqubits}")
+		for d in circuit.to_qir():
+			self.apply(d)
+		return self
+
+	# {(value of each register): probability}
+	def probabilities(self, registers):
+		result = {}
+		for i, a in self.amplitudes.items():
+			key = tuple(decode(i, register) for register in registers)
+			result[key] = result.get(key, 0) + abs(a) ** 2
+		return result
+
+	# the tensorcircuit statevector (qubit 0 most significant), for small n
+	def dense(self):
+		psi = np.zeros(2 ** self.nqubits, dtype = tc.dtypestr)
+		for i, a in self.amplitudes.items():
+			psi[sum((i >> q & 1) << (self.nqubits - 1 - q) for q in range(self.nqubits))] = a
+		return psi
+
+def run_sparse(circuit, terms, **options):
+	return SparseState.superposition(circuit._nqubits, terms, **options).run(circuit)
+
+if __name__ == "__main__":
+	import time
+	from modular_addition import add_mod_const, mod_add
+	# 1-8 version of the 2-term test of src/modules/modular_constant_addition.py
+	x, z = [0, 1, 2], [3]
+	with gate_level():
+		circuit = add_mod_const(x, 3, z)
+	psi = run_sparse(circuit, [(1 / np.sqrt(2), [(x, 1)]), (1 / np.sqrt(2), [(x, 4)])])
+	print(f"(|1> + |4>) / sqrt 2 + 3 mod 7: {psi.probabilities([x, z])}, peak support {psi.peak}")
+
+	x, y, z = [0, 1, 2, 3], [4, 5, 6, 7], [8]
+	with gate_level():
+		circuit = mod_add(x, y, z, modulus = 7)
+	terms = [(0.6, [(x, 3), (y, 5)]), (0.8j, [(x, 6), (y, 6)])]
+	start = time.time()
+	psi = run_sparse(circuit, terms)
+	sparse_time = time.time() - start
+	c = Circuit(9, inputs = SparseState.superposition(9, terms).dense())
+	c.append(circuit)
+	start = time.time()
+	reference = tc.backend.numpy(c.state())
+	dense_time = time.time() - start
+	print(f"mod_add on 2 terms: {psi.probabilities([x, y, z])}, peak support {psi.peak} of {2 ** 9}")
+	print(f"matches the dense statevector: {np.allclose(psi.dense(), reference, atol = 1e-6)}, sparse {sparse_time:.3f}s, dense {dense_time:.3f}s")
@@ -2,16 +2,28 @@ import tensorcircuit as tc
 from modular_addition import * 
 from tools import *
 
+# y += x ** 2 mod p with x = sum 2^i x_i:
+#	x ** 2 = sum 4^i x_i + sum_{i < j} 2^(i + j + 1) x_i x_j
+# so every unordered pair is added once and the diagonal needs a single control.
+# fourier: y stays in the QFT basis across all the additions (add_mod_const_fourier)
 @block
-def add_mod_square(x, y, z):
-	c = tc.Circuit(max(x + y + z) + 1)
-	n = len(x)
+def add_mod_square(x, y, z, modulus = 7, fourier = False):
+	c = Circuit(max(x + y + z) + 1)
+	n = len(y)
+	if fourier:
+		c.append(QFT(y))
 
-	for i in range(3):
-		for j in range(3):
-			if i != j:
-				c.append(ccadd_mod_const(0, 1, [2, 3, 4, 5], (2 ** (i + j)) % 7, [6]) , indices = [x[i]] + [x[j]] + y + [z[0]])
-			if i == j:
-				c.append(cadd_mod_const(0, [1, 2, 3, 4], (2 ** (i + i)) % 7, [5]), indices = [x[i]] + y + [z[0]])
+	for i in range(modulus.bit_length()):
+		if fourier:
+			c.append(add_mod_const_fourier([0], list(range(1, n + 1)), 4 ** i % modulus, [n + 1], modulus = modulus), indices = [x[i]] + y + [z[0]])
+		else:
+			c.append(cadd_mod_const(0, list(range(1, n + 1)), 4 ** i % modulus, [n + 1], modulus = modulus), indices = [x[i]] + y + [z[0]])
+		for j in range(i + 1, modulus.bit_length()):
+			if fourier:
+				c.append(add_mod_const_fourier([0, 1], list(range(2, n + 2)), 2 ** (i + j + 1) % modulus, [n + 2], modulus = modulus), indices = [x[i], x[j]] + y + [z[0]])
+			else:
+				c.append(ccadd_mod_const(0, 1, list(range(2, n + 2)), 2 ** (i + j + 1) % modulus, [n + 2], modulus = modulus), indices = [x[i], x[j]] + y + [z[0]])
 	
-	return c
\ No newline at end of file
+	if fourier:
+		c.append(IQFT(y))
+	return c
@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sparse import run_sparse
+
+# register values after circuit on one basis input ([(register, value), ...]), with their
+# probability; build the circuit inside gate_level() so the sparse simulation stays small
+def _run(circuit, inputs, registers):
+	psi = run_sparse(circuit, [(1, list(inputs))])
+	values, probability = max(psi.probabilities(registers).items(), key = lambda kv: kv[1])
+	return values, probability
+
+@pytest.fixture
+def run():
+	return _run
@@ -0,0 +1,35 @@
+import pytest
+from tools import gate_level
+from classical import run_bits, encode, decode
+from adders import ripple, ripple_add
+
+@pytest.mark.parametrize("n", [1, 3, 4])
+def test_ripple_add(n):
+	x, y, carry = list(range(n)), list(range(n, 2 * n)), 2 * n
+	with gate_level():
+		forward = ripple_add(x, y, carry)
+		backward = ripple_add.inverse(x, y, carry)
+	for a in range(2 ** n):
+		for b in range(2 ** n):
+			state = run_bits(forward, encode([(x, a), (y, b)]))
+			assert (decode(state, x), decode(state, y), state >> carry & 1) == (a, (a + b) % 2 ** n, 0)
+			state = run_bits(backward, state)
+			assert state == encode([(x, a), (y, b)])
+
+def test_ripple_engine():
+	n = 4
+	x, y, c1, c2 = list(range(n)), list(range(n, 2 * n)), 2 * n, 2 * n + 1
+	s = list(range(2 * n + 2, 2 * n + 2 + ripple.scratch(n)))
+	with gate_level():
+		add_const = ripple.add_const(y, 5, s)
+		cond_add = ripple.cond_add(c1, x, y, s)
+		cond_cadd_const = ripple.cond_cadd_const(c1, c2, y, 11, s)
+	for a in range(2 ** n):
+		for b in range(2 ** n):
+			for p1 in (0, 1):
+				for p2 in (0, 1):
+					inputs = [(x, a), (y, b), ([c1], p1), ([c2], p2)]
+					for circuit, expected in ((add_const, b + 5), (cond_add, b + a * p1), (cond_cadd_const, b + 11 * p1 * p2)):
+						state = run_bits(circuit, encode(inputs))
+						assert decode(state, y) == expected % 2 ** n
+						assert state & ~sum(1 << q for q in y) == encode(inputs) & ~sum(1 << q for q in y)
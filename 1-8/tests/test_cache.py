@@ -0,0 +1,52 @@
+import functools
+import glob
+import os
+import pytest
+import shutil
+import cache
+import tools
+from tools import gate_level, stable_repr
+from multiplication import mod_multiplication
+from modular_addition import cond_mod_add_fourier
+
+@pytest.fixture
+def directory(tmp_path):
+	cache.enable(str(tmp_path))
+	yield str(tmp_path)
+	cache.disable()
+
+def test_stable_repr():
+	multiplier = functools.partial(mod_multiplication, mod_adder = cond_mod_add_fourier)
+	text = stable_repr(((1, 2), [3], {"multiplier": multiplier}))
+	assert "0x" not in text and "multiplication.mod_multiplication" in text
+	assert stable_repr((1,)) == repr((1,)) and stable_repr(()) == repr(())
+	with pytest.raises(ValueError):
+		stable_repr(lambda: 0)
+	with pytest.raises(ValueError):
+		stable_repr(object())
+
+def test_cached_circuit(directory):
+	x, y, o, z = [0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12]
+	with gate_level():
+		built = cache.cached(mod_multiplication, x, y, o, z, mod_adder = cond_mod_add_fourier)
+		assert len(glob.glob(os.path.join(directory, "circuit-*.json"))) == 1
+		loaded = cache.cached(mod_multiplication, x, y, o, z, mod_adder = cond_mod_add_fourier)
+	assert loaded is not built
+	assert [(d["gatef"].n, list(d["index"])) for d in loaded.to_qir()] == [(d["gatef"].n, list(d["index"])) for d in built.to_qir()]
+
+# editing a module the builder only calls (here the modular adder) misses the cache
+def test_callee_edit_misses(directory, tmp_path_factory, monkeypatch):
+	project = tmp_path_factory.mktemp("project")
+	for path in glob.glob(os.path.join(tools._project, "*.py")):
+		shutil.copy(path, project)
+	monkeypatch.setattr(tools, "_project", str(project))
+	x, y, o, z = [0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12]
+	saved = lambda: len(glob.glob(os.path.join(directory, "circuit-*.json")))
+	with gate_level():
+		cache.cached(mod_multiplication, x, y, o, z)
+		cache.cached(mod_multiplication, x, y, o, z)
+		assert saved() == 1
+		with open(project / "modular_addition.py", "a") as f:
+			f.write("# edited\n")
+		cache.cached(mod_multiplication, x, y, o, z)
+		assert saved() == 2
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import tensorcircuit as tc
+from tools import Circuit, gate_level, ccphase, controlled_H
+from qft import QFT
+from modular_addition import mod_add, cond_mod_add
+from clifford_t import CLIFFORD, lower, t_cost
+
+# the lowered circuit on its ancillas in |0> is the original up to a global phase, and
+# leaves them in |0>; gate-level input lowers to Clifford+T and rz only
+def _check(c, opaque = False):
+	lowering = lower(c)
+	u = np.asarray(tc.backend.numpy(c.matrix()))
+	v = np.asarray(tc.backend.numpy(lowering.circuit().matrix()))
+	step = 2 ** lowering.ancillas
+	assert np.isclose(abs(np.trace(u.conj().T @ v[::step, ::step])) / len(u), 1, atol = 1e-5)
+	names = {name for name, *_ in lowering.ops}
+	assert names <= CLIFFORD | {"t", "td", "rz", "any"}
+	assert bool(lowering.opaque) == opaque
+	return lowering
+
+def test_mod_add():
+	with gate_level():
+		_check(mod_add([0, 1, 2, 3], [4, 5, 6, 7], [8]))
+
+def test_cond_mod_add():
+	with gate_level():
+		_check(cond_mod_add(0, [1, 2, 3, 4], [5, 6, 7, 8], [9]))
+
+# a dense block that is not diagonal stays one opaque gate
+def test_dense_qft():
+	c = Circuit(3)
+	c.any(0, 1, 2, unitary = QFT([0, 1, 2]).matrix())
+	_check(c, opaque = True)
+
+# tools.ccphase is recognised and lowered to the 7-rotation parity network
+def test_ccphase():
+	c = Circuit(3)
+	ccphase(c, 0, 1, 2, 0.9)
+	assert sum(1 for name, *_ in _check(c).ops if name == "rz") == 7
+
+# 0-controls are flipped around, the controls anded on an ancilla ladder
+@pytest.mark.parametrize("unitary", [tc.gates._x_matrix, np.diag(np.exp(1j * np.array([0.4, 1.3])))])
+def test_multicontrol(unitary):
+	c = Circuit(4)
+	c.h(0)
+	c.multicontrol(0, 1, 2, 3, ctrl = [1, 0, 1], unitary = unitary)
+	assert _check(c).ancillas > 0
+
+def test_diagonal_block():
+	c = Circuit(3)
+	c.any(0, 1, 2, unitary = np.diag(np.exp(1j * np.random.default_rng(1).uniform(-np.pi, np.pi, 8))))
+	_check(c)
+
+def test_controlled_h():
+	c = Circuit(2)
+	c.append(controlled_H(0, 1))
+	lowering = _check(c)
+	assert t_cost(lowering).t_count == 2
+
+@pytest.mark.parametrize("gate", ["toffoli", "cswap"])
+def test_t_count(gate):
+	c = Circuit(3)
+	getattr(c, gate)(0, 1, 2)
+	cost = t_cost(c)
+	assert (cost.t_count, cost.rotations, cost.ancillas) == (7, 0, 0)
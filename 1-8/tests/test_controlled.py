@@ -0,0 +1,27 @@
+import pytest
+from tools import gate_level
+from modular_addition import add_mod_const, mod_add
+from controlled import controlled
+
+# only the phase layer is controlled: with any control off the module is the identity
+@pytest.mark.parametrize("controls", [[5], [5, 6]])
+def test_controlled_add_mod_const(controls, run):
+	x, z = [0, 1, 2, 3], [4]
+	with gate_level():
+		circuit = controlled(add_mod_const(x, 3, z), controls)
+	for a in range(7):
+		for on in range(2 ** len(controls)):
+			inputs = [(x, a)] + [([q], on >> i & 1) for i, q in enumerate(controls)]
+			values, probability = run(circuit, inputs, [x, z])
+			expected = (a + 3) % 7 if on == 2 ** len(controls) - 1 else a
+			assert values == (expected, 0) and probability > 0.99
+
+def test_controlled_mod_add(run):
+	x, y, z, ctrl = [0, 1, 2, 3], [4, 5, 6, 7], [8], 9
+	with gate_level():
+		circuit = controlled(mod_add(x, y, z), ctrl)
+	for a in range(7):
+		for b in range(7):
+			for on in (0, 1):
+				values, probability = run(circuit, [(x, a), (y, b), ([ctrl], on)], [x, y, z])
+				assert values == (a, (b + a * on) % 7, 0) and probability > 0.99
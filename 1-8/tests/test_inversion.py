@@ -0,0 +1,25 @@
+import pytest
+from tools import gate_level
+from inversion import kaliski_inverse, inverse_ancillas
+
+@pytest.mark.parametrize("p", [5, 7])
+def test_kaliski_inverse(p, run):
+	w = p.bit_length() + 1
+	x, o = list(range(w)), list(range(w, 2 * w))
+	z = list(range(2 * w, 2 * w + inverse_ancillas(p)))
+	with gate_level():
+		circuit = kaliski_inverse(x, o, z, p)
+	for a in range(p):
+		values, probability = run(circuit, [(x, a)], [x, o, z])
+		assert values == (a, pow(a, -1, p) if a else 0, 0) and probability > 0.99
+
+def test_kaliski_inverse_scaled(run):
+	p, scale = 7, 4
+	w = p.bit_length() + 1
+	x, o = list(range(w)), list(range(w, 2 * w))
+	z = list(range(2 * w, 2 * w + inverse_ancillas(p)))
+	with gate_level():
+		circuit = kaliski_inverse(x, o, z, p, scale = scale)
+	for a in range(1, p):
+		values, probability = run(circuit, [(x, a)], [x, o, z])
+		assert values == (a, scale * pow(a, -1, p) % p, 0) and probability > 0.99
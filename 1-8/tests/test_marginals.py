@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from tools import Circuit
+from sparse import SparseState
+from marginals import marginal, most_likely
+
+n = 5
+
+# a random 5-qubit state (qubit 0 most significant) and its marginal by brute force over
+# every basis index, registers little-endian
+@pytest.fixture(scope = "module")
+def psi():
+	rng = np.random.default_rng(3)
+	psi = rng.normal(size = 2 ** n) + 1j * rng.normal(size = 2 ** n)
+	return (psi / np.linalg.norm(psi)).astype(np.complex64)
+
+def _brute(psi, registers):
+	result = np.zeros(tuple(2 ** len(r) for r in registers))
+	for i, a in enumerate(psi):
+		bits = [i >> (n - 1 - q) & 1 for q in range(n)]
+		result[tuple(sum(bits[q] << k for k, q in enumerate(r)) for r in registers)] += abs(a) ** 2
+	return result
+
+def _sparse(psi):
+	amplitudes = {sum((i >> (n - 1 - q) & 1) << q for q in range(n)): a for i, a in enumerate(psi)}
+	return SparseState(n, amplitudes)
+
+@pytest.mark.parametrize("registers", [[[3, 1]], [[3, 1], [4]], [[0, 2, 4]], [[4], [0]]])
+def test_marginal(psi, registers):
+	expected = _brute(psi, registers)
+	for state in (psi, Circuit(n, inputs = psi), _sparse(psi)):
+		assert np.allclose(marginal(state, *registers), expected, atol = 1e-5)
+
+def test_most_likely(psi):
+	p = _brute(psi, [[3, 1], [4]])
+	index = np.unravel_index(int(np.argmax(p)), p.shape)
+	values, probability = most_likely(psi, [3, 1], [4])
+	assert values == tuple(int(v) for v in index) and np.isclose(probability, p[index], atol = 1e-5)
+
+def test_overlapping_registers(psi):
+	with pytest.raises(ValueError):
+		marginal(psi, [0, 1], [1])
@@ -0,0 +1,70 @@
+import pytest
+from tools import gate_level
+from adders import draper, ripple
+from modular_addition import mod_add_compare, cond_mod_add_compare, add_mod_const_folded, cadd_mod_const_folded
+
+# the flag, then the comparator's carry and the adder's scratch
+def _flags(n, adder, start):
+	return list(range(start, start + 1 + max(1, adder.scratch(n))))
+
+@pytest.mark.parametrize("adder", [draper, ripple])
+def test_mod_add_compare(adder, run):
+	x, y = [0, 1, 2, 3], [4, 5, 6, 7]
+	z = _flags(4, adder, 8)
+	with gate_level():
+		circuit = mod_add_compare(x, y, z, adder = adder)
+	for a in range(7):
+		for b in range(7):
+			values, probability = run(circuit, [(x, a), (y, b)], [x, y, z])
+			assert values == (a, (a + b) % 7, 0) and probability > 0.99
+
+@pytest.mark.parametrize("adder", [draper, ripple])
+def test_cond_mod_add_compare(adder, run):
+	p, x, y = 0, [1, 2, 3, 4], [5, 6, 7, 8]
+	z = _flags(4, adder, 9)
+	with gate_level():
+		circuit = cond_mod_add_compare(p, x, y, z, adder = adder)
+	for control in (0, 1):
+		for a in range(7):
+			for b in range(7):
+				values, probability = run(circuit, [([p], control), (x, a), (y, b)], [x, y, z])
+				assert values == (a, (b + a * control) % 7, 0) and probability > 0.99
+
+@pytest.mark.parametrize("adder", [draper, ripple])
+def test_add_mod_const_folded(adder, run):
+	x = [0, 1, 2, 3]
+	z = _flags(4, adder, 4)
+	for value in range(7):
+		with gate_level():
+			circuit = add_mod_const_folded(x, value, z, adder = adder)
+		for a in range(7):
+			values, probability = run(circuit, [(x, a)], [x, z])
+			assert values == ((a + value) % 7, 0) and probability > 0.99
+
+@pytest.mark.parametrize("adder", [draper, ripple])
+def test_cadd_mod_const_folded(adder, run):
+	ctrl, x = 0, [1, 2, 3, 4]
+	z = _flags(4, adder, 5)
+	for value in range(7):
+		with gate_level():
+			circuit = cadd_mod_const_folded(ctrl, x, value, z, adder = adder)
+		for control in (0, 1):
+			for a in range(7):
+				values, probability = run(circuit, [([ctrl], control), (x, a)], [x, z])
+				assert values == ((a + value * control) % 7, 0) and probability > 0.99
+
+# the QFT / IQFT passes each multiplier really runs: ten per cond_mod_add and four per
+# cond_mod_add_fourier (the sign-bit reads), four per mod_doubling, none in the Fourier REDC's
+# phase-basis additions
+def test_transforms():
+	from multiplication import mod_multiplication
+	from montgomery import fourier_multiplication, fourier_ancillas
+	from modular_addition import cond_mod_add, cond_mod_add_fourier
+	from counts import transforms
+	x, y, o = [0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11]
+	with gate_level():
+		assert transforms(cond_mod_add(12, x, y, [13])) == 10
+		assert transforms(cond_mod_add_fourier(12, x, y, [13])) == 4
+		assert transforms(mod_multiplication(x, y, o, [12])) == 54
+		assert transforms(mod_multiplication(x, y, o, [12], mod_adder = cond_mod_add_fourier)) == 38
+		assert transforms(fourier_multiplication(x, y, o, list(range(12, 12 + fourier_ancillas(7))))) == 16
@@ -0,0 +1,46 @@
+import pytest
+from tools import gate_level
+from montgomery import mont_multiplication, mont_square, mont_ancillas, fourier_multiplication, fourier_ancillas, to_montgomery, from_montgomery
+from point_addition import ecc_registers, cond_ECC_add_0
+
+def _registers(p, count, ancillas = mont_ancillas):
+	w = p.bit_length() + 1
+	registers = [list(range(i * w, (i + 1) * w)) for i in range(count)]
+	return registers + [list(range(count * w, count * w + ancillas(p)))]
+
+# the Fourier accumulator branches over every phase term, so it is kept to small p
+@pytest.mark.parametrize("multiplier, ancillas, p", [
+	(mont_multiplication, mont_ancillas, 5),
+	(mont_multiplication, mont_ancillas, 11),
+	(fourier_multiplication, fourier_ancillas, 5),
+	(fourier_multiplication, fourier_ancillas, 7),
+])
+def test_mont_multiplication(multiplier, ancillas, p, run):
+	x, y, o, z = _registers(p, 3, ancillas)
+	with gate_level():
+		circuit = multiplier(x, y, o, z, p)
+	for a in range(p):
+		for b in range(p):
+			inputs = [(x, to_montgomery(a, p)), (y, to_montgomery(b, p))]
+			(u, v, w, scratch), probability = run(circuit, inputs, [x, y, o, z])
+			assert (u, v) == (to_montgomery(a, p), to_montgomery(b, p))
+			assert from_montgomery(w, p) == a * b % p
+			assert scratch == 0 and probability > 0.99
+
+@pytest.mark.parametrize("p", [5, 11])
+def test_mont_square(p, run):
+	x, o, z = _registers(p, 2)
+	with gate_level():
+		circuit = mont_square(x, o, z, p)
+	for a in range(p):
+		for b in (0, 1, p - 1):
+			inputs = [(x, to_montgomery(a, p)), (o, to_montgomery(b, p))]
+			(u, w, scratch), probability = run(circuit, inputs, [x, o, z])
+			assert u == to_montgomery(a, p)
+			assert from_montgomery(w, p) == (b + a * a) % p
+			assert scratch == 0 and probability > 0.99
+
+def test_montgomery_needs_kaliski():
+	alloc, p, x, z = ecc_registers()
+	with pytest.raises(ValueError):
+		cond_ECC_add_0(p, x, 2, 4, z, alloc = alloc, multiplier = mont_multiplication)
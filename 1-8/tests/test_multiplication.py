@@ -0,0 +1,37 @@
+import pytest
+from tools import gate_level
+from modular_addition import cond_mod_add, cond_mod_add_compare, cond_mod_add_fourier
+from multiplication import mod_multiplication
+from sum_of_squares import add_mod_square
+
+@pytest.mark.parametrize("mod_adder", [cond_mod_add, cond_mod_add_compare, cond_mod_add_fourier])
+def test_mod_multiplication(mod_adder, run):
+	x, y, o, z = [0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12, 13]
+	with gate_level():
+		circuit = mod_multiplication(x, y, o, z, mod_adder = mod_adder)
+	for a in range(7):
+		for b in range(7):
+			values, probability = run(circuit, [(x, a), (y, b), (o, 3)], [x, y, o, z])
+			assert values == (a, b, (3 + a * b) % 7, 0) and probability > 0.99
+
+# the Fourier accumulator skips the QFT / IQFT pair of every addition into o
+def test_fourier_accumulator_saves_transforms():
+	x, y, o, z = [0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12]
+	with gate_level():
+		plain = mod_multiplication(x, y, o, z).to_qir()
+		fourier = mod_multiplication(x, y, o, z, mod_adder = cond_mod_add_fourier).to_qir()
+	hadamards = lambda gates: sum(1 for d in gates if d["gatef"].n == "h")
+	assert hadamards(fourier) < hadamards(plain)
+	assert len(fourier) < len(plain)
+
+@pytest.mark.parametrize("p", [5, 7, 11])
+@pytest.mark.parametrize("fourier", [False, True])
+def test_add_mod_square(p, fourier, run):
+	n = p.bit_length()
+	x, y, z = list(range(n + 1)), list(range(n + 1, 2 * n + 2)), [2 * n + 2]
+	with gate_level():
+		circuit = add_mod_square(x, y, z, modulus = p, fourier = fourier)
+	for a in range(p):
+		for b in (0, p - 1):
+			values, probability = run(circuit, [(x, a), (y, b)], [x, y, z])
+			assert values == (a, (b + a * a) % p, 0) and probability > 0.99
@@ -0,0 +1,22 @@
+import numpy as np
+from tools import Circuit, gate_level
+from modular_addition import mod_add
+from noise import NoiseModel, bit_flip, depolarizing, success_probability
+
+def test_noiseless_mod_add():
+	x, y, z = [0, 1, 2, 3], [4, 5, 6, 7], [8]
+	with gate_level():
+		circuit = mod_add(x, y, z)
+	for channel in (depolarizing(0), bit_flip(0)):
+		mean, error = success_probability(circuit, NoiseModel({"*": channel}), [(x, 3), (y, 5)], [(x, 3), (y, 1), (z, 0)], count = 64)
+		assert np.isclose(mean, 1, atol = 1e-5) and error < 1e-5
+
+# each trajectory flips the bit with probability p
+def test_bit_flip():
+	c = Circuit(1)
+	c.x(0)
+	p = 0.2
+	model = NoiseModel({"x": bit_flip(p)})
+	mean, error = success_probability(c, model, [], [([0], 1)], count = 4096, seed = 5)
+	assert abs(mean - (1 - p)) < 3 * error
+	assert (mean, error) == success_probability(c, model, [], [([0], 1)], count = 4096, seed = 5)
@@ -0,0 +1,45 @@
+import pytest
+from tools import gate_level
+from register import RegisterAllocator
+from point_addition import ecc_registers, cond_ECC_add_0, cond_ECC_add_classical, point_addition_corner
+from verification import curve_points
+
+def test_released_ancillas_are_reused():
+	alloc = RegisterAllocator()
+	x = alloc.register("x", 4)
+	with alloc.borrow(2) as a:
+		assert a == [4, 5]
+	assert alloc.ancilla(3) == [4, 5, 6]
+	assert x == [0, 1, 2, 3] and alloc.width == 7 and alloc.peak == 7
+
+def test_release_checks():
+	alloc = RegisterAllocator()
+	a = alloc.ancilla(2)
+	with pytest.raises(ValueError):
+		alloc.release([9])
+	alloc.release(a)
+	with pytest.raises(ValueError):
+		alloc.release(a)
+	alloc.ancilla(1, name = "t")
+	with pytest.raises(ValueError):
+		alloc.ancilla(1, name = "t")
+
+# x3, y3 against point_addition_corner, and lambda and every flag and scratch qubit the
+# oracle borrowed back in |0>; with p = 1 P = +-Q has no lambda and for P + Q = -Q lambda
+# cannot be cleared (see cond_ECC_add_0)
+@pytest.mark.parametrize("build", [cond_ECC_add_0, cond_ECC_add_classical])
+def test_oracle(build, run):
+	Q = (2, 4)
+	alloc, p, x, z = ecc_registers()
+	with gate_level():
+		circuit = build(p, x, Q[0], Q[1], z, alloc = alloc)
+	scratch = [q for q in range(circuit._nqubits) if q != p and q not in x + z]
+	assert alloc.live == 1 + len(x) + len(z) and scratch
+	for control in (0, 1):
+		for P in curve_points(5, 5, 7):
+			if control and P[0] == Q[0]:
+				continue
+			values, probability = run(circuit, [([p], control), (x[0:4], P[0]), (x[4:8], P[1])], [[p], x[0:4], x[4:8], z, scratch])
+			R = point_addition_corner(P, Q, 5, 5, 7) if control else P
+			assert values[0:3] == (control, R[0], R[1]) and values[4] == 0 and probability > 0.99
+			assert values[3] == 0 or (control and R[0] == Q[0])
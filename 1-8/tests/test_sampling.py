@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from tools import Circuit, int_to_qubits
+from marginals import marginal
+from sampling import Sampler, sample, decode
+
+n = 5
+
+@pytest.fixture(scope = "module")
+def psi():
+	rng = np.random.default_rng(3)
+	psi = rng.normal(size = 2 ** n) + 1j * rng.normal(size = 2 ** n)
+	return (psi / np.linalg.norm(psi)).astype(np.complex64)
+
+@pytest.mark.parametrize("method", ["cumsum", "alias"])
+def test_seeded(psi, method):
+	a = sample(psi, 1000, [3, 1], rng = 7, method = method)
+	assert np.array_equal(a, sample(psi, 1000, [3, 1], rng = 7, method = method))
+	assert not np.array_equal(a, sample(psi, 1000, [3, 1], rng = 8, method = method))
+
+# qubit 0 is the most significant bit of the basis index, registers little-endian
+def test_decode():
+	x = [3, 1]
+	c = Circuit(n)
+	c.append(int_to_qubits(x, 2))
+	c.append(int_to_qubits([4], 1))
+	basis = c.state()
+	shots = sample(basis, 100, rng = 1)
+	assert np.array_equal(decode(shots, n, x), sample(basis, 100, x, rng = 1))
+	assert np.array_equal(decode(shots, n, x, [4]), np.tile([2, 1], (100, 1)))
+
+# chi-square of the shot counts against the marginal, well inside its 99.9% bound
+@pytest.mark.parametrize("method", ["cumsum", "alias"])
+@pytest.mark.parametrize("registers, bound", [([[3, 1]], 16.3), ([], 61.1)])
+def test_frequencies(psi, method, registers, bound):
+	shots = 20000
+	s = sample(psi, shots, *registers, rng = 11, method = method)
+	p = marginal(psi, *registers).reshape(-1) if registers else np.abs(psi) ** 2
+	counts = np.bincount(s.reshape(-1) if registers else s, minlength = len(p))
+	expected = shots * p / p.sum()
+	assert np.sum((counts - expected) ** 2 / expected) < bound
+
+def test_alias_table():
+	p = np.array([0.5, 0.25, 0.125, 0.125, 0])
+	sampler = Sampler(p, "alias")
+	assert np.allclose(np.bincount(np.arange(5), weights = sampler.prob) + np.bincount(sampler.alias, weights = 1 - sampler.prob, minlength = 5), p * 5)
+	assert not np.any(sampler.draw(10000, rng = 2) == 4)
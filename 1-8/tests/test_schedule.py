@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import tensorcircuit as tc
+from tools import Circuit, gate_level, state
+from modular_addition import mod_add, cond_mod_add, cond_mod_add_fourier
+from schedule import DAG, layered_state
+
+# x and y in superposition, so any reordering of gates that do not commute shows up in
+# the phases
+def _start(n, qubits):
+	c = Circuit(n)
+	for q in qubits:
+		c.h(q)
+	return c
+
+@pytest.mark.parametrize("build", [
+	lambda: mod_add([0, 1, 2, 3], [4, 5, 6, 7], [8]),
+	lambda: cond_mod_add(0, [1, 2, 3, 4], [5, 6, 7, 8], [9]),
+	lambda: cond_mod_add_fourier(0, [1, 2, 3, 4], [5, 6, 7, 8], [9]),
+])
+def test_reordered_circuit(build):
+	with gate_level():
+		circuit = build()
+	n = circuit._nqubits
+	start = _start(n, range(n - 1))
+	reference = np.asarray(tc.backend.numpy(state(Circuit.from_qir(start.to_qir() + circuit.to_qir(), {"nqubits": n}))))
+	dag = DAG(circuit)
+	for mode in ("asap", "alap"):
+		reordered = dag.circuit(mode)
+		key = lambda d: (d["gatef"].n, list(d["index"]))
+		assert sorted(map(key, reordered.to_qir())) == sorted(map(key, circuit.to_qir()))
+		assert np.allclose(reordered.matrix(), circuit.matrix(), atol = 1e-5)
+		psi = layered_state(circuit, mode, inputs = start.state())
+		assert np.allclose(np.asarray(tc.backend.numpy(psi)), reference, atol = 1e-5)
+
+# gates commute on a wire they are both diagonal on (controls, phases), not on a target
+def test_commutation():
+	c = Circuit(3)
+	c.cnot(0, 1)
+	c.cphase(0, 2, theta = 0.3)
+	c.toffoli(0, 2, 1)
+	c.cphase(1, 2, theta = 0.5)
+	c.x(0)
+	dag = DAG(c)
+	assert dag.predecessors[1] == set()
+	assert dag.predecessors[2] == {0}
+	assert dag.predecessors[3] == {2}
+	assert dag.predecessors[4] == {0, 1, 2}
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import tensorcircuit as tc
+from tools import Circuit, gate_level, int_to_qubits, state
+from modular_addition import mod_add
+
+x, y, z = [0, 1, 2, 3], [4, 5, 6, 7], [8]
+inputs = [(x, 1), (y, 2)]
+
+# mod_add on a superposition of x, so every simulator sees branching and interference
+@pytest.fixture(scope = "module")
+def circuit():
+	c = Circuit(9)
+	for q in (x[1], x[2], y[0]):
+		c.h(q)
+	c.rz(x[0], theta = 0.3)
+	with gate_level():
+		c.append(mod_add(x, y, z))
+	c.cphase(y[3], x[2], theta = 0.7)
+	return c
+
+# tools.state on the basis input
+@pytest.fixture(scope = "module")
+def reference(circuit):
+	c = Circuit(circuit._nqubits)
+	for register, value in inputs:
+		c.append(int_to_qubits(register, value))
+	c.append(circuit)
+	return np.asarray(tc.backend.numpy(state(c))).reshape(-1)
+
+def test_contraction(circuit, reference):
+	from contraction import amplitude
+	n = circuit._nqubits
+	psi = amplitude(circuit, inputs, open_qubits = list(range(n)))
+	assert np.allclose(np.asarray(psi).reshape(-1), reference, atol = 1e-5)
+	# one amplitude, sliced over several indices to fit in 2 KiB
+	index = int(np.argmax(np.abs(reference)))
+	outputs = [([q], index >> (n - 1 - q) & 1) for q in range(n)]
+	assert np.isclose(amplitude(circuit, inputs, outputs, memory = 2 ** 11), reference[index], atol = 1e-5)
+
+def test_sparse(circuit, reference):
+	from sparse import run_sparse
+	psi = run_sparse(circuit, [(1, inputs)])
+	assert np.allclose(psi.dense(), reference, atol = 1e-5)
+	assert np.isclose(psi.norm(), 1, atol = 1e-5)
+
+# one shard, shards swapped in one process, and the shared-memory pool
+@pytest.mark.parametrize("processes, g", [(1, 0), (1, 2), (2, 1)])
+def test_sharded(circuit, reference, processes, g):
+	from sharded import sharded_state
+	psi = sharded_state(circuit, inputs, processes = processes, global_qubits = g)
+	assert np.allclose(psi, reference, atol = 1e-5)
+
+# a rebuilt circuit with another tail resumes from the shared prefix
+def test_incremental(circuit, reference):
+	from incremental import PrefixCache, incremental_state
+	cache = PrefixCache()
+	total = len(circuit.to_qir())
+	assert np.allclose(incremental_state(circuit, inputs, cache = cache, every = 64), reference, atol = 1e-5)
+	assert cache.resumed == 0
+	assert np.allclose(incremental_state(circuit, inputs, cache = cache, every = 64), reference, atol = 1e-5)
+	assert cache.resumed == total
+	changed = Circuit(circuit._nqubits).append(circuit)
+	changed.x(z[0])
+	expected = reference.reshape((2,) * circuit._nqubits)[..., ::-1].reshape(-1)
+	assert np.allclose(incremental_state(changed, inputs, cache = cache, every = 64), expected, atol = 1e-5)
+	assert cache.resumed == total
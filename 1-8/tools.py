@@ -1,15 +1,222 @@
 import tensorcircuit as tc
 import numpy as np
+import functools
+import glob
+import hashlib
+import os
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 
-def block(func):
+# dense unitaries of built blocks, keyed by builder and arguments
+_unitaries = {}
+# id(u) -> (u, u^dagger), so every unitary is conjugate-transposed once
+_adjoints = {}
+
+def adjoint(unitary):
+	if id(unitary) not in _adjoints:
+		inverse = tc.backend.adjoint(getattr(unitary, "tensor", unitary))
+		_adjoints[id(unitary)] = (unitary, inverse)
+		_adjoints[id(inverse)] = (inverse, unitary)
+	return _adjoints[id(unitary)][1]
+
+def is_adjoint(a, b):
+	return id(a) in _adjoints and _adjoints[id(a)][1] is b
+
+# directory of the on-disk cache (cache.enable), None while it is off
+_disk = None
+_versions = {}
+# the directory of the project's modules, all of whose sources go into every cache key
+_project = os.path.dirname(os.path.abspath(__file__))
+
+# library versions and a hash of the source of every module of the project, so editing a
+# builder or anything it calls invalidates what was cached from it; the sources are read
+# again only when a file's size or modification time changes
+def version():
+	files = sorted(glob.glob(os.path.join(_project, "*.py")))
+	stamp = tuple((f, os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files)
+	if stamp not in _versions:
+		h = hashlib.sha256(f"{tc.__version__} {np.__version__}".encode())
+		for path in files:
+			with open(path, "rb") as f:
+				h.update(os.path.basename(path).encode() + b"\0" + f.read())
+		_versions[stamp] = h.hexdigest()
+	return _versions[stamp]
+
+def digest(key):
+	return hashlib.sha256(repr((key, version())).encode()).hexdigest()[:32]
+
+# builder arguments as text that is the same in every process: functions by module and
+# qualified name (their repr holds an address), partials by their parts, containers item
+# by item. Lambdas, local functions and objects without a repr of their own have no such
+# name and raise ValueError.
+def stable_repr(value):
+	if isinstance(value, functools.partial):
+		return f"partial({stable_repr(value.func)}, {stable_repr(value.args)}, {stable_repr(sorted(value.keywords.items()))})"
+	if callable(value) and hasattr(value, "__qualname__"):
+		if "<" in value.__qualname__:
+			raise ValueError(f"{value.__qualname__} has no name that holds across processes")
+		return f"{value.__module__}.{value.__qualname__}"
+	if isinstance(value, (list, tuple)):
+		items = ", ".join(stable_repr(v) for v in value)
+		return f"[{items}]" if isinstance(value, list) else f"({items}{',' if len(value) == 1 else ''})"
+	if isinstance(value, dict):
+		return "{" + ", ".join(f"{stable_repr(k)}: {stable_repr(v)}" for k, v in sorted(value.items(), key = lambda kv: repr(kv[0]))) + "}"
+	text = repr(value)
+	if " at 0x" in text:
+		raise ValueError(f"{text} has no repr that holds across processes")
+	return text
+
+# written under a temporary name and renamed, so parallel workers never read half a file
+def save_array(path, array):
+	temporary = f"{path}.{os.getpid()}.tmp"
+	with open(temporary, "wb") as f:
+		np.save(f, np.asarray(array))
+	os.replace(temporary, path)
+
+# profiling.Profiler while profiling.enable() is on; section() times a named step as a
+# child of the running one, note() adds numbers to the running step and built() hands it
+# the circuit the step returns
+_profiler = None
+
+def section(name):
+	return _profiler.section(name) if _profiler else nullcontext()
+
+def note(**info):
+	if _profiler:
+		_profiler.note(**info)
+
+def built(circuit):
+	if _profiler:
+		_profiler.built(circuit)
+	return circuit
+
+# inside gate_level(), blocks return their gate-level body instead of a dense unitary
+_dense = True
+
+@contextmanager
+def gate_level():
+	global _dense
+	previous, _dense = _dense, False
+	try:
+		yield
+	finally:
+		_dense = previous
+
+# "complex64" (tensorcircuit's default) or "complex128" for circuit building, block
+# unitaries and simulation; block unitaries are cached per dtype
+@contextmanager
+def precision(dtype):
+	previous = tc.dtypestr
+	tc.set_dtype(dtype)
+	try:
+		yield
+	finally:
+		tc.set_dtype(previous)
+
+# built sub-circuits shared by reference: callers append them (remapped through indices=)
+# and never modify them; beyond _instance_limit the least recently used are dropped
+_instances = OrderedDict()
+_instance_limit = 1024
+
+def instance(func, name = None):
+	name = name or (func.__module__, func.__qualname__)
+	@functools.wraps(func)
 	def wrapper(*stuff, **parameters):
+		key = (name, repr(stuff), repr(sorted(parameters.items())), tc.dtypestr, _dense)
+		if key in _instances:
+			_instances.move_to_end(key)
+			return _instances[key]
 		circuit = func(*stuff, **parameters)
-		n = circuit._nqubits
-		result = tc.Circuit(n)
-		result.any(*range(n), unitary=circuit.matrix())
-		return result
+		_instances[key] = circuit
+		while len(_instances) > _instance_limit:
+			_instances.popitem(last = False)
+		return circuit
+	return wrapper
+
+# tensorcircuit's Circuit.append rebuilds the whole circuit from its gate list on every call,
+# so a module built from k appends costs O(k^2) gates; the builders here use this subclass,
+# whose append wires only the appended gates, remapped through indices, onto a fresh node
+# over the same gate tensor (shared instances stay intact). The gate count after each append
+# is kept in _boundaries, the module boundaries of the circuit (incremental.py checkpoints
+# there). Plain tc.Circuit is left as it is.
+class Circuit(tc.Circuit):
+	def append(self, c, indices = None):
+		for d in c.to_qir():
+			d = d.copy()
+			index = [indices[i] for i in d["index"]] if indices is not None else list(d["index"])
+			gate = d["gate"] if d["mpo"] else tc.gates.Gate(d["gate"].tensor)
+			self.apply_general_gate(gate, *index, name = d["name"], split = d["split"], mpo = d["mpo"], ir_dict = d)
+		self.__dict__.setdefault("_boundaries", []).append(len(self._qir))
+		return self
+
+def _unitary_path(func, stuff, parameters):
+	try:
+		key = (func.__module__, func.__qualname__, stable_repr(stuff), stable_repr(parameters), tc.dtypestr)
+	except ValueError:
+		return None
+	return os.path.join(_disk, digest(key) + ".npy")
+
+def block(func):
+	body = instance(func)
+
+	def inverse_body(*stuff, **parameters):
+		from uncompute import invert
+		circuit = body(*stuff, **parameters)
+		return invert(circuit.to_qir(), circuit._nqubits)
+	inverse_body = instance(inverse_body, (func.__module__, func.__qualname__ + ".inverse"))
+
+	def unitary(stuff, parameters):
+		key = (func.__module__, func.__qualname__, repr(stuff), repr(sorted(parameters.items())), tc.dtypestr)
+		if key not in _unitaries:
+			path = _disk and _unitary_path(func, stuff, parameters)
+			if path and os.path.exists(path):
+				u = np.load(path, mmap_mode = "r")
+				_unitaries[key] = (u.shape[0].bit_length() - 1, u)
+				note(loaded = u.nbytes)
+			else:
+				circuit = body(*stuff, **parameters)
+				with section("matrix"):
+					_unitaries[key] = (circuit._nqubits, circuit.matrix())
+				note(dense = 4 ** circuit._nqubits * np.dtype(tc.dtypestr).itemsize)
+				if path:
+					save_array(path, _unitaries[key][1])
+		return _unitaries[key]
+
+	@functools.wraps(func)
+	def wrapper(*stuff, **parameters):
+		with section(func.__name__):
+			if not _dense:
+				return built(body(*stuff, **parameters))
+			n, u = unitary(stuff, parameters)
+			result = Circuit(n)
+			result.any(*range(n), unitary=u, name=func.__name__)
+			return built(result)
+
+	def inverse(*stuff, **parameters):
+		with section(func.__name__ + ".inverse"):
+			if not _dense:
+				return built(inverse_body(*stuff, **parameters))
+			n, u = unitary(stuff, parameters)
+			result = Circuit(n)
+			result.any(*range(n), unitary=adjoint(u), name=func.__name__ + ".inverse")
+			return built(result)
+
+	wrapper.inverse = inverse
+	wrapper.gates = body
 	return wrapper
 
+# statevector contracted chunk gates at a time: one network over a wide circuit of many
+# small gates can pick a contraction order far larger than the state itself
+def state(circuit, chunk = 32, inputs = None):
+	gates = circuit.to_qir()
+	n = circuit._nqubits
+	with section("simulation"):
+		note(state = 2 ** n * np.dtype(tc.dtypestr).itemsize)
+		result = inputs if inputs is not None else Circuit(n).state()
+		for i in range(0, len(gates), chunk):
+			result = Circuit.from_qir(gates[i:i + chunk], {"nqubits": n, "inputs": result}).state()
+	return result
+
 def output(circuit, bit_length = -1):
 	state_vector = circuit.state()
 	for index in range(len(state_vector)):
@@ -18,7 +225,8 @@ def output(circuit, bit_length = -1):
 				print(f"{bin(index)[2:]} : {state_vector[index]}")
 			else:
 				print(f"{(bin(index)[2:]).zfill(bit_length)} : {state_vector[index]}")
-@block
+
+# doubly controlled phase onto circuit as 3 cphases and 2 cnots
 def ccphase(circuit, control1, control2, target, theta = np.pi):
     circuit.cphase(control1, target, theta = theta / 2)
     circuit.cphase(control2, target, theta = theta / 2)
@@ -29,12 +237,12 @@ def ccphase(circuit, control1, control2, target, theta = np.pi):
 
 @block
 def controlled_H(control_bit, target_bit):
-	c = tc.Circuit(max(control_bit, target_bit) + 1)
+	c = Circuit(max(control_bit, target_bit) + 1)
 	c.any(control_bit, target_bit, unitary = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1 / np.sqrt(2), 1 / np.sqrt(2)], [0, 0, 1 / np.sqrt(2), -1 / np.sqrt(2)]]))
 	return c
 
 def int_to_qubits(x, C):
-	circuit = tc.Circuit(max(x) + 1)
+	circuit = Circuit(max(x) + 1)
 	while len(x):
 		if C & 1: circuit.x(x[0])
 		C >>= 1
@@ -0,0 +1,99 @@
+import tensorcircuit as tc
+import numpy as np
+from contextlib import contextmanager
+from tools import *
+
+SELF_INVERSE = {"i", "h", "x", "y", "z", "cnot", "cy", "cz", "swap", "toffoli", "fredkin"}
+DAGGER = {"s": "sd", "sd": "s", "t": "td", "td": "t"}
+SYMMETRIC = {"cz", "swap", "cphase", "rzz"}
+
+def _name(d):
+	return d["gatef"].n
+
+# records the gates appended inside the with-block:
+#	with compute(c) as forward:
+#		...
+#	... (use the computed values)
+#	uncompute(c, forward)
+@contextmanager
+def compute(circuit):
+	start = len(circuit.to_qir())
+	gates = []
+	yield gates
+	gates += circuit.to_qir()[start:]
+
+def uncompute(circuit, gates):
+	circuit.append(invert(gates, circuit._nqubits))
+	return circuit
+
+def invert(gates, n):
+	c = Circuit(n)
+	for d in reversed(gates):
+		name = _name(d)
+		parameters = dict(d.get("parameters", {}))
+		if "unitary" in parameters:
+			parameters["unitary"] = adjoint(parameters["unitary"])
+			if name == "any":
+				label = d.get("name") or name
+				parameters["name"] = label[:-len(".inverse")] if label.endswith(".inverse") else label + ".inverse"
+		elif "theta" in parameters:
+			parameters["theta"] = -parameters["theta"]
+		elif name in DAGGER:
+			name = DAGGER[name]
+		elif name not in SELF_INVERSE:
+			c.append(Circuit.from_qir([d], {"nqubits": n}).inverse())
+			continue
+		getattr(c, name)(*d["index"], **parameters)
+	return c
+
+def _same_qubits(a, b):
+	if _name(a) in SYMMETRIC:
+		return sorted(a["index"]) == sorted(b["index"])
+	return tuple(a["index"]) == tuple(b["index"])
+
+def _is_inverse(a, b):
+	if _name(a) != _name(b) and DAGGER.get(_name(a)) != _name(b):
+		return False
+	if not _same_qubits(a, b):
+		return False
+	pa, pb = a.get("parameters", {}), b.get("parameters", {})
+	if "unitary" in pa:
+		if pa.get("ctrl") != pb.get("ctrl"):
+			return False
+		ua, ub = pa["unitary"], pb.get("unitary")
+		if is_adjoint(ua, ub):
+			return True
+		if ub is None or np.shape(ua)[-1] > 16:
+			return False
+		m = np.asarray(ua).reshape(np.shape(ub)[-1], -1) @ np.asarray(ub).reshape(np.shape(ub)[-1], -1)
+		return np.allclose(m, np.eye(len(m)), atol = 1e-6)
+	if "theta" in pa:
+		return np.isclose(float(np.real(pa["theta"])) + float(np.real(pb.get("theta", 0))), 0)
+	return _name(a) in SELF_INVERSE or DAGGER.get(_name(a)) == _name(b)
+
+# peephole pass: drops every gate that meets its inverse with nothing in between
+# on its wires, which also removes compute/uncompute pairs across module boundaries
+def cancel_inverses(circuit):
+	kept = []
+	wires = {}
+	boundaries = set(getattr(circuit, "_boundaries", ()))
+	marks = []
+	for i, d in enumerate(circuit.to_qir()):
+		if i in boundaries:
+			marks.append(len(kept))
+		previous = {wires[q][-1] if wires.get(q) else None for q in d["index"]}
+		if len(previous) == 1 and None not in previous:
+			j = previous.pop()
+			if _is_inverse(kept[j], d):
+				for q in kept[j]["index"]:
+					wires[q].pop()
+				kept[j] = None
+				continue
+		kept.append(d)
+		for q in d["index"]:
+			wires.setdefault(q, []).append(len(kept) - 1)
+	result = Circuit.from_qir([d for d in kept if d is not None], {"nqubits": circuit._nqubits})
+	# module boundaries carried over to the gates that are left
+	left = np.cumsum([0] + [d is not None for d in kept])
+	result._boundaries = [int(left[m]) for m in marks] + [len(result.to_qir())]
+	return result
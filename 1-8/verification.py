@@ -0,0 +1,169 @@
+import tensorcircuit as tc
+import numpy as np
+import multiprocessing
+import time
+from tools import *
+
+# Exhaustive check of cond_ECC_add_0 on y^2 = x^3 + a x + b mod p: every curve point P
+# (registers x1, y1) against every fixed Q (the classical x2, y2), for each control value.
+# Work is sharded over a process pool by (Q, control, slice of the points); each worker
+# builds the oracle once per Q and runs it on basis inputs with the fastest engine that
+# can take it: classical.run_bits for circuits of reversible gates, the chunked
+# statevector (tools.state) otherwise. Results are compared with a vectorized classical
+# reference that follows point_addition_corner ((0, 0) is the point at infinity).
+
+def curve_points(a, b, p):
+	x, y = np.meshgrid(np.arange(p), np.arange(p), indexing = "ij")
+	on = (y * y - (x ** 3 + a * x + b)) % p == 0
+	return [(int(u), int(v)) for u, v in zip(x[on], y[on])]
+
+# P + Q for arrays of points P = (x1, y1) and one Q
+def reference(x1, y1, Q, a, p):
+	x1, y1 = np.asarray(x1) % p, np.asarray(y1) % p
+	x2, y2 = Q
+	inverse = np.array([0] + [pow(v, -1, p) for v in range(1, p)])
+	double = (x1 == x2) & (y1 == y2)
+	up = np.where(double, 3 * x1 * x1 + a, y2 - y1) % p
+	down = np.where(double, 2 * y1, x2 - x1) % p
+	lam = up * inverse[down] % p
+	x3 = (lam * lam - x1 - x2) % p
+	y3 = (lam * (x1 - x3) - y1) % p
+	infinite = (x1 == x2) & ((y1 + y2) % p == 0)
+	x3, y3 = np.where(infinite, 0, x3), np.where(infinite, 0, y3)
+	P_infinite = (x1 == 0) & (y1 == 0)
+	x3, y3 = np.where(P_infinite, x2, x3), np.where(P_infinite, y2, y3)
+	if Q == (0, 0):
+		x3, y3 = x1, y1
+	return x3, y3
+
+def _bits_of(index, n):
+	return [index >> (n - 1 - q) & 1 for q in range(n)]
+
+def _value(bits, register):
+	return sum(bits[q] << i for i, q in enumerate(register))
+
+# engine(circuit) -> run(registers) -> (bits of the most likely output, its probability)
+def bits_engine(circuit):
+	from classical import run_bits, encode
+	run_bits(circuit, 0)
+	n = circuit._nqubits
+	def run(registers):
+		s = run_bits(circuit, encode(registers))
+		return [s >> q & 1 for q in range(n)], 1.0
+	return run
+
+def statevector_engine(circuit):
+	n = circuit._nqubits
+	def run(registers):
+		c = Circuit(n)
+		for register, value in registers:
+			c.append(int_to_qubits(register, value))
+		c.append(circuit)
+		psi = np.abs(tc.backend.numpy(state(c))) ** 2
+		index = int(np.argmax(psi))
+		return _bits_of(index, n), float(psi[index])
+	return run
+
+def fastest_engine(circuit):
+	try:
+		return bits_engine(circuit), "bits"
+	except ValueError:
+		return statevector_engine(circuit), "statevector"
+
+_job = None
+_oracles = {}
+
+def _init(job):
+	global _job
+	_job = job
+	if job["cache"]:
+		import cache
+		cache.enable(job["cache"])
+
+def _oracle(Q):
+	if Q not in _oracles:
+		from point_addition import ecc_registers, cond_ECC_add_0
+		from montgomery import MONTGOMERY
+		options = dict(_job["options"])
+		alloc, p, x, z = ecc_registers()
+		from cache import cached
+		circuit = cached(cond_ECC_add_0, p, x, Q[0], Q[1], z, alloc = alloc, **options)
+		run, engine = fastest_engine(circuit)
+		# lambda and everything the oracle borrowed must come back clean
+		scratch = [q for q in range(circuit._nqubits) if q != p and q not in x]
+		_oracles[Q] = run, engine, (p, x, scratch), options.get("multiplier") in MONTGOMERY
+	return _oracles[Q]
+
+# one shard: (Q, control, points) -> [(P, output point, probability, clean), ...]
+def _shard(task):
+	Q, control, points = task
+	run, engine, (p, x, scratch), montgomery = _oracle(Q)
+	modulus = _job["p"]
+	from montgomery import to_montgomery, from_montgomery
+	convert = (lambda v: to_montgomery(v, modulus)) if montgomery else (lambda v: v)
+	restore = (lambda v: from_montgomery(v, modulus)) if montgomery else (lambda v: v)
+	results = []
+	for P in points:
+		bits, probability = run([([p], control), (x[0:4], convert(P[0])), (x[4:8], convert(P[1]))])
+		R = restore(_value(bits, x[0:4])), restore(_value(bits, x[4:8]))
+		clean = bits[p] == control and not any(bits[q] for q in scratch)
+		results.append((P, R, probability, clean))
+	return Q, control, engine, results
+
+# (Q, control, engine, results) of every task as the shards finish
+def _shards(job, tasks, processes):
+	if processes == 1:
+		_init(job)
+		yield from map(_shard, tasks)
+		return
+	with multiprocessing.Pool(processes, initializer = _init, initargs = (job,)) as pool:
+		yield from pool.imap_unordered(_shard, tasks)
+
+# failures[c][i, j] is True when the oracle gets P = points[i] + Q = points[j] wrong with
+# control c (control 0 must leave P unchanged); outputs also need a clean lambda / ancilla
+# register and probability above tolerance
+def verify(a = 5, b = 5, p = 7, controls = (0, 1), processes = None, shards = 4, cache = None, tolerance = 0.99, **options):
+	points = curve_points(a, b, p)
+	index = {P: i for i, P in enumerate(points)}
+	job = {"p": p, "options": options, "cache": cache}
+	slices = [points[i::shards] for i in range(shards)]
+	tasks = [(Q, control, s) for Q in points for control in controls for s in slices if s]
+	processes = processes or multiprocessing.cpu_count()
+
+	start = time.time()
+	failures = {control: np.zeros((len(points), len(points)), dtype = bool) for control in controls}
+	outputs = {control: {} for control in controls}
+	engines = set()
+	for Q, control, engine, results in _shards(job, tasks, processes):
+		engines.add(engine)
+		x1 = [P[0] for P, *_ in results]
+		y1 = [P[1] for P, *_ in results]
+		x3, y3 = reference(x1, y1, Q, a, p) if control else (np.array(x1), np.array(y1))
+		for (P, R, probability, clean), expected in zip(results, zip(x3, y3)):
+			ok = R == tuple(int(v) for v in expected) and clean and probability >= tolerance
+			failures[control][index[P], index[Q]] = not ok
+			outputs[control][P, Q] = R
+	elapsed = time.time() - start
+
+	runs = len(points) ** 2 * len(controls)
+	return {
+		"points": points,
+		"failures": failures,
+		"outputs": outputs,
+		"engines": sorted(engines),
+		"seconds": elapsed,
+		"runs per second": runs / elapsed,
+		"processes": processes,
+	}
+
+def report(result):
+	points = result["points"]
+	for control, failures in result["failures"].items():
+		print(f"control {control}: {int(failures.sum())} of {failures.size} wrong (rows P, columns Q)")
+		print(" " * 8 + "".join(f"{str(Q):>8}" for Q in points))
+		for i, P in enumerate(points):
+			print(f"{str(P):>8}" + "".join(f"{'x' if failures[i, j] else '.':>8}" for j in range(len(points))))
+	print(f"engines {', '.join(result['engines'])}, {result['processes']} processes, {result['seconds']:.1f}s, {result['runs per second']:.2f} runs/s")
+
+if __name__ == "__main__":
+	report(verify())
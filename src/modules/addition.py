@@ -3,10 +3,12 @@ import numpy as np
 from typing import Sequence, List
 
 # 假设 qft 和 qft_dagger 在 qft.py 文件中定义
-from qft import qft, qft_dagger
+from qft import qft, qft_dagger, ccphase
+from utils import cached_circuit, ripple_addition, ripple_subtraction
 
 K = tc.set_backend("tensorflow")
 
+@cached_circuit
 def addition(n: int) -> tc.Circuit:
     """
     构造一个实现 |x>_n|0>_1|y>_n -> |x>_n|x+y>_{n+1} 的电路。
@@ -42,6 +44,7 @@ def addition(n: int) -> tc.Circuit:
 
     return c
 
+@cached_circuit
 def controlled_addition(n: int) -> tc.Circuit:
     """
     构造一个实现 |x>_n|0>_1|y>_n -> |x>_n|x+y>_{n+1} 的受控电路。
@@ -67,7 +70,7 @@ def controlled_addition(n: int) -> tc.Circuit:
                 if j >= i:
                     # 正确的相位角
                     theta = np.pi / (2 ** (j - i))
-                    c.multicontrol(0, reg_x[n - i - 1], reg_b[m - j - 1], ctrl=[1, 1], unitary=tc.gates.rz(theta=theta))
+                    ccphase(c, 0, reg_x[n - i - 1], reg_b[m - j - 1], theta)
         c.append(qft_dagger(m), reg_b)
 
         return c
@@ -77,6 +80,7 @@ def controlled_addition(n: int) -> tc.Circuit:
 
     return c
 
+@cached_circuit
 def subtraction(n: int) -> tc.Circuit:
     """
     构造一个实现 |x>_n|y>_{n+1} -> |x>_n|0>|y-x>_n 的电路。
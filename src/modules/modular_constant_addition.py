@@ -193,15 +193,20 @@ print("电路信息:")
 print(f"量子比特数: {circuit.circuit_param['nqubits']}")
 print(f"量子比特顺序 (Little Endian): q0(LSB)在最右侧, q{n-1}(MSB)在最左侧")
 
-# 计算电路深度和门数量
-qft_gates = n * (n + 1) // 2  # QFT中的Hadamard和控制相位门
-phase_gates = n  # 相位加法的Rz门
-total_gates = 2 * qft_gates + phase_gates
-
-print(f"\n估算门数量: {total_gates}")
-print(f"  - QFT门: {qft_gates}")
-print(f"  - 相位旋转门: {phase_gates}")  
-print(f"  - IQFT门: {qft_gates}")
+# 门数量和深度直接从电路的门列表统计
+gate_counts = {}
+layer = {}
+for d in circuit.to_qir():
+    name = d["gatef"].n
+    gate_counts[name] = gate_counts.get(name, 0) + 1
+    top = max(layer.get(q, 0) for q in d["index"]) + 1
+    for q in d["index"]:
+        layer[q] = top
+
+print(f"\n门数量: {sum(gate_counts.values())}")
+for name, count in gate_counts.items():
+    print(f"  - {name}: {count}")
+print(f"电路深度: {max(layer.values(), default=0)}")
 
 # 验证little endian约定
 print("\n" + "=" * 50)
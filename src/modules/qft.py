@@ -2,6 +2,9 @@ import tensorcircuit as tc
 import numpy as np
 from typing import Sequence
 
+from utils import ccphase, cached_circuit
+
+@cached_circuit
 def qft(n: int) -> tc.Circuit:
     """
     对指定的量子比特序列应用量子傅里叶变换 (QFT)。
@@ -23,6 +26,7 @@ def qft(n: int) -> tc.Circuit:
     
     return c
 
+@cached_circuit
 def qft_dagger(n: int) -> tc.Circuit:
     """
     对指定的量子比特序列应用逆量子傅里叶变换 (IQFT)。
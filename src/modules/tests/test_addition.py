@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import tensorcircuit as tc
+from utils import modular_addition, ripple_addition
+
+
+def run(circuit: tc.Circuit, inputs) -> list:
+    """在基态输入上运行电路，返回概率最大的基态的各个比特 (寄存器为大端序)"""
+    n = circuit._nqubits
+    c = tc.Circuit(n)
+    for qubits, value in inputs:
+        for i, qubit in enumerate(reversed(qubits)):
+            if (value >> i) & 1:
+                c.x(qubit)
+    c.append(circuit)
+    index = int(np.argmax(np.abs(np.asarray(c.state()))))
+    return [(index >> (n - 1 - q)) & 1 for q in range(n)]
+
+
+def value(bits: list, qubits) -> int:
+    return int("".join(str(bits[q]) for q in qubits), 2)
+
+
+@pytest.mark.parametrize("n", [1, 3])
+def test_ripple_addition(n):
+    x, y = list(range(n)), list(range(n + 1, 2 * n + 1))
+    for a in range(2 ** n):
+        for b in range(2 ** n):
+            bits = run(ripple_addition(n), [(x, a), (y, b)])
+            assert value(bits, x) == a
+            assert value(bits, [n] + y) == a + b
+            assert bits[2 * n + 1] == 0
+
+
+@pytest.mark.parametrize("adder", ["qft", "ripple"])
+@pytest.mark.parametrize("p", [5, 7])
+def test_modular_addition(adder, p):
+    n = 3
+    x, y = list(range(n)), list(range(n, 2 * n))
+    c = modular_addition(n, p, adder)
+    for a in range(p):
+        for b in range(p):
+            bits = run(c, [(x, a), (y, b)])
+            assert value(bits, x) == a
+            assert value(bits, y) == (a + b) % p
+            assert not any(bits[2 * n:])
@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 import tensorcircuit as tc
 from typing import Sequence
@@ -11,6 +12,25 @@ def get_qubit_count(p: int) -> int:
 
 ########################################################### qft ###########################################################
 
+def cached_circuit(func):
+    """
+    按参数缓存电路的门列表，每次调用都由它重建一个新电路：
+    调用方修改返回的电路不会影响缓存和之后的调用。
+    """
+    @functools.lru_cache(maxsize=128)
+    def gates(*args):
+        c = func(*args)
+        return c._nqubits, tuple(c.to_qir())
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        n, qir = gates(*args)
+        return tc.Circuit.from_qir(list(qir), {"nqubits": n})
+
+    wrapper.cache_clear = gates.cache_clear
+    return wrapper
+
+@cached_circuit
 def qft(n: int) -> tc.Circuit:
     """
     对指定的量子比特序列应用量子傅里叶变换 (QFT)。
@@ -32,6 +52,7 @@ def qft(n: int) -> tc.Circuit:
     
     return c
 
+@cached_circuit
 def qft_dagger(n: int) -> tc.Circuit:
     """
     对指定的量子比特序列应用逆量子傅里叶变换 (IQFT)。
@@ -52,8 +73,23 @@ def qft_dagger(n: int) -> tc.Circuit:
     return c
 
 
+def ccphase(c: tc.Circuit, control1: int, control2: int, target: int, theta: float) -> tc.Circuit:
+    """
+    双控相位门：两个控制位都为 1 时给目标位加相位 theta。
+    用 3 个 cphase + 2 个 CNOT 实现；multicontrol 的 rz 会额外引入依赖控制位的相位，
+    控制位处于叠加态时结果不对。
+    """
+    c.cphase(control1, target, theta=theta / 2)
+    c.cphase(control2, target, theta=theta / 2)
+    c.cnot(control1, control2)
+    c.cphase(control2, target, theta=-theta / 2)
+    c.cnot(control1, control2)
+    return c
+
+
 ########################################################### addition ###########################################################
 
+@cached_circuit
 def addition(n: int) -> tc.Circuit:
     """
     构造一个实现 |x>_n|0>_1|y>_n -> |x>_n|x+y>_{n+1} 的电路。
@@ -89,6 +125,7 @@ def addition(n: int) -> tc.Circuit:
 
     return c
 
+@cached_circuit
 def controlled_addition(n: int) -> tc.Circuit:
     """
     构造一个实现 |x>_n|0>_1|y>_n -> |x>_n|x+y>_{n+1} 的受控电路。
@@ -114,7 +151,7 @@ def controlled_addition(n: int) -> tc.Circuit:
                 if j >= i:
                     # 正确的相位角
                     theta = np.pi / (2 ** (j - i))
-                    c.multicontrol(0, reg_x[n - i - 1], reg_b[m - j - 1], ctrl=[1, 1], unitary=tc.gates.rz(theta=theta))
+                    ccphase(c, 0, reg_x[n - i - 1], reg_b[m - j - 1], theta)
         c.append(qft_dagger(m), reg_b)
 
         return c
@@ -124,6 +161,7 @@ def controlled_addition(n: int) -> tc.Circuit:
 
     return c
 
+@cached_circuit
 def subtraction(n: int) -> tc.Circuit:
     """
     构造一个实现 |x>_n|y>_{n+1} -> |x>_n|0>|y-x>_n 的电路。
@@ -159,78 +197,130 @@ def subtraction(n: int) -> tc.Circuit:
     return c
 
 
+def ripple_addition(n: int) -> tc.Circuit:
+    """
+    构造一个实现 |x>_n|0>_1|y>_n|0>_1 -> |x>_n|x+y>_{n+1}|0>_1 的行波进位加法电路。
+    Cuccaro 加法器：只用 CNOT 和 Toffoli，没有小角度旋转，最后一个比特是进位辅助比特。
+    """
+    c = tc.Circuit(2 * n + 2)
+    reg_x = [n - i - 1 for i in range(n)]       # x 的第 i 位 (LSB 在前)
+    reg_b = [2 * n - i for i in range(n)]       # y 的第 i 位
+    carry = [2 * n + 1] + reg_x                 # 第 i 位的进位所在的比特
+
+    # MAJ: 依次把进位算到 x 的各个比特上
+    for i in range(n):
+        c.cnot(reg_x[i], reg_b[i])
+        c.cnot(reg_x[i], carry[i])
+        c.toffoli(carry[i], reg_b[i], reg_x[i])
+    # 最高位的进位写入 |0>_1
+    c.cnot(reg_x[n - 1], n)
+    # UMA: 反向恢复 x 和进位，同时得到和
+    for i in reversed(range(n)):
+        c.toffoli(carry[i], reg_b[i], reg_x[i])
+        c.cnot(reg_x[i], carry[i])
+        c.cnot(carry[i], reg_b[i])
+
+    return c
+
+def ripple_subtraction(n: int) -> tc.Circuit:
+    """
+    ripple_addition 的逆：|x>_n|y>_{n+1}|0>_1 -> |x>_n|y-x>_{n+1}|0>_1。
+    """
+    return ripple_addition(n).inverse()
+
+
 ############################################################## modular addition ###########################################################
 
-def modular_addition(n: int, p: int) -> tc.Circuit:
+def modular_addition(n: int, p: int, adder: str = "qft") -> tc.Circuit:
     """
-    模加法：计算 (X + Y) mod p
+    模加法：计算 (X + Y) mod p, 0 <= X, Y < p <= 2^n
     输入：|X⟩|Y⟩
     输出：|X⟩|(X+Y) mod p⟩
+    寄存器与 addition 相同为大端序 (寄存器第 0 位是最高位):
+        X = [0, ..., n-1], Y = [n, ..., 2n-1], p 寄存器 = [2n, ..., 3n-1],
+        3n 是 Y 多出的最高位 (符号位), 3n+1 是辅助比特 Z
+    adder: "qft" 用 Draper 加法器 (addition / subtraction / controlled_addition);
+        "ripple" 用 Cuccaro 行波进位加法器, 多一个进位辅助比特 3n+2,
+        受控加 p 时先把 p 寄存器换成 Z·p 再做一次普通加法
     """
 
     def int_to_qubits(c: tc.Circuit, value: int, qubits: List[int]):
-        """将整数编码到量子比特寄存器中（小端序）"""
-        for i, qubit in enumerate(qubits):
+        """将整数编码到量子比特寄存器中（大端序，qubits[0] 是最高位）"""
+        for i, qubit in enumerate(reversed(qubits)):
             if (value >> i) & 1:
                 c.x(qubit)
 
-    total_qubits = 3 * n + 2
-    c = tc.Circuit(total_qubits)  # 3n for x, y, and result, +2 for auxiliary bit
-    
+    if adder == "ripple":
+        add, sub, carry = ripple_addition(n), ripple_subtraction(n), [3 * n + 2]
+    elif adder == "qft":
+        add, sub, carry = addition(n), subtraction(n), []
+    else:
+        raise ValueError(f"unknown adder {adder}")
+
+    x_qubits = list(range(n))
+    y_qubits = [3 * n] + list(range(n, 2 * n))  # 加上符号位共 n+1 位
+    p_qubits = list(range(2 * n, 3 * n))  # p寄存器
+    z_qubit = 3 * n + 1  # 辅助比特Z
+    c = tc.Circuit(3 * n + 2 + len(carry))
+
     # 第一步：将输入的|X⟩和|Y⟩相加
     # 使用addition函数：|X⟩|0⟩|Y⟩ → |X⟩|X+Y⟩
-    c.append(addition(n), list(range(n)) + list([3 * n]) + list(range(n, 2 * n)))
-    
-    # 现在y_qubits包含了X+Y的结果
-    
+    c.append(add, x_qubits + y_qubits + carry)
+
     # 第二步：从Y寄存器中减去p
-    # 首先需要创建存储p的寄存器
-    # 假设我们有足够的辅助量子比特
-    p_qubits = list(range(2 * n, 3 * n))  # p寄存器
-    z_qubit = 3 * n + 1  # 辅助比特Z
-    
     # 将p编码到p_qubits中
     int_to_qubits(c, p, p_qubits)
-    
+
     # 执行减法：Y = Y - P
-    c.append(subtraction(n), list(range(2 * n, 3 * n)) + list([3 * n]) + list(range(n, 2 * n)))
-    
+    c.append(sub, p_qubits + y_qubits + carry)
+
     # 第三步：检查最高位判断是否为负数
-    # 由于n = ceil(log2(p))，正常情况下最高位应该是0
-    # 如果减去p后变为负数，最高位会变成1
-    highest_bit = y_qubits[n - 1] # 最高位量子比特
-    
+    # X+Y < 2p <= 2^(n+1)，减去p后变为负数时，最高位 (符号位) 会变成1
+    highest_bit = y_qubits[0]
+
     # 将最高位的状态复制到辅助比特Z
     c.cnot(highest_bit, z_qubit)
-    
+
     # 第四步：条件性地加回p
     # 如果结果小于0（Z=1），我们需要把Y加上p
     # 如果结果不小于0（Z=0），什么都不做
-    # 以辅助比特Z为控制比特控制对Y加p的门
-    c.append(controlled_addition(n), list([3 * n + 1]) + list(range(2 * n, 3 * n)) + list([3 * n]) + list(range(n, 2 * n)))
-    
+    if adder == "ripple":
+        # p 寄存器从 p 换成 Z·p，做一次普通加法后换回
+        int_to_qubits(c, p, p_qubits)
+        for i, qubit in enumerate(reversed(p_qubits)):
+            if (p >> i) & 1:
+                c.cnot(z_qubit, qubit)
+        c.append(add, p_qubits + y_qubits + carry)
+        for i, qubit in enumerate(reversed(p_qubits)):
+            if (p >> i) & 1:
+                c.cnot(z_qubit, qubit)
+        int_to_qubits(c, p, p_qubits)
+    else:
+        # 以辅助比特Z为控制比特控制对Y加p的门
+        c.append(controlled_addition(n), [z_qubit] + p_qubits + y_qubits)
+
     # 第五步：复原辅助比特Z
     # 对Y寄存器内的结果减去X
     # Y寄存器内要么是X+Y（-p再+回来了），要么是X+Y-p（-p后没有再操作）
-    c.append(subtraction(n), list(range(n)) + list([3 * n]) + list(range(n, 2 * n)))  # Y = Y - X
-    
+    c.append(sub, x_qubits + y_qubits + carry)  # Y = Y - X
+
     # 减去X后：
     # - 如果原来是X+Y，现在剩余Y，最高位是0（意味着辅助比特Z应该是1）
     # - 如果原来是X+Y-p，现在剩余Y-p，最高位是1（意味着辅助比特Z应该是0）
-    
+
     # 需要在最高位=0时翻转Z，最高位=1时不动Z
     # 先翻转最高位
     c.x(highest_bit)
-    
+
     # 以翻转后的最高位为控制比特来翻转Z
     c.cnot(highest_bit, z_qubit)
-    
+
     # 再翻转最高位回来
     c.x(highest_bit)
-    
+
     # 第六步：恢复Y寄存器
     # 将X加回到Y寄存器，恢复到最终结果
-    c.append(addition(n), list(range(n)) + list([3 * n]) + list(range(n, 2 * n)))  # Y = Y + X
+    c.append(add, x_qubits + y_qubits + carry)  # Y = Y + X
 
     int_to_qubits(c, p, p_qubits)
 
@@ -243,27 +333,65 @@ def modular_multiplication(n: int, p: int) -> tc.Circuit:
     """
     模乘法 |x⟩|y⟩|0⟩ → |x⟩|y⟩|x*y mod p⟩
     参数:
-        c: 量子电路
-        n 是每个寄存器的量子比特数, 电路c包括3n个量子比特
-        其中 x_reg, y_reg: 输入寄存器（量子比特位置索引）
+        n 是 x、y 寄存器的量子比特数, 电路包括 3n+2 个量子比特
+        寄存器与 addition 相同为大端序 (寄存器第 0 位是最高位):
         x_reg = [0, 1, ..., n-1]
         y_reg = [n, n+1, ..., 2n-1]
-        结果寄存器 res_reg = [2n, 2n+1, ..., 3n-1]
-        例如 n=3 时，x_reg = [0,1,2], y_reg = [3,4,5], res_reg = [6,7,8]
-        p: 模数
+        结果寄存器 res_reg = [2n, 2n+1, ..., 3n] 共 n+1 位, 多出的最高位用来判断符号
+        辅助比特 z = 3n+1
+        p: 模数, 满足 p <= 2^n
+    x*y = Σ x_i y_j 2^(i+j), 每一项是一次双控模常数加法 (常数 2^(i+j) mod p)。
+    结果寄存器只在开头做一次 qft、结尾做一次 qft_dagger, 所有加法都是傅里叶基下的相位门;
+    模约简 (Beauregard) 只需读两次符号位, 每次用 qft_dagger / qft 包住一个 CNOT。
     """
-
-    c = tc.Circuit(3 * n)
-
-    # 1. 通过连加计算 x*y=Σ (y*2^i) * x_i
+    m = n + 1
+    x_reg = list(range(n))
+    y_reg = list(range(n, 2 * n))
+    res_reg = list(range(2 * n, 3 * n + 1))
+    z = 3 * n + 1
+    c = tc.Circuit(3 * n + 2)
+
+    def phase_addition(controls: List[int], value: int):
+        """傅里叶基下 res += value (可为负), controls 全为 1 时生效; res 的第 m-1-j 位携带 exp(2πi·res / 2^(j+1))"""
+        for j in range(m):
+            theta = 2 * np.pi * (value % 2 ** (j + 1)) / 2 ** (j + 1)
+            if theta == 0:
+                continue
+            target = res_reg[m - 1 - j]
+            if len(controls) == 0:
+                c.phase(target, theta=theta)
+            elif len(controls) == 1:
+                c.cphase(controls[0], target, theta=theta)
+            else:
+                ccphase(c, controls[0], controls[1], target, theta)
+
+    def sign_to_z(flip: bool):
+        """离开傅里叶基读出最高位 (符号位) 到 z, 再回到傅里叶基; flip 时读取其取反"""
+        c.append(qft_dagger(m), res_reg)
+        if flip:
+            c.x(res_reg[0])
+        c.cnot(res_reg[0], z)
+        if flip:
+            c.x(res_reg[0])
+        c.append(qft(m), res_reg)
+
+    c.append(qft(m), res_reg)
     for i in range(n):
-        # 对 x 的每一位 x_i，若为1，则|x⟩|y⟩|psi>->|x⟩|y⟩|psi+y*2^i mod p>
-        # 当x的第n-i位(也即整体电路的第n-i位, 从最高位向最低位不需要辅助比特)为1时，受控模加法
-        # c.append(controlled_modular_addition(y_reg, res_reg, p, control=n-i))
-        c.append(controlled_modular_addition(n, p), list([n - i]) + list(range(n, 3 * n)))
-        c.append(doubling(n, p), list(range(2 * n, 3 * n)))
-    
-    # 2. 结果已在 res_reg 中（x*y mod p）
+        for j in range(n):
+            # x_i、y_j 都为 1 时 res = (res + 2^(i+j)) mod p
+            controls = [x_reg[n - 1 - i], y_reg[n - 1 - j]]
+            value = 2 ** (i + j) % p
+            phase_addition(controls, value)
+            phase_addition([], -p)
+            # 减去 p 后为负则 z = 1, 由 z 控制加回 p
+            sign_to_z(False)
+            phase_addition([z], p)
+            # 再减去这一项: 刚才加回过 p 时结果非负, 据此把 z 复原为 0
+            phase_addition(controls, -value)
+            sign_to_z(True)
+            phase_addition(controls, value)
+    c.append(qft_dagger(m), res_reg)
+
     return c
 
 def sqr(c: tc.Circuit, x_reg, res_reg, p):